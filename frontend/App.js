@@ -17,8 +17,6 @@ const StudentCourseAbsences = require('./models/StudentCourseAbsences');
 const CourseRating = require('./models/CourseRating');
 const courseRatingController = require('./controllers/courseRatingController');
 const fetch = require('node-fetch');
-const { exec } = require('child_process');
-const fs = require('fs');
 
 // then sync or authenticate as needed
 
@@ -550,7 +548,7 @@ app.get('/courses/:courseId/myrating', courseRatingController.getStudentCourseRa
 // Chatbot endpoint
 app.post('/chatbot', async (req, res) => {
     try {
-        const { prompt } = req.body;
+        const { prompt, session_id } = req.body;
         if (!prompt) {
             return res.status(400).json({ error: 'Prompt is required' });
         }
@@ -562,12 +560,27 @@ app.post('/chatbot', async (req, res) => {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-                'Accept': 'application/json'
+                'Accept': 'application/json',
+                // Faculty requests are queued ahead of students, then anonymous users.
+                // The backend only trusts X-User-Type/X-User-Id alongside the shared proxy secret;
+                // the user id ties chat sessions to the logged-in user
+                'X-User-Type': req.session.userType || 'anonymous',
+                'X-User-Id': req.session.userId ? String(req.session.userId) : '',
+                'X-Proxy-Secret': process.env.PROXY_SECRET || ''
             },
-            body: JSON.stringify({ prompt })
+            body: JSON.stringify({ prompt, session_id })
         });
 
         console.log('Flask response status:', response.status); // Debug log
+        // Busy (503) or deadline passed (504): pass the status and Retry-After through
+        if (response.status === 503 || response.status === 504) {
+            const errorData = await response.json().catch(() => ({}));
+            const retryAfter = response.headers.get('Retry-After');
+            if (retryAfter) {
+                res.set('Retry-After', retryAfter);
+            }
+            return res.status(response.status).json({ error: errorData.error || 'The advisor is busy, please try again shortly' });
+        }
 
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({}));
@@ -576,7 +589,7 @@ app.post('/chatbot', async (req, res) => {
 
         const data = await response.json();
         console.log('Flask response data:', data); // Debug log
-        res.json({ answer: data.answer });
+        res.json({ answer: data.answer, session_id: data.session_id });
     } catch (error) {
         console.error('Chatbot error:', error);
         res.status(500).json({ error: error.message || 'Internal server error' });
@@ -584,44 +597,36 @@ app.post('/chatbot', async (req, res) => {
 });
 
 // Route to generate and download student report PDF
+// Reports come from the long-running service in generate_report.py (python3 generate_report.py --serve),
+// which returns the PDF bytes directly, so there is no per-click process or shared file on disk.
+// On Render it is a private service, so only its host:port is known; it also checks X-Report-Token.
+const REPORT_SERVICE_URL = process.env.REPORT_SERVICE_HOSTPORT
+  ? `http://${process.env.REPORT_SERVICE_HOSTPORT}`
+  : (process.env.REPORT_SERVICE_URL || 'http://127.0.0.1:5002');
+
 app.get('/api/student/:id/report', async (req, res) => {
   const studentId = req.params.id;
-  const projectRoot = path.join(__dirname, '..');
-  const pdfPath = path.join(projectRoot, `student_${studentId}_report.pdf`);
-  const scriptPath = path.join(projectRoot, 'generate_report.py');
-
   console.log('Generating report for student:', studentId);
-  console.log('PDF will be saved to:', pdfPath);
-  console.log('Using script at:', scriptPath);
-
-  // Run the Python script to generate the report
-  exec(`python3 "${scriptPath}" ${studentId}`, (error, stdout, stderr) => {
-    if (error) {
-      console.error('Error executing Python script:', error);
-      console.error('Script stderr:', stderr);
-      console.error('Script stdout:', stdout);
+
+  try {
+    const response = await fetch(`${REPORT_SERVICE_URL}/report/${encodeURIComponent(studentId)}`, {
+      headers: { 'X-Report-Token': process.env.REPORT_SERVICE_TOKEN || '' }
+    });
+    if (response.status === 404) {
+      return res.status(404).send('Report not found');
+    }
+    if (!response.ok) {
+      console.error('Report service error:', response.status, await response.text());
       return res.status(500).send('Error generating report');
     }
-    
-    console.log('Python script output:', stdout);
-    
-    // Wait a short moment to ensure file is written
-    setTimeout(() => {
-      fs.readFile(pdfPath, (err, data) => {
-        if (err) {
-          console.error('Error reading PDF file:', err);
-          return res.status(500).send('Report not found');
-        }
-        res.setHeader('Content-Type', 'application/pdf');
-        res.setHeader('Content-Disposition', `attachment; filename=student_${studentId}_report.pdf`);
-        res.send(data);
-        // Delete the file after sending
-        fs.unlink(pdfPath, (unlinkErr) => {
-          if (unlinkErr) console.error('Error deleting PDF:', unlinkErr);
-        });
-      });
-    }, 1000); // Wait 1 second to ensure file is written
-  });
+    const data = await response.buffer();
+    res.setHeader('Content-Type', 'application/pdf');
+    res.setHeader('Content-Disposition', `attachment; filename=student_${studentId}_report.pdf`);
+    res.send(data);
+  } catch (error) {
+    console.error('Error contacting report service:', error);
+    res.status(500).send('Error generating report');
+  }
 });
 
 // Set up the port
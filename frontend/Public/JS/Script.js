@@ -201,6 +201,9 @@ function initGPAChart() {
             chatbotMinimize.textContent = '_';
         }
         
+        // Conversation id issued by the backend, sent back so follow-up questions keep their context
+        let chatSessionId = null;
+
         // Send message function
         function sendMessage() {
             const message = chatbotInput.value.trim();
@@ -227,7 +230,7 @@ function initGPAChart() {
                 },
                 mode: 'cors',
                 credentials: 'include',
-                body: JSON.stringify({ prompt: message, userType: window.USER_TYPE })
+                body: JSON.stringify({ prompt: message, userType: window.USER_TYPE, session_id: chatSessionId })
             })
             .then(async response => {
                 console.log('Response status:', response.status); // Debug log
@@ -244,6 +247,7 @@ function initGPAChart() {
                 if (data.error) {
                     addMessage(`Error: ${data.error}`, 'bot');
                 } else {
+                    chatSessionId = data.session_id || chatSessionId;
                     addMessage(data.answer, 'bot');
                 }
             })
@@ -7,8 +7,18 @@ from reportlab.lib.units import mm
 from reportlab.pdfgen import canvas
 from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame
 from sqlalchemy import create_engine, text
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
+import argparse
+import hashlib
+import hmac
+import io
+import json
 import os
-import pandas as pd
+import re
+import sys
+import threading
+import zipfile
 from dotenv import load_dotenv
 from reportlab.lib.utils import ImageReader
 
@@ -17,12 +27,29 @@ DARK_BLUE = colors.Color(0/255, 51/255, 153/255)
 
 load_dotenv()
 db_uri = os.getenv("DB_URI")
-engine = create_engine(db_uri)
+# Pooled: the report service keeps connections open across requests
+engine = create_engine(db_uri, pool_pre_ping=True, pool_recycle=3600)
 
 # Get the absolute path to the project root directory
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 PSU_LOGO_PATH = os.path.join(PROJECT_ROOT, "frontend", "Public", "Images", "Prince Sultan Univeristy.png")
 
+# Batch mode: students fetched per round of set-based queries, and default render processes
+BATCH_FETCH_SIZE = 200
+BATCH_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Long-running report service (python3 generate_report.py --serve)
+REPORT_SERVICE_HOST = os.getenv("REPORT_SERVICE_HOST", "127.0.0.1")
+REPORT_SERVICE_PORT = int(os.getenv("REPORT_SERVICE_PORT", 5002))
+# Shared with the Node backend, which sends it as X-Report-Token; required off loopback
+REPORT_SERVICE_TOKEN = os.getenv("REPORT_SERVICE_TOKEN")
+
+# Rendered-PDF cache used by the service; 0 bytes disables it
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(PROJECT_ROOT, ".report_cache"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Bump when the report layout changes so PDFs cached in the old layout are not served
+REPORT_LAYOUT_VERSION = 1
+
 # Custom Page Template to add logo
 class LogoDocTemplate(BaseDocTemplate):
     def __init__(self, filename, **kwargs):
@@ -50,11 +77,7 @@ def safe_text(text):
     text = str(text).replace('–', '-').replace('—', '-')
     return text.encode('latin-1', 'ignore').decode('latin-1')
 
-def generate_student_report_reportlab(student_id):
-    # Use absolute path for PDF output
-    output_path = os.path.join(PROJECT_ROOT, f"student_{student_id}_report.pdf")
-    doc = SimpleDocTemplate(output_path, pagesize=A4, rightMargin=20, leftMargin=20, topMargin=20, bottomMargin=20)
-    elements = []
+def build_styles():
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(name='BigTitle', fontName='Times-Bold', fontSize=22, textColor=DARK_BLUE, alignment=TA_CENTER, spaceAfter=16))
     styles.add(ParagraphStyle(name='Heading', fontName='Times-Bold', fontSize=15, textColor=DARK_BLUE, spaceAfter=8))
@@ -72,31 +95,221 @@ def generate_student_report_reportlab(student_id):
     styles['BoldBody'].leading = 16
     styles['TableCell'].leading = 15
     styles['TableHeader'].leading = 15
+    return styles
 
-    # Add the logo as a normal image at the top (preserve aspect ratio)
-    logo_path = PSU_LOGO_PATH
-    if os.path.exists(logo_path):
+_styles = None
+_logo = None
+
+def get_styles():
+    # Styles are read-only once built, so each process builds them once
+    global _styles
+    if _styles is None:
+        _styles = build_styles()
+    return _styles
+
+def get_logo():
+    """(image bytes, width, height) for the header logo, read from disk once; None if missing."""
+    global _logo
+    if _logo is None:
+        if not os.path.exists(PSU_LOGO_PATH):
+            return None
+        with open(PSU_LOGO_PATH, "rb") as f:
+            logo_bytes = f.read()
         logo_width = 80  # in points (about 28mm)
-        img = ImageReader(logo_path)
-        iw, ih = img.getSize()
-        aspect = ih / float(iw)
-        logo_height = logo_width * aspect
-        elements.append(Image(logo_path, width=logo_width, height=logo_height, hAlign='RIGHT'))
+        iw, ih = ImageReader(io.BytesIO(logo_bytes)).getSize()
+        _logo = (logo_bytes, logo_width, logo_width * ih / float(iw))
+    return _logo
+
+# --- Data access ---
+# A report needs two round trips however many students it covers: the student header
+# (with the high-risk flag), and one scan of enrollments, absences and GPA history from
+# which every section is derived in memory. Plain DB-API cursors keep these small result
+# sets out of pandas.
+STUDENT_SQL = """
+    SELECT s.*, d.department_name, m.major_name,
+        a.Fname AS advisor_fname, a.Lname AS advisor_lname, a.email AS advisor_email,
+        EXISTS (SELECT 1 FROM High_Risk_Student h WHERE h.student_id = s.student_id) AS is_high_risk
+    FROM Student s
+    JOIN Department d ON s.department_id = d.department_id
+    JOIN Major m ON s.major_id = m.major_id
+    LEFT JOIN Advisor a ON s.advisor_id = a.advisor_id
+    WHERE s.student_id IN ({ids})
+"""
+
+RECORDS_SQL = """
+    SELECT 'enrollment' AS kind, e.student_id, e.course_id, e.semester, e.status, e.grade,
+           c.course_name, c.difficulty_rating, c.absence_limit, NULL AS absence_count, NULL AS gpa
+    FROM Student_Course_Enrollment e
+    JOIN Course c ON c.course_id = e.course_id
+    WHERE e.student_id IN ({ids})
+    UNION ALL
+    SELECT 'absence', a.student_id, a.course_id, a.semester, NULL, NULL,
+           NULL, NULL, NULL, a.absence_count, NULL
+    FROM Student_Course_Absence a
+    WHERE a.student_id IN ({ids})
+    UNION ALL
+    SELECT 'gpa', g.student_id, NULL, g.semester, NULL, NULL,
+           NULL, NULL, NULL, NULL, g.gpa
+    FROM Student_GPA_History g
+    WHERE g.student_id IN ({ids})
+"""
+
+_PLACEHOLDERS = {"qmark": "?", "format": "%s", "pyformat": "%s"}
+
+def _in_clause(sql, student_ids, repeat=1):
+    marker = _PLACEHOLDERS[engine.dialect.paramstyle]
+    return sql.format(ids=", ".join([marker] * len(student_ids))), list(student_ids) * repeat
+
+def _fetch_dicts(cursor, sql, params):
+    cursor.execute(sql, params)
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def _assemble_report(student, records):
+    enrollments, gpa = [], []
+    # LEFT JOIN semantics: every matching absence row yields a row, no match yields 0
+    absences_by_semester, absences_by_course = {}, {}
+    for r in records:
+        if r["kind"] == "enrollment":
+            enrollments.append(r)
+        elif r["kind"] == "absence":
+            absences_by_semester.setdefault((r["course_id"], r["semester"]), []).append(r["absence_count"])
+            absences_by_course.setdefault(r["course_id"], []).append(r["absence_count"])
+        else:
+            gpa.append({"semester": r["semester"], "gpa": r["gpa"]})
+
+    courses = {"Current": [], "Completed": [], "Leftover": []}
+    absence, suggestions, completed_courses = [], [], []
+    for e in enrollments:
+        for count in absences_by_semester.get((e["course_id"], e["semester"])) or [0]:
+            row = {"course_id": e["course_id"], "course_name": e["course_name"], "semester": e["semester"],
+                   "grade": e["grade"], "absences": count}
+            if e["status"] in courses:
+                courses[e["status"]].append(row)
+            if e["status"] == "Current":
+                absence.append(dict(row, absence_limit=e["absence_limit"]))
+        if e["status"] == "Current":
+            # Suggestions match absences on course and student only (no semester)
+            for count in absences_by_course.get(e["course_id"]) or [0]:
+                suggestions.append({"course_id": e["course_id"], "course_name": e["course_name"],
+                                    "difficulty_rating": e["difficulty_rating"], "absences": count,
+                                    "absence_limit": e["absence_limit"], "grade": e["grade"]})
+        elif e["status"] == "Completed":
+            completed_courses.append({"course_id": e["course_id"], "course_name": e["course_name"],
+                                      "difficulty_rating": e["difficulty_rating"], "grade": e["grade"]})
+
+    return {
+        "student": student,
+        "gpa": gpa,
+        "current": courses["Current"],
+        "completed": courses["Completed"],
+        "leftover": courses["Leftover"],
+        "absence": absence,
+        "high_risk": bool(student["is_high_risk"]),
+        "suggestions": suggestions,
+        "completed_courses": completed_courses,
+    }
+
+def fetch_report_data(student_ids):
+    """Load everything a report needs for many students in two queries.
+
+    Returns {student_id: data} for the students that exist; unknown ids are left out.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return {}
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        students = _fetch_dicts(cursor, *_in_clause(STUDENT_SQL, student_ids))
+        records = _fetch_dicts(cursor, *_in_clause(RECORDS_SQL, student_ids, repeat=3))
+        cursor.close()
+    finally:
+        conn.close()
+
+    by_student = {}
+    for r in records:
+        by_student.setdefault(r["student_id"], []).append(r)
+    students = {row["student_id"]: row for row in students}
+    return {
+        sid: _assemble_report(students[sid], by_student.get(sid, []))
+        for sid in student_ids if sid in students
+    }
+
+# --- Advisor suggestions ---
+RISK_GRADES = frozenset(["C+", "C", "D+", "D", "F", "W", "DN"])
+
+def _is_low_grade(grade):
+    try:
+        return bool(grade) and float(grade) < 60
+    except (ValueError, TypeError):
+        return False  # Skip non-numeric grades
+
+# Each rule is checked once per student ("student") or once per current course ("course"),
+# with prior set to the first completed course of the same difficulty and a risky grade.
+# Bullets come out course by course, in rule order; codes are what Student_Summary stores.
+SUGGESTION_RULES = [
+    {"code": "GPA_WARNING", "level": "student",
+     "when": lambda student, row, prior: student['current_gpa'] is not None and student['current_gpa'] < 2.0,
+     "message": lambda student, row, prior: f'<b>GPA Warning:</b> Current GPA ({student["current_gpa"]}) is below 2.0. Consider retaking courses with low grades.'},
+    {"code": "HIGH_DIFFICULTY", "level": "course",
+     "when": lambda student, row, prior: bool(row["difficulty_rating"]) and row["difficulty_rating"] >= 3,
+     "message": lambda student, row, prior: f'<b>High Difficulty:</b> Monitor {row["course_id"]} ({row["course_name"]})'},
+    {"code": "ABSENCE_WARNING", "level": "course",
+     "when": lambda student, row, prior: bool(row["absence_limit"]) and row["absences"] >= row["absence_limit"] * 0.75,
+     "message": lambda student, row, prior: f'<b>Absence Warning:</b> Absences in {row["course_id"]} nearing limit ({row["absences"]}/{row["absence_limit"]})'},
+    {"code": "LOW_GRADE", "level": "course",
+     "when": lambda student, row, prior: _is_low_grade(row["grade"]),
+     "message": lambda student, row, prior: f'<b>Low Grade:</b> Low grade in {row["course_id"]} ({row["course_name"]}). Consider seeking additional help or tutoring.'},
+    {"code": "PAST_PERFORMANCE_RISK", "level": "course",
+     "when": lambda student, row, prior: prior is not None,
+     "message": lambda student, row, prior: f'<b>Potential Risk Based on Past Performance:</b> {row["course_id"]} ({row["course_name"]}) has a difficulty similar to a previous course ({prior["course_id"]}) where you scored {prior["grade"]}.'},
+]
+STUDENT_RULES = [(r["code"], r["when"], r["message"]) for r in SUGGESTION_RULES if r["level"] == "student"]
+COURSE_RULES = [(r["code"], r["when"], r["message"]) for r in SUGGESTION_RULES if r["level"] == "course"]
+
+def evaluate_suggestions(report):
+    """[(rule code, bullet text), ...] for one student, in report order."""
+    student = report["student"]
+    # difficulty -> first completed course with a risky grade, built in one pass over the
+    # completed courses (only for difficulties a current course has) so each course is one lookup
+    wanted = {row["difficulty_rating"] for row in report["suggestions"]}
+    wanted.discard(None)
+    risky_by_difficulty = {}
+    for comp in report["completed_courses"]:
+        difficulty = comp["difficulty_rating"]
+        if difficulty in wanted and str(comp["grade"]).strip().upper() in RISK_GRADES:
+            risky_by_difficulty[difficulty] = comp
+            wanted.discard(difficulty)
+            if not wanted:
+                break
+
+    hits = [(code, message(student, None, None)) for code, when, message in STUDENT_RULES if when(student, None, None)]
+    for row in report["suggestions"]:
+        prior = risky_by_difficulty.get(row["difficulty_rating"])
+        for code, when, message in COURSE_RULES:
+            if when(student, row, prior):
+                hits.append((code, message(student, row, prior)))
+    return hits
+
+def suggestion_bullets(report):
+    return [text for _, text in evaluate_suggestions(report)]
+
+# --- Rendering ---
+def build_report_elements(report, styles):
+    student = report["student"]
+    elements = []
+
+    # Add the logo as a normal image at the top (preserve aspect ratio)
+    logo = get_logo()
+    if logo:
+        logo_bytes, logo_width, logo_height = logo
+        elements.append(Image(io.BytesIO(logo_bytes), width=logo_width, height=logo_height, hAlign='RIGHT'))
     elements.append(Spacer(1, 4))
     elements.append(Paragraph("Student Academic Report", styles['BigTitle']))
     elements.append(Spacer(1, 8))
 
     # Student Info
-    student_query = text("""
-        SELECT s.*, d.department_name, m.major_name,
-            a.Fname AS advisor_fname, a.Lname AS advisor_lname, a.email AS advisor_email
-        FROM Student s
-        JOIN Department d ON s.department_id = d.department_id
-        JOIN Major m ON s.major_id = m.major_id
-        LEFT JOIN Advisor a ON s.advisor_id = a.advisor_id
-        WHERE s.student_id = :student_id
-    """)
-    student = pd.read_sql(student_query, engine, params={"student_id": student_id}).iloc[0]
     elements.append(Paragraph("1. Student Information", styles['Heading']))
     info_list = [
         ("Full Name", f"{student['Fname']} {student['Lname']}"),
@@ -116,11 +329,10 @@ def generate_student_report_reportlab(student_id):
 
     # GPA History
     elements.append(Paragraph("2. Academic Performance History", styles['Heading']))
-    gpa_query = text("SELECT semester, gpa FROM Student_GPA_History WHERE student_id = :student_id")
-    gpa_df = pd.read_sql(gpa_query, engine, params={"student_id": student_id})
-    if not gpa_df.empty:
+    gpa_rows = report["gpa"]
+    if gpa_rows:
         gpa_data = [[Paragraph("Semester", styles['TableHeader']), Paragraph("GPA", styles['TableHeader'])]] + [
-            [Paragraph(safe_text(row[0]), styles['TableCell']), Paragraph(safe_text(row[1]), styles['TableCell'])] for row in gpa_df.values.tolist()
+            [Paragraph(safe_text(row["semester"]), styles['TableCell']), Paragraph(safe_text(row["gpa"]), styles['TableCell'])] for row in gpa_rows
         ]
         t = Table(gpa_data, colWidths=[70*mm, 30*mm])
         t.setStyle(TableStyle([
@@ -133,29 +345,17 @@ def generate_student_report_reportlab(student_id):
         elements.append(Spacer(1, 8))
 
     # Course Enrollments
-    def fetch_courses(status):
-        query = f"""
-        SELECT e.course_id, c.course_name, e.semester, e.grade,
-               COALESCE(a.absence_count, 0) AS absences
-        FROM Student_Course_Enrollment e
-        JOIN Course c ON c.course_id = e.course_id
-        LEFT JOIN Student_Course_Absence a 
-            ON e.student_id = a.student_id AND e.course_id = a.course_id AND e.semester = a.semester
-        WHERE e.status = :status AND e.student_id = :student_id
-        """
-        return pd.read_sql(text(query), engine, params={"student_id": student_id, "status": status})
-
     elements.append(Paragraph("3. Course Enrollments", styles['Heading']))
     # 3a
     elements.append(Paragraph("3a. Current Courses", styles['SubHeading']))
-    current_df = fetch_courses("Current")
-    if not current_df.empty:
+    current_rows = report["current"]
+    if current_rows:
         data = [[Paragraph(h, styles['TableHeader']) for h in ["ID", "Name", "Semester", "Grade", "Absences"]]] + [
             [Paragraph(safe_text(str(row["course_id"])), styles['TableCell']),
              Paragraph(safe_text(str(row["course_name"])), styles['TableCell']),
              Paragraph(safe_text(str(row["semester"])), styles['TableCell']),
              Paragraph(safe_text(str(row["grade"])), styles['TableCell']),
-             Paragraph(safe_text(str(row["absences"])), styles['TableCell'])] for _, row in current_df.iterrows()
+             Paragraph(safe_text(str(row["absences"])), styles['TableCell'])] for row in current_rows
         ]
         t = Table(data, colWidths=[25*mm, 60*mm, 30*mm, 20*mm, 20*mm])
         t.setStyle(TableStyle([
@@ -168,13 +368,13 @@ def generate_student_report_reportlab(student_id):
         elements.append(Spacer(1, 8))
     # 3b
     elements.append(Paragraph("3b. Completed Courses", styles['SubHeading']))
-    completed_df = fetch_courses("Completed")
-    if not completed_df.empty:
+    completed_rows = report["completed"]
+    if completed_rows:
         data = [[Paragraph(h, styles['TableHeader']) for h in ["ID", "Name", "Semester", "Grade"]]] + [
             [Paragraph(safe_text(str(row["course_id"])), styles['TableCell']),
              Paragraph(safe_text(str(row["course_name"])), styles['TableCell']),
              Paragraph(safe_text(str(row["semester"])), styles['TableCell']),
-             Paragraph(safe_text(str(row["grade"])), styles['TableCell'])] for _, row in completed_df.iterrows()
+             Paragraph(safe_text(str(row["grade"])), styles['TableCell'])] for row in completed_rows
         ]
         t = Table(data, colWidths=[25*mm, 70*mm, 30*mm, 20*mm])
         t.setStyle(TableStyle([
@@ -187,12 +387,12 @@ def generate_student_report_reportlab(student_id):
         elements.append(Spacer(1, 8))
     # 3c
     elements.append(Paragraph("3c. Leftover Courses", styles['SubHeading']))
-    leftover_df = fetch_courses("Leftover")
-    if not leftover_df.empty:
+    leftover_rows = report["leftover"]
+    if leftover_rows:
         data = [[Paragraph(h, styles['TableHeader']) for h in ["ID", "Name", "Semester"]]] + [
             [Paragraph(safe_text(str(row["course_id"])), styles['TableCell']),
              Paragraph(safe_text(str(row["course_name"])), styles['TableCell']),
-             Paragraph(safe_text(str(row["semester"])), styles['TableCell'])] for _, row in leftover_df.iterrows()
+             Paragraph(safe_text(str(row["semester"])), styles['TableCell'])] for row in leftover_rows
         ]
         t = Table(data, colWidths=[30*mm, 80*mm, 50*mm])
         t.setStyle(TableStyle([
@@ -206,26 +406,15 @@ def generate_student_report_reportlab(student_id):
 
     # 4. Absence Summary
     elements.append(Paragraph("4. Absence Summary", styles['Heading']))
-    absence_query = text("""
-        SELECT e.course_id, c.course_name, e.semester,
-               COALESCE(a.absence_count, 0) AS absences,
-               c.absence_limit
-        FROM Student_Course_Enrollment e
-        JOIN Course c ON c.course_id = e.course_id
-        LEFT JOIN Student_Course_Absence a 
-            ON e.student_id = a.student_id AND e.course_id = a.course_id AND e.semester = a.semester
-        WHERE e.status = 'Current' AND e.student_id = :student_id
-    """)
-    absence_df = pd.read_sql(absence_query, engine, params={"student_id": student_id})
-    absence_df["Status"] = absence_df.apply(lambda row: "Exceeded" if row["absences"] >= row["absence_limit"] else "OK", axis=1)
-    if not absence_df.empty:
+    absence_rows = [dict(row, Status="Exceeded" if row["absence_limit"] is not None and row["absences"] >= row["absence_limit"] else "OK") for row in report["absence"]]
+    if absence_rows:
         data = [[Paragraph(h, styles['TableHeader']) for h in ["ID", "Name", "Semester", "Absences", "Limit", "Status"]]] + [
             [Paragraph(safe_text(str(row["course_id"])), styles['TableCell']),
              Paragraph(safe_text(str(row["course_name"])), styles['TableCell']),
              Paragraph(safe_text(str(row["semester"])), styles['TableCell']),
              Paragraph(safe_text(str(row["absences"])), styles['TableCell']),
              Paragraph(safe_text(str(row["absence_limit"])), styles['TableCell']),
-             Paragraph(safe_text(str(row["Status"])), styles['TableCell'])] for _, row in absence_df.iterrows()
+             Paragraph(safe_text(str(row["Status"])), styles['TableCell'])] for row in absence_rows
         ]
         t = Table(data, colWidths=[25*mm, 60*mm, 30*mm, 20*mm, 20*mm, 20*mm])
         t.setStyle(TableStyle([
@@ -238,58 +427,13 @@ def generate_student_report_reportlab(student_id):
         elements.append(Spacer(1, 8))
 
     # 5. High Risk
-    risk_check = pd.read_sql(text("SELECT 1 FROM High_Risk_Student WHERE student_id = :student_id"), engine, params={"student_id": student_id})
-    if not risk_check.empty:
+    if report["high_risk"]:
         elements.append(Paragraph('<font color="red"><b>⚠️ This student is classified as high risk due to a cumulative GPA below 2.0. Immediate academic advising is recommended.</b></font>', styles['Body']))
         elements.append(Spacer(1, 8))
 
     # 6. Advisor Suggestions (auto-suggestions)
     elements.append(Paragraph("6. Advisor Suggestions", styles['Heading']))
-    suggestions_query = text("""
-        SELECT c.course_id, c.course_name, c.difficulty_rating,
-               COALESCE(a.absence_count, 0) AS absences, c.absence_limit,
-               e.grade
-        FROM Student_Course_Enrollment e
-        JOIN Course c ON c.course_id = e.course_id
-        LEFT JOIN Student_Course_Absence a ON a.course_id = c.course_id AND a.student_id = e.student_id
-        WHERE e.student_id = :student_id AND e.status = 'Current'
-    """)
-    suggestions = pd.read_sql(suggestions_query, engine, params={"student_id": student_id})
-
-    # Fetch completed courses with grades and difficulty
-    completed_courses_query = text("""
-        SELECT c.course_id, c.course_name, c.difficulty_rating, e.grade
-        FROM Student_Course_Enrollment e
-        JOIN Course c ON c.course_id = e.course_id
-        WHERE e.student_id = :student_id AND e.status = 'Completed'
-    """)
-    completed_courses = pd.read_sql(completed_courses_query, engine, params={"student_id": student_id})
-
-    bullet_points = []
-    # GPA-based suggestion
-    if student['current_gpa'] < 2.0:
-        bullet_points.append('<b>GPA Warning:</b> Current GPA (' + str(student['current_gpa']) + ') is below 2.0. Consider retaking courses with low grades.')
-    # Course-specific suggestions
-    for _, row in suggestions.iterrows():
-        if row["difficulty_rating"] and row["difficulty_rating"] >= 3:
-            bullet_points.append(f'<b>High Difficulty:</b> Monitor {row["course_id"]} ({row["course_name"]})')
-        if row["absence_limit"] and row["absences"] >= row["absence_limit"] * 0.75:
-            bullet_points.append(f'<b>Absence Warning:</b> Absences in {row["course_id"]} nearing limit ({row["absences"]}/{row["absence_limit"]})')
-        grade = row["grade"]
-        try:
-            if grade and float(grade) < 60:
-                bullet_points.append(f'<b>Low Grade:</b> Low grade in {row["course_id"]} ({row["course_name"]}). Consider seeking additional help or tutoring.')
-        except (ValueError, TypeError):
-            pass  # Skip non-numeric grades
-        # --- New: Potential Risk Based on Past Performance ---
-        risk_grades = ["C+", "C", "D+", "D", "F", "W", "DN"]
-        for _, comp in completed_courses.iterrows():
-            if (
-                comp["difficulty_rating"] == row["difficulty_rating"]
-                and str(comp["grade"]).strip().upper() in risk_grades
-            ):
-                bullet_points.append(f'<b>Potential Risk Based on Past Performance:</b> {row["course_id"]} ({row["course_name"]}) has a difficulty similar to a previous course ({comp["course_id"]}) where you scored {comp["grade"]}.')
-                break
+    bullet_points = suggestion_bullets(report)
     if bullet_points:
         elements.append(ListFlowable([
             ListItem(Paragraph(safe_text(bp), styles['Body'])) for bp in bullet_points
@@ -303,21 +447,308 @@ def generate_student_report_reportlab(student_id):
     elements.append(Paragraph("[__________________________]", styles['Body']))
     elements.append(Paragraph("(Advisor can add manual comments here)", styles['Body']))
 
-    doc.build(elements)
+    return elements
+
+def render_report(data, output):
+    """Render one student's report to a path or a binary file object."""
+    doc = SimpleDocTemplate(output, pagesize=A4, rightMargin=20, leftMargin=20, topMargin=20, bottomMargin=20)
+    doc.build(build_report_elements(data, get_styles()))
+
+def render_report_bytes(data):
+    buf = io.BytesIO()
+    render_report(data, buf)
+    return buf.getvalue()
+
+def _render_job(student_id, data):
+    # Runs in a worker process; returns the PDF so the parent does all the writing
+    return student_id, render_report_bytes(data)
+
+def generate_student_report_reportlab(student_id):
+    # Use absolute path for PDF output
+    output_path = os.path.join(PROJECT_ROOT, f"student_{student_id}_report.pdf")
+    data = fetch_report_data([student_id]).get(student_id)
+    if data is None:
+        raise ValueError(f"Student {student_id} not found")
+    render_report(data, output_path)
     print(f"✅ PDF saved to {output_path} (ReportLab version)")
 
-if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 2:
-        print("Usage: python3 generate_report.py <student_id>")
-        sys.exit(1)
+# --- Batch mode ---
+def select_student_ids(advisor_id=None, department_id=None, high_risk=False, at_risk=False):
+    if advisor_id is not None:
+        query, params = "SELECT student_id FROM Student WHERE advisor_id = :value ORDER BY student_id", {"value": str(advisor_id)}
+    elif department_id is not None:
+        query, params = "SELECT student_id FROM Student WHERE department_id = :value ORDER BY student_id", {"value": str(department_id)}
+    elif high_risk:
+        query, params = "SELECT student_id FROM High_Risk_Student ORDER BY student_id", {}
+    elif at_risk:
+        from student_summary import AT_RISK_CONDITION
+        query, params = f"SELECT student_id FROM Student_Summary WHERE {AT_RISK_CONDITION} ORDER BY student_id", {}
+    else:
+        raise ValueError("Choose an advisor, a department, the high-risk list or the at-risk summary")
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(query), params)]
+
+class ReportSink:
+    """Writes finished PDFs into a directory, or into a zip when the target ends in .zip."""
+
+    def __init__(self, target):
+        self.target = target
+        self.zip = None
+        if target.lower().endswith(".zip"):
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            # PDF streams are already compressed, so store them as-is
+            self.zip = zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED)
+        else:
+            os.makedirs(target, exist_ok=True)
+
+    def write(self, student_id, pdf_bytes):
+        name = f"student_{student_id}_report.pdf"
+        if self.zip is not None:
+            self.zip.writestr(name, pdf_bytes)
+        else:
+            with open(os.path.join(self.target, name), "wb") as f:
+                f.write(pdf_bytes)
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+
+def generate_reports_batch(student_ids, output, workers=BATCH_WORKERS, fetch_size=BATCH_FETCH_SIZE):
+    """Render reports for many students into a directory or .zip.
+
+    Data is prefetched fetch_size students at a time; while the pool renders one
+    group, the next group is loaded, and PDFs are written as soon as they finish.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    groups = [student_ids[i:i + fetch_size] for i in range(0, len(student_ids), fetch_size)]
+    summary = {"requested": len(student_ids), "written": 0, "missing": [], "failed": {}}
+    sink = ReportSink(output)
+
+    def submit(pool, group):
+        data = fetch_report_data(group)
+        summary["missing"].extend(sid for sid in group if sid not in data)
+        return {pool.submit(_render_job, sid, d): sid for sid, d in data.items()}
+
     try:
-        student_id = int(sys.argv[1])
-        print(f"Running generate_student_report_reportlab for student_id={student_id}...")
-        generate_student_report_reportlab(student_id=student_id)
-    except ValueError:
-        print("Error: student_id must be an integer")
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+            pending = submit(pool, groups[0]) if groups else {}
+            for next_group in groups[1:] + [None]:
+                upcoming = submit(pool, next_group) if next_group else {}
+                for future in as_completed(pending):
+                    try:
+                        sid, pdf_bytes = future.result()
+                    except Exception as e:
+                        summary["failed"][pending[future]] = str(e)
+                        continue
+                    sink.write(sid, pdf_bytes)
+                    summary["written"] += 1
+                pending = upcoming
+    finally:
+        sink.close()
+    return summary
+
+# --- Report cache ---
+def report_fingerprint(data):
+    """Hash of every row a report is rendered from; any grade, absence or GPA change alters it."""
+    payload = json.dumps([REPORT_LAYOUT_VERSION, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+class ReportCache:
+    """Bounded on-disk LRU of rendered PDFs, one entry per student.
+
+    Files are named student_<id>_<fingerprint>.pdf. A lookup with a different
+    fingerprint is a miss, and storing the new PDF replaces the student's old one.
+    Recency is kept in file mtimes so the LRU order survives restarts.
+    """
+
+    FILE_RE = re.compile(r"student_(\d+)_([0-9a-f]{32})\.pdf")
+
+    def __init__(self, directory=REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # student_id -> (fingerprint, size), least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, student_id, fingerprint):
+        return os.path.join(self.directory, f"student_{student_id}_{fingerprint}.pdf")
+
+    def _load(self):
+        found = []
+        for name in os.listdir(self.directory):
+            m = self.FILE_RE.fullmatch(name)
+            if m:
+                st = os.stat(os.path.join(self.directory, name))
+                found.append((st.st_mtime, int(m.group(1)), m.group(2), st.st_size))
+        for _, student_id, fingerprint, size in sorted(found):
+            self._drop(student_id)  # an older file for the same student
+            self.entries[student_id] = (fingerprint, size)
+            self.total_bytes += size
+        self._evict()
+
+    def _drop(self, student_id):
+        entry = self.entries.pop(student_id, None)
+        if entry:
+            self.total_bytes -= entry[1]
+            try:
+                os.remove(self._path(student_id, entry[0]))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._drop(next(iter(self.entries)))
+
+    def get(self, student_id, fingerprint):
+        with self.lock:
+            entry = self.entries.get(student_id)
+            if entry and entry[0] == fingerprint:
+                path = self._path(student_id, fingerprint)
+                try:
+                    with open(path, "rb") as f:
+                        pdf_bytes = f.read()
+                    os.utime(path)
+                except FileNotFoundError:
+                    self.entries.pop(student_id)
+                    self.total_bytes -= entry[1]
+                else:
+                    self.entries.move_to_end(student_id)
+                    self.hits += 1
+                    return pdf_bytes
+            self.misses += 1
+            return None
+
+    def put(self, student_id, fingerprint, pdf_bytes):
+        path = self._path(student_id, fingerprint)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_bytes)
+        with self.lock:
+            entry = self.entries.get(student_id)
+            if entry and entry[0] == fingerprint:
+                os.remove(tmp_path)  # a concurrent request already stored it
+                return
+            self._drop(student_id)
+            os.replace(tmp_path, path)
+            self.entries[student_id] = (fingerprint, len(pdf_bytes))
+            self.total_bytes += len(pdf_bytes)
+            self._evict()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+def get_report_pdf(student_id, cache=None):
+    """PDF bytes for one student and whether they came from the cache; (None, False) if unknown."""
+    data = fetch_report_data([student_id]).get(student_id)
+    if data is None:
+        return None, False
+    fingerprint = report_fingerprint(data)
+    if cache is not None:
+        pdf_bytes = cache.get(student_id, fingerprint)
+        if pdf_bytes is not None:
+            return pdf_bytes, True
+    pdf_bytes = render_report_bytes(data)
+    if cache is not None:
+        cache.put(student_id, fingerprint, pdf_bytes)
+    return pdf_bytes, False
+
+# --- Report service ---
+def create_report_app(cache=None, token=REPORT_SERVICE_TOKEN):
+    """Flask app serving report PDFs straight from memory (no files on disk).
+
+    With a token, /report only answers requests whose X-Report-Token matches it.
+    """
+    from flask import Flask, Response, jsonify, request
+
+    app = Flask(__name__)
+
+    @app.route('/report/<int:student_id>')
+    def report(student_id):
+        if token and not hmac.compare_digest(request.headers.get('X-Report-Token', '').encode(), token.encode()):
+            return jsonify({'error': 'Invalid or missing X-Report-Token'}), 401
+        try:
+            pdf_bytes, cached = get_report_pdf(student_id, cache)
+            if pdf_bytes is None:
+                return jsonify({'error': f'Student {student_id} not found'}), 404
+        except Exception as e:
+            print(f"Error generating report for {student_id}: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+        return Response(pdf_bytes, mimetype='application/pdf', headers={
+            'Content-Disposition': f'attachment; filename=student_{student_id}_report.pdf',
+            'X-Report-Cache': 'hit' if cached else 'miss'
+        })
+
+    @app.route('/health')
+    def health_check():
+        status = {'status': 'healthy'}
+        if cache is not None:
+            status['cache'] = cache.stats()
+        return jsonify(status), 200
+
+    return app
+
+def serve(host=REPORT_SERVICE_HOST, port=REPORT_SERVICE_PORT):
+    # Student reports must not be reachable by anyone who can reach the port
+    if not REPORT_SERVICE_TOKEN and host not in ("127.0.0.1", "localhost", "::1"):
+        sys.exit(f"Refusing to serve reports on {host} without REPORT_SERVICE_TOKEN")
+    # Warm everything a request needs before accepting traffic
+    get_styles()
+    get_logo()
+    with engine.connect():
+        pass
+    cache = ReportCache() if REPORT_CACHE_MAX_BYTES > 0 else None
+    print(f"✅ Report service listening on http://{host}:{port}")
+    create_report_app(cache).run(host=host, port=port, threaded=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate student academic reports (PDF).")
+    parser.add_argument("student_id", nargs="?", type=int, help="Single student; writes student_<id>_report.pdf in the project root")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--advisor", help="Batch: every student of this advisor")
+    group.add_argument("--department", help="Batch: every student in this department")
+    group.add_argument("--high-risk", action="store_true", help="Batch: every student in High_Risk_Student")
+    group.add_argument("--at-risk", action="store_true", help="Batch: every at-risk student in Student_Summary (see student_summary.py)")
+    parser.add_argument("--out", default=os.path.join(PROJECT_ROOT, "reports"), help="Batch output directory, or a .zip path")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Render processes for batch mode")
+    parser.add_argument("--serve", action="store_true", help="Run the long-running report service instead")
+    parser.add_argument("--host", default=REPORT_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=REPORT_SERVICE_PORT)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.host, args.port)
+        return
+
+    batch = args.advisor is not None or args.department is not None or args.high_risk or args.at_risk
+    if batch == (args.student_id is not None):
+        parser.error("give either a student_id or one of --advisor/--department/--high-risk/--at-risk")
+
+    if not batch:
+        print(f"Running generate_student_report_reportlab for student_id={args.student_id}...")
+        generate_student_report_reportlab(student_id=args.student_id)
+        return
+
+    student_ids = select_student_ids(advisor_id=args.advisor, department_id=args.department,
+                                     high_risk=args.high_risk, at_risk=args.at_risk)
+    print(f"Generating {len(student_ids)} reports into {args.out} with {args.workers} workers...")
+    summary = generate_reports_batch(student_ids, args.out, workers=args.workers)
+    print(f"✅ {summary['written']}/{summary['requested']} reports written to {args.out}")
+    if summary["missing"]:
+        print(f"Skipped (not found): {summary['missing']}")
+    for sid, error in summary["failed"].items():
+        print(f"Failed for student {sid}: {error}")
+    if summary["failed"]:
         sys.exit(1)
+
+if __name__ == "__main__":
+    try:
+        main()
     except Exception as e:
         print(f"Error generating report: {str(e)}")
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
@@ -2,7 +2,7 @@ import os
 import warnings
 import asyncio
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import inspect
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain.agents import create_sql_agent
 from langchain.agents.agent_types import AgentType
@@ -11,9 +11,21 @@ from langchain.tools.tavily_search import TavilySearchResults
 from crewai import Agent, Crew, Task
 from senior.tools.pinecone_search_tool import PineconeSearchTool
 from senior.tools.pdf_tool import PDFSearchTool
+from senior.tools.text_to_sql import TextToSQL
+from senior.tools.sql_engine import create_shared_engine, pool_status, QueryResultCache, install_write_invalidation
+from senior.tools.tracing import tracer, record_crew_usage
+from senior.tools.sessions import SessionStore
+from senior.tools.single_flight import SingleFlight
+from senior.tools.admission import AdmissionController, Overloaded, DeadlineExceeded, check_deadline
+from student_summary import SUMMARY_TABLE, SUMMARY_TABLE_INFO
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import re
+import hmac
+import time
+from contextlib import contextmanager
+from functools import wraps
+import uuid
 
 # --- Setup ---
 warnings.filterwarnings('ignore')
@@ -24,6 +36,12 @@ db_uri = os.getenv("DB_URI")
 # --- App Config ---
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SESSION_SECRET')
+# Shared secret for the state-changing operational endpoints (sent as X-Admin-Token);
+# while it is unset those endpoints refuse every request
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+# Shared secret the frontend proxy sends as X-Proxy-Secret; the caller identity headers
+# it sets (X-User-Type, X-User-Id) are only trusted on requests that carry it
+PROXY_SECRET = os.getenv('PROXY_SECRET')
 
 # Configure CORS
 cors_origin = os.getenv('FRONTEND_URL', '*')
@@ -43,25 +61,44 @@ CORS(app, resources={
     }
 })
 
-# DB Connection
-engine = create_engine(db_uri)
-with engine.connect() as conn:
-    print("✅ Connected to DB. Tables:")
-    for row in conn.execute(text("SHOW TABLES")):
-        print("-", row[0])
+# DB Connection: one tuned pool (sizing, pre-ping, recycle) shared by every SQL path below
+engine = create_shared_engine(db_uri)
+print("✅ Connected to DB. Tables:")
+for table_name in inspect(engine).get_table_names():
+    print("-", table_name)
 
 # LangChain SQL
-db = SQLDatabase.from_uri(db_uri)
-llm = ChatOpenAI(api_key=openai_api_key, model="gpt-4o-mini", temperature=0)
+# Student_Summary (student_summary.py) gets a described schema so risk questions read one row
+db = SQLDatabase(engine, custom_table_info={SUMMARY_TABLE: SUMMARY_TABLE_INFO})
+# The tracing handler counts every LLM call and its tokens into the current span
+llm = ChatOpenAI(api_key=openai_api_key, model="gpt-4o-mini", temperature=0, callbacks=[tracer.callback_handler])
 sql_agent_executor = create_sql_agent(llm=llm, db=db, agent_type=AgentType.OPENAI_FUNCTIONS, verbose=False)
+# Recurring question shapes (GPA, current courses, absences, ...) run as parameterized
+# templates with no LLM call; the rest go through the cached-schema prompt, one LLM call per
+# question, and the agent above (list_tables/schema/query_checker round trips) only runs when
+# that fails. Promote recurring logged SQL with `python -m senior.tools.text_to_sql`.
+# Short-TTL read-through cache of query results; writes through `engine` and
+# POST /db/cache/invalidate drop the affected tables' entries early
+sql_result_cache = QueryResultCache()
+install_write_invalidation(engine, sql_result_cache)
+text_to_sql = TextToSQL(engine, llm, fallback=sql_agent_executor, result_cache=sql_result_cache)
+# Conversations keyed by session_id: follow-ups are rewritten into standalone questions
+# and reuse the session's SQL results and retrieved context while they still apply
+chat_sessions = SessionStore(llm)
+# Identical general questions arriving together share one pipeline run (see single_flight.py)
+chatbot_flights = SingleFlight()
+# Bounded priority queue in front of the pipeline: limited concurrent runs, a deadline per
+# request, and a fast 503 with Retry-After when a request could not be answered in time
+chatbot_admission = AdmissionController()
 
 # --- Tools ---
 pinecone_tool = PineconeSearchTool(index_name="psu-web-auto")
-tavily_tool = TavilySearchResults(k=3, search_kwargs={"site": "psu.edu.sa"})
+tavily_tool = TavilySearchResults(k=3, search_kwargs={"site": "psu.edu.sa"}, callbacks=[tracer.callback_handler])
 advisor_manual_tool = PDFSearchTool(pdf_path="senior/AdvisingManualIndexing/Advising Manual.pdf").get_tool()
 # --- Agents ---
 db_schema = (
     "Tables: Student, Course, GPA_History, Absence, Advisor, Enrollment, Department, Major.\n"
+    "Student_Summary has one precomputed row per student with risk flags, absence ratios and suggestion codes.\n"
 )
 
 sql_agent = Agent(
@@ -122,8 +159,51 @@ def is_useful(text: str) -> bool:
     bad = ["no result", "not found", "no data", "not available", "empty"]
     return not any(b in text.lower() for b in bad)
 
+def run_retrieval_crews(user_prompt):
+    """PSU web + advising manual crew, then the advisor crew; returns (web_result, advisor_result)."""
+    print("🔎 Running PSU Web Agent...")
+    PSU_Web_rag_task = Task(
+        description=f"The user asked: {user_prompt}. Respond with a clear and accurate answer based only on PSU website content.",
+        expected_output="An accurate answer using only information from the PSU website documents.",
+        agent=psu_web_agent
+    )
+
+    advisor_task = Task(
+        description=f"The student asked: {user_prompt}. Provide a clear and accurate advising answer using the knowledge you have.",
+        expected_output="A complete and helpful advising answer based on PSU's advising manual.",
+        agent=advisor_agent
+    )
+    crew.tasks = [PSU_Web_rag_task, advisor_task]
+    with tracer.span("crew.web_advisor") as span:
+        web_result = crew.kickoff()
+        record_crew_usage(span, web_result)
+    # Filter Tavily results to only include psu.edu.sa
+    if isinstance(web_result, list):
+        web_result = [r for r in web_result if 'psu.edu.sa' in (r.get('url') or '')]
+    elif isinstance(web_result, str) and 'psu.edu' in web_result:
+        # Optionally, you can do a more advanced filter for string results
+        lines = web_result.split('\n')
+        web_result = '\n'.join([line for line in lines if 'psu.edu.sa' in line or 'http' not in line])
+
+    print("🧑‍💼 Running Advisor Agent...")
+    advisor_task = Task(
+        description=f"The user asked: {user_prompt}. Provide advising guidance based on the PSU manual.",
+        expected_output="A clear and accurate advising answer based on PSU's policies.",
+        agent=advisor_agent
+    )
+    crew.tasks = [advisor_task]
+    try:
+        with tracer.span("crew.advisor") as span:
+            advisor_result = crew.kickoff()
+            record_crew_usage(span, advisor_result)
+        print(f"Advisor Agent Output: {advisor_result!r}")
+    except Exception as e:
+        print(f"Advisor Agent Error: {e}")
+        advisor_result = f"Advisor Error: {e}"
+    return web_result, advisor_result
+
 # --- Main Loop ---
-async def faculty_advisor_chatbot(prompt=None):
+async def faculty_advisor_chatbot(prompt=None, session=None, deadline=None):
     print("\n🤖 PSU Academic Advisor Chatbot (Faculty Mode)")
     print("Type 'exit' to quit.\n")
 
@@ -131,53 +211,40 @@ async def faculty_advisor_chatbot(prompt=None):
         user_prompt = prompt if prompt else input("Ask anything> ").strip()
         if user_prompt.lower() == "exit":
             break
+        question = user_prompt
+        if session is not None:
+            user_prompt = chat_sessions.standalone_question(session, question)
 
-        print("🔍 Running SQL Agent...")
-        try:
-            sql_result_dict = sql_agent_executor.invoke({"input": user_prompt})
-            sql_result = sql_result_dict.get("output", "No response generated.")
-        except Exception as e:
-            sql_result = f"SQL Error: {e}"
+        sql_result = session.cached_sql(user_prompt) if session is not None else None
+        if sql_result is not None:
+            print("♻️ Reusing SQL result from this session")
+            chat_sessions.count("sql_reused")
+        else:
+            print("🔍 Running SQL Agent...")
+            try:
+                sql_result = text_to_sql.answer(user_prompt)
+                if session is not None:
+                    session.remember_sql(user_prompt, sql_result)
+            except Exception as e:
+                sql_result = f"SQL Error: {e}"
 
-        print("🔎 Running PSU Web Agent...")
-        PSU_Web_rag_task = Task(
-            description=f"The user asked: {user_prompt}. Respond with a clear and accurate answer based only on PSU website content.",
-            expected_output="An accurate answer using only information from the PSU website documents.",
-            agent=psu_web_agent
-        )
-
-        advisor_task = Task(
-            description=f"The student asked: {user_prompt}. Provide a clear and accurate advising answer using the knowledge you have.",
-            expected_output="A complete and helpful advising answer based on PSU's advising manual.",
-            agent=advisor_agent
-        )
-        crew.tasks = [PSU_Web_rag_task, advisor_task]
-        web_result = crew.kickoff()
-        # Filter Tavily results to only include psu.edu.sa
-        if isinstance(web_result, list):
-            web_result = [r for r in web_result if 'psu.edu.sa' in (r.get('url') or '')]
-        elif isinstance(web_result, str) and 'psu.edu' in web_result:
-            # Optionally, you can do a more advanced filter for string results
-            lines = web_result.split('\n')
-            web_result = '\n'.join([line for line in lines if 'psu.edu.sa' in line or 'http' not in line])
-
-        print("🧑‍💼 Running Advisor Agent...")
-        advisor_task = Task(
-            description=f"The user asked: {user_prompt}. Provide advising guidance based on the PSU manual.",
-            expected_output="A clear and accurate advising answer based on PSU's policies.",
-            agent=advisor_agent
-        )
-        crew.tasks = [advisor_task]
-        try:
-            advisor_result = crew.kickoff()
-            print(f"Advisor Agent Output: {advisor_result!r}")
-        except Exception as e:
-            print(f"Advisor Agent Error: {e}")
-            advisor_result = f"Advisor Error: {e}"
+        check_deadline(deadline, "retrieval")
+        reused = session.cached_retrieval(user_prompt) if session is not None else None
+        if reused is not None:
+            print("♻️ Reusing PSU web and advisor context from this session")
+            chat_sessions.count("retrieval_reused")
+            web_result, advisor_result = reused["web"], reused["advisor"]
+        else:
+            web_result, advisor_result = run_retrieval_crews(user_prompt)
+            if session is not None:
+                session.remember_retrieval(user_prompt, str(web_result), str(advisor_result))
 
+        check_deadline(deadline, "quality merge")
         print("✅ Evaluating best result with Quality Agent (all three)...")
+        history = session.history_text() if session is not None else ""
         comparison_task = Task(
             description=(
+                (f"Conversation so far:\n{history}\n\n" if history else "") +
                 f"The user asked: '{user_prompt}'. Compare the following responses:\n\n"
                 f"SQL Agent Response:\n{sql_result}\n\n"
                 f"PSU Web Agent Response:\n{web_result}\n\n"
@@ -188,8 +255,12 @@ async def faculty_advisor_chatbot(prompt=None):
             agent=quality_agent
         )
         crew.tasks = [comparison_task]
-        final_result = crew.kickoff()
+        with tracer.span("crew.quality_merge") as span:
+            final_result = crew.kickoff()
+            record_crew_usage(span, final_result)
         print("\n🎓 Final Answer (Faculty):\n", final_result)
+        if session is not None:
+            chat_sessions.finish_turn(session, question, user_prompt, str(final_result))
         return final_result
 
 def clean_and_format_response(text):
@@ -201,6 +272,43 @@ def clean_and_format_response(text):
     text = re.sub(r"\n{3,}", "\n\n", text)
     return text
 
+@contextmanager
+def session_lock_held(session):
+    """Release a session lock acquired (with a timeout) before entering."""
+    try:
+        yield session
+    finally:
+        session.lock.release()
+
+def from_proxy() -> bool:
+    """True when the request carries the frontend proxy's shared secret."""
+    secret = request.headers.get('X-Proxy-Secret', '')
+    return bool(PROXY_SECRET) and hmac.compare_digest(secret.encode(), PROXY_SECRET.encode())
+
+def caller_user_type() -> str:
+    """Admission priority class: the proxy's X-User-Type, or anonymous for anyone else."""
+    if not from_proxy():
+        return 'anonymous'
+    return request.headers.get('X-User-Type') or 'anonymous'
+
+def caller_owner():
+    """Owner key for chat sessions: the logged-in user the proxy vouches for, else None."""
+    user_id = request.headers.get('X-User-Id')
+    if not user_id or not from_proxy():
+        return None
+    return f"{caller_user_type()}:{user_id}"
+
+def require_admin_token(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        token = request.headers.get('X-Admin-Token', '')
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Admin endpoints are disabled (ADMIN_TOKEN is not set)'}), 403
+        if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({'error': 'Invalid or missing X-Admin-Token'}), 401
+        return view(*args, **kwargs)
+    return wrapped
+
 @app.route('/chatbot', methods=['POST'])
 def chatbot():
     try:
@@ -209,16 +317,55 @@ def chatbot():
             return jsonify({'error': 'No prompt provided'}), 400
 
         print(f"Received prompt: {user_prompt}")  # Debug log
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        # Unknown, expired or someone else's ids start a new session under a fresh id;
+        # clients send back the id they get
+        session = chat_sessions.get(request.json.get('session_id') or request.headers.get('X-Session-ID'),
+                                    owner=caller_owner())
+        # Priority comes from the login session, via the proxy; direct callers are anonymous
+        user_type = caller_user_type()
+        deadline = chatbot_admission.deadline_for(request.headers.get('X-Deadline-Ms'))
 
         # Create new event loop
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
-            final_result = loop.run_until_complete(faculty_advisor_chatbot(user_prompt))
+            # A second request on the same session waits for the first, but not past its deadline
+            if not session.lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise Overloaded("session busy", chatbot_admission.retry_after())
+            with session_lock_held(session), \
+                    tracer.request(request_id, prompt_chars=len(user_prompt), turn=len(session.turns)) as span, \
+                    chat_sessions.serving(session):
+                def run():
+                    with chatbot_admission.admit(user_type, deadline) as ticket:
+                        span.set(priority=ticket.priority, queue_wait_ms=round(1000 * ticket.wait, 1))
+                        return loop.run_until_complete(faculty_advisor_chatbot(user_prompt, session, deadline)), session
+
+                # Follow-ups depend on their conversation, so only a session's first turn is shared.
+                # Requests joining a run in flight wait for it without taking a slot of their own;
+                # if the leader is shed or runs out of time, each waiter is admitted on its own
+                # priority and deadline instead of inheriting the leader's 503/504.
+                key = chatbot_flights.key(user_prompt) if not session.turns else None
+                (final_result, source), shared = chatbot_flights.do(
+                    key, run, timeout=max(0.0, deadline - time.monotonic()), rerun_on=(Overloaded, DeadlineExceeded))
+                if shared:
+                    session.adopt(source)
+                    chat_sessions.finish_turn(session, user_prompt, user_prompt, str(final_result))
+                span.set(coalesced=shared)
             print(f"Final result: {final_result}")  # Debug log
             # Clean and format the response before returning
             final_result = clean_and_format_response(final_result)
-            return jsonify({'answer': final_result})
+            response = jsonify({'answer': final_result, 'session_id': session.session_id})
+            response.headers['X-Request-ID'] = request_id
+            response.headers['X-Session-ID'] = session.session_id
+            return response
+        except Overloaded as e:
+            response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503
+        except (DeadlineExceeded, TimeoutError) as e:
+            chatbot_admission.count('deadline_exceeded')
+            return jsonify({'error': f"Request deadline exceeded: {e}"}), 504
         except Exception as e:
             print(f"Error in async operation: {str(e)}")  # Debug log
             return jsonify({'error': str(e)}), 500
@@ -228,10 +375,52 @@ def chatbot():
         print(f"Error in route handler: {str(e)}")  # Debug log
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chatbot/session/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    # Only the session's owner (the same logged-in user, or for anonymous sessions whoever
+    # holds the id) can end it; anything else looks like an unknown id
+    if not chat_sessions.drop(session_id, owner=caller_owner()):
+        return jsonify({'deleted': False}), 404
+    return jsonify({'deleted': True}), 200
+
 @app.route('/health')
 def health_check():
     return jsonify({'status': 'healthy'}), 200
 
+@app.route('/metrics')
+def metrics():
+    # Per-span latency, LLM calls, tokens and cache hits aggregated over traced requests
+    return jsonify({**tracer.metrics(), 'sql_result_cache': sql_result_cache.stats(),
+                    'sessions': chat_sessions.stats(), 'single_flight': chatbot_flights.stats(),
+                    'admission': chatbot_admission.stats()}), 200
+
+@app.route('/metrics/tracing', methods=['POST'])
+@require_admin_token
+def toggle_tracing():
+    body = request.get_json(silent=True) or {}
+    if 'enabled' in body:
+        tracer.enabled = bool(body['enabled'])
+    if body.get('reset'):
+        tracer.reset()
+    return jsonify({'enabled': tracer.enabled}), 200
+
+@app.route('/db/stats')
+def db_stats():
+    return jsonify({
+        'pool': pool_status(engine),
+        'result_cache': sql_result_cache.stats(),
+        'sql_paths': text_to_sql.stats,
+        'template_hits': dict(text_to_sql.templates.hits),
+    }), 200
+
+@app.route('/db/cache/invalidate', methods=['POST'])
+@require_admin_token
+def invalidate_sql_cache():
+    # Called by whatever writes grades/absences/enrollments outside this process
+    tables = (request.get_json(silent=True) or {}).get('tables') or []
+    dropped = sql_result_cache.invalidate(*tables)
+    return jsonify({'invalidated': dropped, 'tables': tables or 'all'}), 200
+
 # --- Run ---
 if __name__ == "__main__":
     port = int(os.getenv('PORT', 5001))
@@ -0,0 +1,132 @@
+"""Tail latency under overload, with and without admission control.
+
+Requests arrive as a Poisson stream faster than the upstream can serve them. Each one is
+a stub pipeline of three StubChatModel calls (SQL, retrieval, merge) that share an
+upstream limited to --upstream-concurrency calls at a time, standing in for the OpenAI
+rate limit. A mix of faculty, student and anonymous callers is used. Clients give up at
+the deadline.
+
+  unbounded  every request starts immediately (main.py before admission control)
+  admission  senior.tools.admission.AdmissionController in front of the pipeline, with
+             the deadline checked between stages like faculty_advisor_chatbot does
+
+Reports answers delivered within the deadline, latency percentiles of those answers,
+how many requests were shed (503) and how fast, timeouts, and p95 per priority class.
+
+Run from the project root:
+    python -m senior.benchmarks.bench_admission
+    python -m senior.benchmarks.bench_admission --rate 40 --seconds 10 --max-concurrency 6
+"""
+import argparse
+import random
+import threading
+import time
+
+from senior.benchmarks import stubs
+from senior.tools.admission import AdmissionController, CLASS_NAMES, DeadlineExceeded, Overloaded, \
+    check_deadline, priority_of
+
+STAGES = ("sql", "retrieval", "merge")
+MIX = [("faculty", 0.2), ("student", 0.3), ("anonymous", 0.5)]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * (len(values) - 1)))] if values else 0.0
+
+
+class Upstream:
+    """StubChatModel behind a fixed number of concurrent calls."""
+
+    def __init__(self, latency, concurrency):
+        self.llm = stubs.StubChatModel(latency=latency)
+        self.slots = threading.Semaphore(concurrency)
+
+    def call(self, prompt):
+        with self.slots:
+            return self.llm.invoke(prompt).content
+
+
+def run(mode, args, arrivals):
+    upstream = Upstream(args.llm_latency_ms / 1000, args.upstream_concurrency)
+    admission = AdmissionController(max_concurrency=args.max_concurrency, max_queue=args.max_queue,
+                                    deadline=args.deadline, service_estimate=len(STAGES) * args.llm_latency_ms / 1000)
+    outcomes, lock = [], threading.Lock()
+
+    def pipeline(prompt, deadline):
+        answer = ""
+        for stage in STAGES:
+            if mode == "admission":
+                check_deadline(deadline, stage)
+            answer = upstream.call(f"{stage}: {prompt}\n{answer}")
+        return answer
+
+    def request(i, user_type):
+        t0 = time.monotonic()
+        deadline = t0 + args.deadline
+        try:
+            if mode == "admission":
+                with admission.admit(user_type, deadline):
+                    pipeline(f"question {i}", deadline)
+            else:
+                pipeline(f"question {i}", deadline)
+            status = "ok" if time.monotonic() <= deadline else "timeout"  # the client stopped waiting
+        except Overloaded:
+            status = "shed"
+        except DeadlineExceeded:
+            status = "timeout"
+        with lock:
+            outcomes.append((user_type, status, time.monotonic() - t0))
+
+    threads, start = [], time.monotonic()
+    for i, (at, user_type) in enumerate(arrivals):
+        time.sleep(max(0.0, start + at - time.monotonic()))
+        thread = threading.Thread(target=request, args=(i, user_type))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    ok = [t for _, s, t in outcomes if s == "ok"]
+    shed = [t for _, s, t in outcomes if s == "shed"]
+    timeouts = sum(s == "timeout" for _, s, _ in outcomes)
+    by_class = {name: round(1000 * percentile([t for c, s, t in outcomes if c == name and s == "ok"], 0.95))
+                for name, _ in MIX}
+    answered = {name: sum(1 for c, s, _ in outcomes if c == name and s == "ok") for name, _ in MIX}
+    print(f"  {mode:9s} answered {len(ok):4d}/{len(outcomes)}   p50 {1000 * percentile(ok, 0.5):6.0f} ms   "
+          f"p95 {1000 * percentile(ok, 0.95):6.0f} ms   p99 {1000 * percentile(ok, 0.99):6.0f} ms   "
+          f"timeouts {timeouts:4d}   shed {len(shed):4d} (p99 {1000 * percentile(shed, 0.99):5.0f} ms)")
+    print(f"  {'':9s} p95 by class {by_class}   answered by class {answered}")
+    if mode == "admission":
+        stats = admission.stats()
+        print(f"  {'':9s} queue wait {stats['queue_wait_ms']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=25.0, help="Arrivals per second")
+    parser.add_argument("--seconds", type=float, default=8.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--upstream-concurrency", type=int, default=4, help="Concurrent LLM calls the upstream allows")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=16)
+    parser.add_argument("--deadline", type=float, default=2.0, help="Seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    arrivals, at = [], 0.0
+    while True:
+        at += rng.expovariate(args.rate)
+        if at >= args.seconds:
+            break
+        arrivals.append((at, rng.choices([c for c, _ in MIX], [w for _, w in MIX])[0]))
+    capacity = args.upstream_concurrency / (len(STAGES) * args.llm_latency_ms / 1000)
+    print(f"{len(arrivals)} requests over {args.seconds:.0f}s ({args.rate:.0f}/s offered, ~{capacity:.0f}/s capacity), "
+          f"deadline {args.deadline:.1f}s, classes {[CLASS_NAMES[priority_of(c)] for c, _ in MIX]}")
+    for mode in ("unbounded", "admission"):
+        run(mode, args, arrivals)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Shared chunk vectors across page versions: reference counts, re-homing and cleanup.
+
+Runs psu_site_crawler.embed_and_upsert against StubPineconeIndex and a temporary crawl
+state database, through a sequence of page versions:
+
+  share      B repeats a block of A            -> B references A's vector, source_urls [A, B]
+  change     A drops the block and edits text  -> the block's vector keeps its text, moves to B;
+                                                  A's replaced chunks are deleted
+  shrink     A loses its last chunks           -> their vectors are deleted
+  unshare    B drops the block too             -> the block's vector is deleted
+  resume     the same version again (crash)    -> nothing is embedded twice
+  legacy     C has positional-id vectors       -> unchanged chunks reuse them, all are deleted
+
+After every step: each page's chunks are all in the index, every stored vector is used
+by some page (and lists exactly those pages), and the references reloaded from the
+state database match the ones in memory.
+
+Exits non-zero if any check fails. Run from the project root:
+    python -m senior.benchmarks.bench_chunk_refs
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+from senior.benchmarks import stubs
+from senior.crawling import psu_site_crawler as crawler
+
+A, B, C = (f"https://psu.edu.sa/en/refs/{name}" for name in ("a", "b", "c"))
+BLOCK = ("Contact", "Prince Sultan University, Rafha Street, Riyadh 11586. The registrar office is open "
+         "Sunday to Thursday from eight to three and answers email within two working days.")
+
+
+def section(name: str, n: int = 1):
+    return (name.title(), " ".join(f"{name} policy sentence {j} with its own wording and details." for j in range(n)))
+
+
+def check(name, ok, detail=""):
+    print(f"  {'ok  ' if ok else 'FAIL'} {name}{': ' + detail if detail else ''}")
+    return ok
+
+
+def invariants(step, pages):
+    """Every page's chunks are present; stored vectors and references agree, in memory and on disk."""
+    idx, vectors = crawler.fingerprint_index, crawler.index.vectors
+    problems = []
+    for url, pairs in pages.items():
+        texts = {crawler.embedding_text(*p) for p in pairs}
+        stored = {vectors[vid]["metadata"]["text"] for vid in idx.page_ids(url) if vid in vectors}
+        used = {t for t in texts if t in stored}
+        # near-duplicates are served by a vector holding the other page's (almost equal) text
+        shared = [vid for vid in idx.page_ids(url) if vid in vectors and vectors[vid]["metadata"]["url"] != url]
+        if len(used) + len(shared) < len(texts):
+            problems.append(f"{url} has {len(used) + len(shared)} of {len(texts)} chunks")
+    for vid, v in vectors.items():
+        refs = idx.refs(vid)
+        if not refs:
+            problems.append(f"orphan {vid[:16]}")
+        elif v["metadata"].get("url") not in refs:
+            problems.append(f"{vid[:16]} homed at {v['metadata'].get('url')} outside {refs}")
+        elif len(refs) > 1 and v["metadata"].get("source_urls") != refs:
+            problems.append(f"{vid[:16]} source_urls {v['metadata'].get('source_urls')} != {refs}")
+    for url in pages:
+        for vid in idx.page_ids(url):
+            if vid not in vectors:
+                problems.append(f"{url} references missing {vid[:16]}")
+    crawler.state_store.flush()
+    reloaded = crawler.ChunkFingerprintIndex.from_store(crawler.state_store)
+    for url in list(pages) + [A, B, C]:
+        if reloaded.page_ids(url) != idx.page_ids(url):
+            problems.append(f"{url} references differ after reload")
+    return check(f"{step}: invariants", not problems, "; ".join(problems[:4]))
+
+
+async def run_steps(db_path):
+    limiters = crawler.Limiters.default()
+    results, pages = [], {}
+
+    async def index(url, pairs, reindex=True):
+        before = stubs.snapshot_calls().get("embed_texts", 0)
+        res = await crawler.embed_and_upsert(url, pairs, {"url": url, "content_hash": str(hash(tuple(pairs)))},
+                                             limiters, reindex=reindex)
+        pages[url] = pairs
+        return res, stubs.snapshot_calls().get("embed_texts", 0) - before
+
+    def block_vector():
+        return next((vid for vid, v in crawler.index.vectors.items()
+                     if v["metadata"]["text"] == crawler.embedding_text(*BLOCK)), None)
+
+    a1 = [section("admission", 3), BLOCK, section("fees", 2), section("housing"), section("transport")]
+    await index(A, a1, reindex=False)
+    res, embedded = await index(B, [section("library", 2), BLOCK], reindex=False)
+    shared = block_vector()
+    results.append(check("share", res["deduplicated"] == 1 and embedded == 1
+                         and crawler.index.vectors[shared]["metadata"].get("source_urls") == [A, B],
+                         f"B embedded {embedded}, deduplicated {res['deduplicated']}"))
+    results.append(invariants("share", pages))
+
+    old_fees = crawler.content_chunk_id(crawler.sha256_text(crawler.embedding_text(*section("fees", 2))))
+    a2 = [section("admission", 3), section("fees", 4), section("housing"), section("transport")]
+    res, embedded = await index(A, a2)
+    md = crawler.index.vectors.get(shared, {}).get("metadata", {})
+    results.append(check("change: shared block re-homed", md.get("url") == B and md.get("text") == crawler.embedding_text(*BLOCK)
+                         and crawler.fingerprint_index.refs(shared) == [B], f"home {md.get('url')}"))
+    results.append(check("change: replaced chunk deleted", old_fees not in crawler.index.vectors,
+                         f"embedded {embedded}, reused {res['reused']}"))
+    results.append(invariants("change", pages))
+
+    before = len(crawler.index.vectors)
+    res, embedded = await index(A, a2[:2])
+    results.append(check("shrink", len(crawler.index.vectors) == before - 2 and embedded == 0,
+                         f"{before} -> {len(crawler.index.vectors)} vectors, embedded {embedded}"))
+    results.append(invariants("shrink", pages))
+
+    await index(B, [section("library", 2)])
+    results.append(check("unshare", shared not in crawler.index.vectors))
+    results.append(invariants("unshare", pages))
+
+    # A crash after the upsert, before the state flush: Pinecone has B's new version,
+    # the state database does not, and the resumed run repeats it
+    crawler.state_store.flush()
+    await index(B, [section("library", 2), section("printing")])
+    crawler.state_store = crawler.CrawlStateStore(db_path)
+    crawler.fingerprint_index = crawler.ChunkFingerprintIndex.from_store(crawler.state_store)
+    res, embedded = await index(B, [section("library", 2), section("printing")])
+    results.append(check("resume", embedded == 0, f"embedded {embedded}, reused {res['reused']}"))
+    results.append(invariants("resume", pages))
+
+    # A page indexed before content ids: vectors under make_chunk_id(url, i)
+    old_c = [section("parking"), section("clinic"), section("gym")]
+    for i, pair in enumerate(old_c):
+        text = crawler.embedding_text(*pair)
+        crawler.index.vectors[crawler.make_chunk_id(C, i)] = {
+            "id": crawler.make_chunk_id(C, i), "values": stubs.hashed_vector(text, 8),
+            "metadata": {"url": C, "text": text, "chunk_hash": crawler.sha256_text(text), "total_chunks": len(old_c)}}
+    res, embedded = await index(C, [section("parking"), section("clinic", 2)])
+    positional = [vid for vid in crawler.index.vectors if vid.startswith(crawler.make_chunk_id(C, 0)[:-1])]
+    results.append(check("legacy", not positional and embedded == 1 and res["reused"] == 1,
+                         f"{len(positional)} positional left, embedded {embedded}, reused {res['reused']}"))
+    results.append(invariants("legacy", pages))
+    return results
+
+
+def main():
+    crawler.metrics = crawler.CrawlMetrics()
+    crawler.openai_client = stubs.StubAsyncOpenAI(dim=8)
+    crawler.index = stubs.StubPineconeIndex()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "crawl_state.db")
+        crawler.init_db(db_path)
+        crawler.fingerprint_index = crawler.ChunkFingerprintIndex()
+        try:
+            results = asyncio.run(run_steps(db_path))
+        finally:
+            crawler.state_store.close()
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
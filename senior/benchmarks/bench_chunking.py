@@ -0,0 +1,152 @@
+"""Structure-aware chunker versus the previous fixed-size character chunker.
+
+For each page: chunks per page, tokens per chunk, how many lists and tables that fit
+in one chunk were nevertheless split across chunks, and how many chunks change (and so
+need embedding again) after a small edit: one sentence added to the first paragraph of
+the page's longest section.
+
+Pages are synthetic by default; --snapshot uses the pages saved by
+retrieval_eval snapshot.
+
+Run from the project root:
+    python -m senior.benchmarks.bench_chunking
+    python -m senior.benchmarks.bench_chunking --snapshot logs/retrieval_eval/pages.jsonl
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+
+from senior.crawling import psu_site_crawler as crawler
+
+EDIT = "This paragraph was updated for the new academic year."
+TITLES = ["Introduction to Programming and Problem Solving", "Discrete Structures for Computing",
+          "Software Requirements Engineering", "Database Systems Design", "Professional Ethics in Computing",
+          "Operating Systems Principles", "Technical Writing and Communication"]
+
+
+# --- Previous chunker (3500 chars, 200 overlap, cut at blank lines) ------------
+
+def legacy_split_by_headings(text):
+    sections, heading, current = [], "Introduction", []
+    for line in text.splitlines():
+        m = re.match(r"^(#{1,6})\s+(.*)$", line.strip())
+        if m:
+            if current:
+                sections.append((heading, current))
+            heading, current = m.group(2).strip() or "Untitled", []
+        elif line.strip():
+            current.append(line)
+    if current:
+        sections.append((heading, current))
+    return [(h, crawler.clean_whitespace("\n".join(body))) for h, body in sections if body]
+
+
+def legacy_chunk_document(text, max_chars=3500, overlap=200, min_chars=250):
+    out = []
+    for heading, body in legacy_split_by_headings(text):
+        if len(body) < min_chars:
+            continue
+        start, n = 0, len(body)
+        while start < n:
+            end = min(start + max_chars, n)
+            last_break = body[start:end].rfind("\n\n")
+            if last_break > max_chars * 0.5:
+                end = start + last_break
+            chunk = body[start:end].strip()
+            if len(chunk) >= min_chars:
+                out.append((heading, chunk))
+            if end >= n:
+                break
+            start = max(0, end - overlap)
+    return out
+
+
+# --- Measurements ------------------------------------------------------------
+
+def synthetic_structured_page(i):
+    """A program page shaped like PSU's: overview prose, a study plan of per-level tables
+    separated only by short paragraphs, and requirement lists."""
+    rng = random.Random(i)
+    lines = [f"# Program {i}", "## Overview"]
+    lines += [f"Overview paragraph {j} of program {i}. " + "The program prepares graduates for practice. " * rng.randint(2, 8)
+              for j in range(rng.randint(3, 8))]
+    lines.append("## Study Plan")
+    for level in range(1, rng.randint(5, 9)):
+        lines.append(f"Level {level}: students take the following courses.")
+        lines.append("Course Code | Course Title | Credit Hours | Prerequisite")
+        lines += [f"P{i}{level}{r:02d} | {rng.choice(TITLES)} {level}.{r} | {rng.choice([2, 3, 4])} | "
+                  f"{rng.choice(['None', f'P{i}{level - 1}01'])}" for r in range(rng.randint(5, 8))]
+    lines.append("## Requirements")
+    lines += [f"- Requirement {j} for program {i}: " + "complete the listed work. " * rng.randint(1, 3)
+              for j in range(rng.randint(4, 12))]
+    lines.append("## Contact")
+    lines.append(f"Email program{i}@psu.edu.sa for advising.")
+    return "\n".join(lines)
+
+
+def edited(text):
+    """text with EDIT appended to the first paragraph of its longest section."""
+    lines = text.splitlines()
+    sections, start = [], 0
+    for i, line in enumerate(lines + ["# end"]):
+        if line.startswith("#"):
+            sections.append((sum(len(x) for x in lines[start:i]), start, i))
+            start = i + 1
+    _, start, end = max(sections)
+    for i in range(start, end):
+        if lines[i] and not lines[i].startswith("- ") and " | " not in lines[i]:
+            lines[i] = f"{lines[i]} {EDIT}"
+            break
+    return "\n".join(lines)
+
+
+def split_structures(text, chunks, budget):
+    """Lists and tables that fit the budget but do not appear whole in any chunk."""
+    split = 0
+    for block in crawler.parse_blocks(text):
+        if block.kind in ("list", "table") and len(block.lines) > 1 \
+                and crawler.count_tokens("\n".join(block.lines)) <= budget:
+            split += not any(all(line in chunk for line in block.lines) for _, chunk in chunks)
+    return split
+
+
+def measure(name, chunker, pages, budget):
+    t0 = time.perf_counter()
+    results = [chunker(text) for text in pages]
+    elapsed = time.perf_counter() - t0
+    sizes = sorted(crawler.count_tokens(crawler.embedding_text(h, c)) for chunks in results for h, c in chunks)
+    split = sum(split_structures(text, chunks, budget) for text, chunks in zip(pages, results))
+    changed = total = 0
+    for text, chunks in zip(pages, results):
+        before = {crawler.embedding_text(h, c) for h, c in chunks}
+        after = [crawler.embedding_text(h, c) for h, c in chunker(edited(text))]
+        changed += sum(t not in before for t in after)
+        total += len(after)
+    print(f"  {name:16s} {len(sizes) / len(pages):6.1f} chunks/page   tokens mean {statistics.mean(sizes):5.0f} "
+          f"p95 {sizes[int(0.95 * (len(sizes) - 1))]:5d} max {sizes[-1]:5d}   structures split {split:4d}   "
+          f"re-embed after edit {changed}/{total} ({100 * changed / max(1, total):.0f}%)   "
+          f"{len(pages) / elapsed:7.0f} pages/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic pages")
+    parser.add_argument("--snapshot", help="JSONL pages from retrieval_eval snapshot")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        with open(args.snapshot, encoding="utf-8") as f:
+            pages = [json.loads(line)["text"] for line in f if line.strip()]
+    else:
+        pages = [synthetic_structured_page(i) for i in range(args.pages)]
+    budget = min(crawler.CHUNK_MAX_TOKENS, 3500 // 4)
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages):,.0f} chars each on average")
+    measure("fixed 3500 chars", legacy_chunk_document, pages, budget)
+    measure("structure-aware", crawler.chunk_document, pages, budget)
+
+
+if __name__ == "__main__":
+    main()
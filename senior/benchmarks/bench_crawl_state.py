@@ -0,0 +1,105 @@
+"""Microbenchmark for the crawler's SQLite state store.
+
+Compares the old connection-per-call get/upsert against CrawlStateStore
+(preloaded reads, buffered writes flushed in batched transactions).
+
+Run from the project root:
+    python -m senior.benchmarks.bench_crawl_state
+    python -m senior.benchmarks.bench_crawl_state --sizes 10000 100000 --legacy-limit 5000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from senior.crawling.psu_site_crawler import CrawlStateStore
+
+
+def _urls(n: int):
+    return [f"https://psu.edu.sa/en/page-{i}" for i in range(n)]
+
+
+def _legacy_upsert(db_path: str, url: str):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+    INSERT INTO pages(url, sitemap_lastmod, etag, last_modified, content_hash, last_crawled_at)
+    VALUES(?,?,?,?,?,?)
+    ON CONFLICT(url) DO UPDATE SET content_hash=excluded.content_hash, last_crawled_at=excluded.last_crawled_at
+    """, (url, "2026-01-01", "etag", "lm", "hash", datetime.now(timezone.utc).isoformat()))
+    conn.commit()
+    conn.close()
+
+
+def _legacy_get(db_path: str, url: str):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT sitemap_lastmod, etag, last_modified, content_hash FROM pages WHERE url=?", (url,)).fetchone()
+    conn.close()
+    return row
+
+
+def bench_legacy(n: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "state.db")
+        CrawlStateStore(db_path).close()  # create schema
+        urls = _urls(n)
+        t0 = time.perf_counter()
+        for u in urls:
+            _legacy_upsert(db_path, u)
+        t1 = time.perf_counter()
+        for u in urls:
+            _legacy_get(db_path, u)
+        t2 = time.perf_counter()
+    return {"upsert_ops_per_s": n / (t1 - t0), "get_ops_per_s": n / (t2 - t1)}
+
+
+def bench_store(n: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "state.db")
+        store = CrawlStateStore(db_path)
+        urls = _urls(n)
+        t0 = time.perf_counter()
+        for u in urls:
+            store.upsert(u, "2026-01-01", "etag", "lm", "hash")
+        t1 = time.perf_counter()
+        store.flush()
+        t2 = time.perf_counter()
+        store.close()
+
+        t3 = time.perf_counter()
+        store = CrawlStateStore(db_path)
+        t4 = time.perf_counter()
+        for u in urls:
+            store.get(u)
+        t5 = time.perf_counter()
+        store.close()
+    return {
+        "upsert_ops_per_s": n / (t1 - t0),
+        "flush_s": t2 - t1,
+        "upsert_incl_flush_ops_per_s": n / (t2 - t0),
+        "preload_s": t4 - t3,
+        "get_ops_per_s": n / (t5 - t4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--legacy-limit", type=int, default=10_000,
+                        help="Skip the connection-per-call baseline above this many URLs (it is slow).")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        print(f"\n== {n:,} URLs ==")
+        for name, value in bench_store(n).items():
+            print(f"  store   {name:28s} {value:,.2f}")
+        if n <= args.legacy_limit:
+            for name, value in bench_legacy(n).items():
+                print(f"  legacy  {name:28s} {value:,.2f}")
+        else:
+            print(f"  legacy  skipped (> --legacy-limit {args.legacy_limit:,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Pages/sec benchmark for the crawler's HTML extraction path.
+
+Measures extract_html (lxml) in-process and across the process pool. When
+BeautifulSoup is installed, the previous html.parser-based extraction is timed
+as a baseline too.
+
+Run from the project root:
+    python -m senior.benchmarks.bench_html_extraction
+    python -m senior.benchmarks.bench_html_extraction --html-dir saved_pages/ --pages 2000
+"""
+import argparse
+import asyncio
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin
+
+from senior.crawling import psu_site_crawler as crawler
+
+
+def synthetic_page(i: int) -> str:
+    rows = "".join(f"<tr><td>CS{100 + r}</td><td>Course {r}</td><td>3</td></tr>" for r in range(15))
+    items = "".join(f"<li>Requirement {j} for program {i}</li>" for j in range(20))
+    paras = "".join(f"<p>Paragraph {j} describing policies of program {i}. " + "Lorem ipsum " * 20 + "</p>" for j in range(15))
+    return (
+        f"<html><head><title>Program {i}</title><link rel='canonical' href='/en/p{i}'></head><body>"
+        "<header><nav><ul>" + "<li><a href='/x'>Menu</a></li>" * 40 + "</ul></nav></header>"
+        f"<main><h1>Program {i}</h1>{paras}<h2>Requirements</h2><ul>{items}</ul>"
+        f"<h2>Study plan</h2><table>{rows}</table><a href='/files/plan{i}.pdf'>Plan</a></main>"
+        "<footer><p>Contact us</p></footer><script>var a = 1;</script></body></html>"
+    )
+
+
+def legacy_extract(html: str, url: str):
+    """The BeautifulSoup(html.parser) extraction extract_html replaced, kept as the reference."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    h1_el = soup.find("h1")
+    h1 = h1_el.get_text(" ", strip=True) if h1_el else ""
+    canonical_el = soup.select_one('link[rel="canonical"]')
+    canonical_url = canonical_el.get("href", "").strip() if canonical_el else ""
+    canonical_url = urljoin(url, canonical_url) if canonical_url else url
+    downloads = []
+    for a in soup.select("a[href]"):
+        full = urljoin(url, a.get("href", "").strip())
+        if full.lower().endswith((".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx")):
+            downloads.append(full)
+    page_meta = {"page_title": title, "h1": h1, "canonical_url": canonical_url,
+                 "download_links": list(dict.fromkeys(downloads))[:50]}
+
+    for sel in crawler.REMOVE_SELECTORS:
+        for node in soup.select(sel):
+            node.decompose()
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    container = soup.body or soup
+    for sel in crawler.MAIN_SELECTORS:
+        node = soup.select_one(sel)
+        if node and node.get_text(strip=True):
+            container = node
+            break
+
+    lines = []
+    for el in container.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "table"]):
+        name = el.name.lower()
+        if name == "table":
+            for row in el.find_all("tr"):
+                cells = [c for c in (c.get_text(" ", strip=True) for c in row.find_all(["th", "td"])) if c]
+                if cells:
+                    lines.append(" | ".join(cells))
+            continue
+        txt = el.get_text(" ", strip=True)
+        if txt:
+            lines.append(f"{'#' * int(name[1])} {txt}" if name.startswith("h") else f"- {txt}" if name == "li" else txt)
+    return page_meta, crawler.clean_whitespace("\n".join(lines))
+
+
+def bench_serial(fn, pages) -> float:
+    t0 = time.perf_counter()
+    for i, html in enumerate(pages):
+        fn(html, f"https://psu.edu.sa/en/p{i}")
+    return len(pages) / (time.perf_counter() - t0)
+
+
+async def _bench_pool(pages, workers: int) -> float:
+    crawler.extract_pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        await crawler.extract_html_async(pages[0], "warmup")  # spin up workers outside the timing
+        t0 = time.perf_counter()
+        await asyncio.gather(*(crawler.extract_html_async(html, f"https://psu.edu.sa/en/p{i}") for i, html in enumerate(pages)))
+        return len(pages) / (time.perf_counter() - t0)
+    finally:
+        crawler.extract_pool.shutdown()
+        crawler.extract_pool = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--html-dir", help="Directory of saved .html pages (default: synthetic pages)")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=crawler.EXTRACT_WORKERS)
+    args = parser.parse_args()
+
+    if args.html_dir:
+        files = sorted(glob.glob(os.path.join(args.html_dir, "*.html")))
+        saved = [open(f, encoding="utf-8", errors="ignore").read() for f in files]
+        pages = [saved[i % len(saved)] for i in range(args.pages)]
+    else:
+        pages = [synthetic_page(i) for i in range(args.pages)]
+    print(f"{len(pages)} pages, avg {sum(map(len, pages)) // len(pages):,} bytes")
+
+    print(f"  lxml serial            {bench_serial(crawler.extract_html, pages):,.1f} pages/s")
+    print(f"  lxml pool ({args.workers} workers)  {asyncio.run(_bench_pool(pages, args.workers)):,.1f} pages/s")
+    try:
+        print(f"  bs4 html.parser serial {bench_serial(legacy_extract, pages):,.1f} pages/s")
+    except ImportError:
+        print("  bs4 baseline skipped (beautifulsoup4 not installed)")
+
+
+if __name__ == "__main__":
+    main()
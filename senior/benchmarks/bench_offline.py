@@ -0,0 +1,383 @@
+"""Offline benchmark harness: the chatbot, retrieval tools and crawler against local stubs.
+
+Scenarios:
+  chatbot   main.faculty_advisor_chatbot end to end. ChatOpenAI is replaced with a stub
+            model, the database with a synthetic SQLite fixture, and each CrewAI kickoff
+            with one LLM call plus the agent's tool calls.
+  conversation  four-turn conversations (one request each) through a chat session,
+            with the same turns run stateless for comparison
+  pinecone  PineconeSearchTool._run over a stub in-memory vector store
+  pdf       PDFSearchTool built from the advising manual with stub embeddings, then searched
+  crawler   psu_site_crawler.process_url on synthetic pages with stub fetch/embed/upsert
+
+Latency is injected per stubbed call (--llm-latency-ms, --embed-latency-ms, ...). Each
+scenario reports throughput, p50/p95/p99 latency, stub call counts and peak RSS. Results
+go to a JSON file for diffing between runs (--compare old.json prints the deltas).
+Scenarios whose dependencies are not installed are recorded as skipped.
+
+Run from the project root:
+    python -m senior.benchmarks.bench_offline
+    python -m senior.benchmarks.bench_offline --scenarios pinecone crawler --requests 500 --out before.json
+    python -m senior.benchmarks.bench_offline --out after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from senior.benchmarks import stubs
+
+SCENARIOS = ["chatbot", "conversation", "pinecone", "pdf", "crawler"]
+PDF_PATH = "senior/AdvisingManualIndexing/Advising Manual.pdf"
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return 0.0
+
+
+def summarize(latencies, elapsed, calls_before, rss_before, errors):
+    latencies = sorted(latencies)
+    calls_after = stubs.snapshot_calls()
+    calls = {k: v - calls_before.get(k, 0) for k, v in calls_after.items() if v - calls_before.get(k, 0)}
+    n = len(latencies)
+    return {
+        "requests": n,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(n / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {name: round(1000 * percentile(latencies, q), 2)
+                       for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "latency_ms_max": round(1000 * latencies[-1], 2) if latencies else 0.0,
+        "calls": calls,
+        "calls_per_request": {k: round(v / n, 2) for k, v in calls.items()} if n else {},
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_threads(fn, inputs, concurrency):
+    calls_before, rss_before = stubs.snapshot_calls(), rss_mb()
+    latencies, errors, lock = [], [], threading.Lock()
+
+    def one(item):
+        t0 = time.perf_counter()
+        try:
+            fn(item)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, inputs))
+    result = summarize(latencies, time.perf_counter() - t0, calls_before, rss_before, len(errors))
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+# --- Scenarios ---------------------------------------------------------------
+
+def bench_pinecone(args):
+    from senior.tools.pinecone_search_tool import PineconeSearchTool
+
+    tool = PineconeSearchTool(index_name="psu-web-auto")
+    configure_pinecone_tool(tool, args)
+    questions = stubs.synthetic_questions(args.requests)
+    return run_threads(lambda q: tool._run(query=q, k=3), questions, args.concurrency)
+
+
+def configure_pinecone_tool(tool, args):
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("PINECONE_API_KEY", "offline-benchmark")
+    embeddings = stubs.StubEmbeddings(latency=args.embed_latency_ms / 1000)
+    stubs.StubVectorStore.query_latency = args.vector_latency_ms / 1000
+    # Pre-set the cached clients so _ensure_ready() never reaches Pinecone or OpenAI
+    tool._pc = object()
+    tool._index = object()
+    tool._embeddings = embeddings
+    tool._vectorstore = stubs.StubVectorStore.from_documents(stubs.synthetic_corpus(args.corpus), embeddings)
+
+
+def patch_pdf_tool(args):
+    from senior.tools import pdf_tool
+
+    stubs.StubVectorStore.query_latency = args.vector_latency_ms / 1000
+    pdf_tool.Chroma = stubs.StubVectorStore
+    pdf_tool.OpenAIEmbeddings = lambda *a, **kw: stubs.StubEmbeddings(latency=args.embed_latency_ms / 1000)
+    return pdf_tool
+
+
+def bench_pdf(args):
+    pdf_tool = patch_pdf_tool(args)
+    calls_before = stubs.snapshot_calls()
+    t0 = time.perf_counter()
+    tool = pdf_tool.PDFSearchTool(pdf_path=PDF_PATH)
+    build_s = time.perf_counter() - t0
+    build_calls = {k: v - calls_before.get(k, 0) for k, v in stubs.snapshot_calls().items() if v - calls_before.get(k, 0)}
+    result = run_threads(tool.search, stubs.synthetic_questions(args.requests), args.concurrency)
+    result["build_s"] = round(build_s, 3)
+    result["build_calls"] = build_calls
+    return result
+
+
+class StubCrew:
+    """Stands in for main.crew: each task is one LLM call plus one call per agent tool.
+
+    CrewAI sends LLM traffic through its own client rather than the LangChain model, so
+    kickoff itself is replaced. Tasks are kept per thread because main.py assigns
+    crew.tasks before each kickoff.
+    """
+
+    def __init__(self, llm, tool_runners):
+        self.llm = llm
+        self.tool_runners = tool_runners  # id(agent) -> [callable(query)]
+        self._local = threading.local()
+
+    @property
+    def tasks(self):
+        return getattr(self._local, "tasks", [])
+
+    @tasks.setter
+    def tasks(self, value):
+        self._local.tasks = value
+
+    def kickoff(self):
+        outputs = []
+        for task in self.tasks:
+            context = [run(task.description[:500]) for run in self.tool_runners.get(id(task.agent), [])]
+            prompt = task.description + "\n\n" + "\n\n".join(str(c)[:2000] for c in context)
+            outputs.append(self.llm.invoke(prompt).content)
+        return "\n\n".join(outputs)
+
+
+def load_main(args, tmp):
+    """Import main.py against the SQLite fixture and stubs; returns (main, startup_s, startup_calls)."""
+    from senior.benchmarks.report_fixture import build_fixture
+
+    if "main" in sys.modules:
+        return sys.modules["main"], 0.0, {}
+    db_path = os.path.join(tmp, "chatbot.db")
+    build_fixture(db_path, students=args.students)
+    os.environ["DB_URI"] = f"sqlite:///{db_path}"
+    for key in ("OPENAI_API_KEY", "PINECONE_API_KEY", "TAVILY_API_KEY"):
+        os.environ.setdefault(key, "offline-benchmark")
+
+    import langchain_openai
+    llm_latency = args.llm_latency_ms / 1000
+    langchain_openai.ChatOpenAI = lambda **kw: stubs.StubChatModel(latency=llm_latency, **kw)
+    patch_pdf_tool(args)
+
+    calls_before = stubs.snapshot_calls()
+    t0 = time.perf_counter()
+    import main
+    startup_s = time.perf_counter() - t0
+    startup_calls = {k: v - calls_before.get(k, 0) for k, v in stubs.snapshot_calls().items() if v - calls_before.get(k, 0)}
+
+    configure_pinecone_tool(main.pinecone_tool, args)
+    search_latency = args.search_latency_ms / 1000
+    main.crew = StubCrew(main.llm, {
+        id(main.psu_web_agent): [lambda q: main.pinecone_tool._run(query=q, k=3),
+                                 lambda q: stubs.stub_tavily_search(q, search_latency)],
+        id(main.advisor_agent): [main.advisor_manual_tool.func],
+    })
+    return main, startup_s, startup_calls
+
+
+def bench_chatbot(args, tmp):
+    main, startup_s, startup_calls = load_main(args, tmp)
+    prompts = []
+    for i in range(args.requests):
+        if i % 3 == 0:
+            prompts.append(f"What is the GPA of student {1 + (i * 7) % args.students}?")
+        elif i % 3 == 1:
+            prompts.append(f"How many students have {stubs.TOPICS[i % len(stubs.TOPICS)]} issues this semester?")
+        else:
+            prompts.append(stubs.synthetic_questions(i + 1)[-1])
+    result = run_threads(lambda p: asyncio.run(main.faculty_advisor_chatbot(p)), prompts, args.concurrency)
+    result["startup_s"] = round(startup_s, 3)
+    result["startup_calls"] = startup_calls
+    result["sql_paths"] = dict(main.text_to_sql.stats)
+    return result
+
+
+def bench_crawler(args, tmp):
+    from senior.benchmarks.bench_html_extraction import synthetic_page
+    from senior.crawling import psu_site_crawler as crawler
+
+    urls = [f"https://psu.edu.sa/en/bench/page-{i}" for i in range(args.requests)]
+    # Every tenth page repeats an earlier one so near-duplicate detection has work to do
+    pages = {url: synthetic_page(i if i % 10 else max(0, i - 1)) for i, url in enumerate(urls)}
+
+    crawler.metrics = crawler.CrawlMetrics()
+    crawler.fetch_page = stubs.make_stub_fetch_page(pages, args.fetch_latency_ms / 1000)
+    crawler.openai_client = stubs.StubAsyncOpenAI(args.embed_latency_ms / 1000)
+    crawler.index = stubs.StubPineconeIndex(args.upsert_latency_ms / 1000)
+    crawler.init_db(os.path.join(tmp, "crawl_state.db"))
+    crawler.fingerprint_index = crawler.ChunkFingerprintIndex()
+
+    async def crawl():
+        limiters = crawler.Limiters.default()
+        latencies, errors = [], []
+
+        async def one(url):
+            t0 = time.perf_counter()
+            r = await crawler.process_url(url, None, limiters)
+            latencies.append(time.perf_counter() - t0)
+            if r.get("error"):
+                errors.append(r["error"])
+
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(url):
+            async with sem:
+                await one(url)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(bounded(u) for u in urls))
+        return latencies, errors, time.perf_counter() - t0
+
+    calls_before, rss_before = stubs.snapshot_calls(), rss_mb()
+    try:
+        latencies, errors, elapsed = asyncio.run(crawl())
+    finally:
+        crawler.state_store.close()
+    result = summarize(latencies, elapsed, calls_before, rss_before, len(errors))
+    result["stages"] = crawler.metrics.summary()["stages"]
+    return result
+
+
+# --- Driver ------------------------------------------------------------------
+
+def bench_conversation(args, tmp):
+    """Four-turn conversations with follow-ups, each through one session, then the same turns stateless."""
+    main, _, _ = load_main(args, tmp)
+    conversations = []
+    for i in range(max(1, args.requests // 4)):
+        topic = stubs.TOPICS[i % len(stubs.TOPICS)]
+        program, other = stubs.PROGRAMS[i % len(stubs.PROGRAMS)], stubs.PROGRAMS[(i + 3) % len(stubs.PROGRAMS)]
+        student = 1 + (i * 7) % args.students
+        conversations.append([f"What are the {topic} for {program}?", f"and what about for {other}?",
+                              f"What is the GPA of student {student}?", f"What is the GPA of student {student}?"])
+
+    def converse(turns):
+        session = main.chat_sessions.get(None)
+        for turn in turns:
+            with session.lock, main.chat_sessions.serving(session):
+                asyncio.run(main.faculty_advisor_chatbot(turn, session))
+
+    def stateless(turns):
+        for turn in turns:
+            asyncio.run(main.faculty_advisor_chatbot(turn))
+
+    before = dict(main.chat_sessions.stats_counts)
+    result = run_threads(converse, conversations, args.concurrency)
+    result["sessions"] = {k: v - before[k] for k, v in main.chat_sessions.stats_counts.items()}
+    baseline = run_threads(stateless, conversations, args.concurrency)
+    result["stateless"] = {"latency_ms": baseline["latency_ms"], "calls_per_request": baseline["calls_per_request"]}
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous_path} ({previous['meta'].get('commit')}):")
+    for name, now in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before or "skipped" in now or "skipped" in before:
+            continue
+        rows = [("throughput_rps", before["throughput_rps"], now["throughput_rps"])]
+        rows += [(f"latency {q}", before["latency_ms"][q], now["latency_ms"][q]) for q in ("p50", "p95", "p99")]
+        rows += [(f"calls/request {k}", before["calls_per_request"].get(k, 0), v)
+                 for k, v in now["calls_per_request"].items()]
+        rows.append(("peak_rss_mb", before["peak_rss_mb"], now["peak_rss_mb"]))
+        print(f"  {name}")
+        for label, a, b in rows:
+            change = f"{100 * (b - a) / a:+.1f}%" if a else "n/a"
+            print(f"    {label:32s} {a:>12} -> {b:<12} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--corpus", type=int, default=2000, help="Documents in the stub vector store")
+    parser.add_argument("--students", type=int, default=500, help="Students in the SQLite fixture")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--vector-latency-ms", type=float, default=10.0)
+    parser.add_argument("--search-latency-ms", type=float, default=100.0, help="Stub web search (Tavily)")
+    parser.add_argument("--fetch-latency-ms", type=float, default=30.0)
+    parser.add_argument("--upsert-latency-ms", type=float, default=20.0)
+    parser.add_argument("--out", default="logs/bench_offline.json")
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    args = parser.parse_args()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+    results = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(),
+                        "python": sys.version.split()[0], "platform": platform.platform(), "config": config},
+               "scenarios": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep the SQL query log and traces of stubbed runs out of the real logs
+        os.environ["SQL_QUERY_LOG"] = os.path.join(tmp, "sql_queries.jsonl")
+        os.environ["TRACE_LOG"] = os.path.join(tmp, "traces.jsonl")
+        os.environ["SQL_TEMPLATES_PATH"] = os.path.join(tmp, "sql_templates.json")
+        runners = {"chatbot": lambda: bench_chatbot(args, tmp), "conversation": lambda: bench_conversation(args, tmp),
+                   "pinecone": lambda: bench_pinecone(args),
+                   "pdf": lambda: bench_pdf(args), "crawler": lambda: bench_crawler(args, tmp)}
+        for name in args.scenarios:
+            print(f"== {name}")
+            try:
+                result = runners[name]()
+            except ImportError as e:
+                result = {"skipped": f"missing dependency: {e}"}
+            results["scenarios"][name] = result
+            if "skipped" in result:
+                print(f"  skipped ({result['skipped']})")
+                continue
+            lat = result["latency_ms"]
+            print(f"  {result['throughput_rps']:.1f} req/s   p50 {lat['p50']} ms   p95 {lat['p95']} ms   "
+                  f"p99 {lat['p99']} ms   errors {result['errors']}   peak RSS {result['peak_rss_mb']} MB")
+            print(f"  calls/request {result['calls_per_request']}")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
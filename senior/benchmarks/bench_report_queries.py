@@ -0,0 +1,116 @@
+"""Query-count and latency benchmark for loading student report data.
+
+Compares the previous per-section pd.read_sql queries (nine per student) with
+generate_report.fetch_report_data, one student at a time and in batches, on a
+synthetic SQLite fixture (see report_fixture.py).
+
+Run from the project root:
+    python -m senior.benchmarks.bench_report_queries
+    python -m senior.benchmarks.bench_report_queries --students 2000 --batch-size 500
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from senior.benchmarks.report_fixture import build_fixture
+
+LEGACY_QUERIES = [
+    """SELECT s.*, d.department_name, m.major_name,
+           a.Fname AS advisor_fname, a.Lname AS advisor_lname, a.email AS advisor_email
+       FROM Student s
+       JOIN Department d ON s.department_id = d.department_id
+       JOIN Major m ON s.major_id = m.major_id
+       LEFT JOIN Advisor a ON s.advisor_id = a.advisor_id
+       WHERE s.student_id = :student_id""",
+    "SELECT semester, gpa FROM Student_GPA_History WHERE student_id = :student_id",
+    *[f"""SELECT e.course_id, c.course_name, e.semester, e.grade, COALESCE(a.absence_count, 0) AS absences
+          FROM Student_Course_Enrollment e
+          JOIN Course c ON c.course_id = e.course_id
+          LEFT JOIN Student_Course_Absence a
+              ON e.student_id = a.student_id AND e.course_id = a.course_id AND e.semester = a.semester
+          WHERE e.status = '{status}' AND e.student_id = :student_id""" for status in ("Current", "Completed", "Leftover")],
+    """SELECT e.course_id, c.course_name, e.semester, COALESCE(a.absence_count, 0) AS absences, c.absence_limit
+       FROM Student_Course_Enrollment e
+       JOIN Course c ON c.course_id = e.course_id
+       LEFT JOIN Student_Course_Absence a
+           ON e.student_id = a.student_id AND e.course_id = a.course_id AND e.semester = a.semester
+       WHERE e.status = 'Current' AND e.student_id = :student_id""",
+    "SELECT 1 FROM High_Risk_Student WHERE student_id = :student_id",
+    """SELECT c.course_id, c.course_name, c.difficulty_rating, COALESCE(a.absence_count, 0) AS absences, c.absence_limit, e.grade
+       FROM Student_Course_Enrollment e
+       JOIN Course c ON c.course_id = e.course_id
+       LEFT JOIN Student_Course_Absence a ON a.course_id = c.course_id AND a.student_id = e.student_id
+       WHERE e.student_id = :student_id AND e.status = 'Current'""",
+    """SELECT c.course_id, c.course_name, c.difficulty_rating, e.grade
+       FROM Student_Course_Enrollment e
+       JOIN Course c ON c.course_id = e.course_id
+       WHERE e.student_id = :student_id AND e.status = 'Completed'""",
+]
+
+
+class QueryCounter:
+    """Counts SELECT statements sent to SQLite by every connection of an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "connect", self._on_connect)
+
+    def _on_connect(self, dbapi_conn, _record):
+        dbapi_conn.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.count += 1
+
+
+def legacy_fetch(engine, student_id):
+    import pandas as pd
+    from sqlalchemy import text
+    return [pd.read_sql(text(q), engine, params={"student_id": student_id}) for q in LEGACY_QUERIES]
+
+
+def measure(label, counter, calls, students):
+    counter.count = 0
+    latencies = []
+    t0 = time.perf_counter()
+    for call in calls:
+        t = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - t) * 1000)
+    total = time.perf_counter() - t0
+    print(f"  {label:26s} queries/student {counter.count / students:6.2f}   "
+          f"p50 {statistics.median(latencies):8.2f} ms/call   {students / total:10,.1f} students/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "reports.db")
+        build_fixture(db_path, students=args.students)
+        # generate_report builds its engine from DB_URI at import time
+        os.environ["DB_URI"] = f"sqlite:///{db_path}"
+        import generate_report
+
+        engine = generate_report.engine
+        counter = QueryCounter(engine)
+        ids = list(range(1, args.students + 1))
+        batches = [ids[i:i + args.batch_size] for i in range(0, len(ids), args.batch_size)]
+
+        print(f"{args.students:,} students, SQLite fixture")
+        measure("legacy (per section)", counter, [lambda s=s: legacy_fetch(engine, s) for s in ids], len(ids))
+        measure("fetch_report_data x1", counter, [lambda s=s: generate_report.fetch_report_data([s]) for s in ids], len(ids))
+        measure(f"fetch_report_data x{args.batch_size}", counter,
+                [lambda b=b: generate_report.fetch_report_data(b) for b in batches], len(ids))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Reports/sec: exec-per-request versus the long-running report service.
+
+"exec" mirrors the old frontend route: run `python3 generate_report.py <id>`,
+read student_<id>_report.pdf back from the project root and delete it.
+"service" starts `generate_report.py --serve` once and fetches /report/<id>.
+Both run against a synthetic SQLite fixture (see report_fixture.py).
+
+Run from the project root:
+    python -m senior.benchmarks.bench_report_service
+    python -m senior.benchmarks.bench_report_service --requests 200 --concurrency 4
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from senior.benchmarks.report_fixture import build_fixture
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCRIPT = os.path.join(PROJECT_ROOT, "generate_report.py")
+
+
+def exec_report(env, student_id) -> int:
+    subprocess.run([sys.executable, SCRIPT, str(student_id)], env=env, check=True, capture_output=True)
+    pdf_path = os.path.join(PROJECT_ROOT, f"student_{student_id}_report.pdf")
+    with open(pdf_path, "rb") as f:
+        size = len(f.read())
+    os.remove(pdf_path)
+    return size
+
+
+def service_report(base_url, student_id) -> int:
+    with urllib.request.urlopen(f"{base_url}/report/{student_id}") as resp:
+        return len(resp.read())
+
+
+def wait_healthy(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health"):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("report service did not start")
+
+
+def run(label, fn, ids, concurrency):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        sizes = list(pool.map(fn, ids))
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:8s} {len(ids) / elapsed:8.2f} reports/s   {elapsed / len(ids) * 1000:8.1f} ms/report   "
+          f"avg {sum(sizes) // len(sizes):,} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--exec-requests", type=int, default=10, help="exec is slow; time fewer requests")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--port", type=int, default=5077)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "reports.db")
+        build_fixture(db_path, students=max(args.requests, args.exec_requests))
+        env = dict(os.environ, DB_URI=f"sqlite:///{db_path}")
+        print(f"concurrency {args.concurrency}")
+
+        # Distinct ids so concurrent exec runs do not collide on the output file
+        run("exec", lambda sid: exec_report(env, sid), list(range(1, args.exec_requests + 1)), args.concurrency)
+
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen([sys.executable, SCRIPT, "--serve", "--port", str(args.port)], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_healthy(base_url)
+            run("service", lambda sid: service_report(base_url, sid), list(range(1, args.requests + 1)), args.concurrency)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
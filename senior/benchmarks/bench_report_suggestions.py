@@ -0,0 +1,100 @@
+"""Benchmark for the advisor-suggestion rules in generate_report.py.
+
+Times the previous nested loops (every current course scanned the completed
+courses) against suggestion_bullets (declarative SUGGESTION_RULES plus a
+difficulty -> risky-course lookup) on synthetic in-memory students, and checks
+that both produce the same bullets.
+
+Run from the project root:
+    python -m senior.benchmarks.bench_report_suggestions
+    python -m senior.benchmarks.bench_report_suggestions --students 50000
+"""
+import argparse
+import os
+import random
+import time
+
+# generate_report creates its engine at import; no database is touched here
+os.environ.setdefault("DB_URI", "sqlite://")
+import generate_report  # noqa: E402
+
+# Mostly passing grades, as in real transcripts
+GRADES = ["A+", "A", "A", "B+", "B+", "B", "B", "B", "C+", "C", "D+", "D", "F", "W", "DN", None]
+
+
+def synthetic_reports(n: int, completed_range=(8, 40), seed: int = 7) -> dict:
+    rnd = random.Random(seed)
+    reports = {}
+    for sid in range(1, n + 1):
+        current = [{
+            "course_id": f"CS{rnd.randint(100, 499)}", "course_name": f"Course {i}",
+            "difficulty_rating": rnd.choice([None, 1, 2, 3, 4, 5]), "absences": rnd.randint(0, 12),
+            "absence_limit": rnd.choice([None, 6, 8, 10]), "grade": rnd.choice([None, "", "IP", str(rnd.randint(30, 100))]),
+        } for i in range(rnd.randint(3, 6))]
+        completed = [{
+            "course_id": f"CS{rnd.randint(100, 499)}", "course_name": f"Course {i}",
+            "difficulty_rating": rnd.choice([None, 1, 2, 3, 4, 5]), "grade": rnd.choice(GRADES),
+        } for i in range(rnd.randint(*completed_range))]
+        reports[sid] = {
+            "student": {"student_id": sid, "current_gpa": round(rnd.uniform(1.0, 4.0), 2)},
+            "suggestions": current,
+            "completed_courses": completed,
+        }
+    return reports
+
+
+def legacy_bullets(report) -> list:
+    student, suggestions, completed_courses = report["student"], report["suggestions"], report["completed_courses"]
+    bullet_points = []
+    if student['current_gpa'] < 2.0:
+        bullet_points.append('<b>GPA Warning:</b> Current GPA (' + str(student['current_gpa']) + ') is below 2.0. Consider retaking courses with low grades.')
+    for row in suggestions:
+        if row["difficulty_rating"] and row["difficulty_rating"] >= 3:
+            bullet_points.append(f'<b>High Difficulty:</b> Monitor {row["course_id"]} ({row["course_name"]})')
+        if row["absence_limit"] and row["absences"] >= row["absence_limit"] * 0.75:
+            bullet_points.append(f'<b>Absence Warning:</b> Absences in {row["course_id"]} nearing limit ({row["absences"]}/{row["absence_limit"]})')
+        grade = row["grade"]
+        try:
+            if grade and float(grade) < 60:
+                bullet_points.append(f'<b>Low Grade:</b> Low grade in {row["course_id"]} ({row["course_name"]}). Consider seeking additional help or tutoring.')
+        except (ValueError, TypeError):
+            pass
+        risk_grades = ["C+", "C", "D+", "D", "F", "W", "DN"]
+        for comp in completed_courses:
+            if (
+                comp["difficulty_rating"] is not None
+                and comp["difficulty_rating"] == row["difficulty_rating"]
+                and str(comp["grade"]).strip().upper() in risk_grades
+            ):
+                bullet_points.append(f'<b>Potential Risk Based on Past Performance:</b> {row["course_id"]} ({row["course_name"]}) has a difficulty similar to a previous course ({comp["course_id"]}) where you scored {comp["grade"]}.')
+                break
+    return bullet_points
+
+
+def bench(label, reports):
+    rows = sum(len(r["suggestions"]) for r in reports.values())
+    completed = sum(len(r["completed_courses"]) for r in reports.values())
+    print(f"{label}: {len(reports):,} students, {rows:,} current / {completed:,} completed courses")
+    t0 = time.perf_counter()
+    expected = {sid: legacy_bullets(r) for sid, r in reports.items()}
+    t1 = time.perf_counter()
+    actual = {sid: generate_report.suggestion_bullets(r) for sid, r in reports.items()}
+    t2 = time.perf_counter()
+
+    mismatches = sum(expected[sid] != actual[sid] for sid in reports)
+    print(f"  nested loops       {t1 - t0:8.3f} s   {len(reports) / (t1 - t0):12,.0f} students/s")
+    print(f"  suggestion_bullets {t2 - t1:8.3f} s   {len(reports) / (t2 - t1):12,.0f} students/s")
+    print(f"  bullets {sum(map(len, expected.values())):,}, mismatches {mismatches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10_000)
+    args = parser.parse_args()
+
+    bench("typical transcripts", synthetic_reports(args.students))
+    bench("long transcripts", synthetic_reports(args.students, completed_range=(80, 140)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""The crawler's AIMD limiter and retry budget against a local stub HTTP server.
+
+Pages are fetched with the real fetch_page_with_retries (requests over loopback) from a
+server whose behaviour is switched per phase:
+
+  overload   every request gets 429 (or 503) with Retry-After
+             -> the fetch limiter's window shrinks, and no retry is sent before Retry-After
+  recovery   every request gets 200
+             -> the window grows back to its maximum
+  outage     every request gets 503
+             -> retries stop once the retry budget (minimum + ratio x requests) is spent
+
+Backoff, cooldown and budget constants are scaled down; the run takes about half a minute,
+most of it spent honouring Retry-After with the window at one.
+Exits non-zero if any check fails. Run from the project root:
+    python -m senior.benchmarks.bench_retry_limiter
+"""
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from senior.crawling import psu_site_crawler as crawler
+
+RETRY_AFTER = 0.3  # seconds, sent as "0.3"; parse_retry_after accepts fractional delta-seconds
+
+
+class StubServer:
+    """Serves `status` to every GET and records the arrival time of each request."""
+
+    def __init__(self):
+        self.status = 200
+        self.arrivals = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.arrivals.append((time.monotonic(), self.path))
+                    status = server.status
+                body = b"<html><body><main><h1>Page</h1><p>Stub page body text for the limiter check.</p></main></body></html>"
+                self.send_response(status)
+                if status in (429, 503):
+                    self.send_header("Retry-After", str(RETRY_AFTER))
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def set(self, status):
+        with self._lock:
+            self.status = status
+            self.arrivals = []
+
+
+async def fetch_all(limiter, base, n, tag):
+    return await asyncio.gather(*(crawler.fetch_page_with_retries(f"{base}/{tag}/{i}", None, limiter) for i in range(n)))
+
+
+def check(name, ok, detail):
+    print(f"  {'ok  ' if ok else 'FAIL'} {name}: {detail}")
+    return ok
+
+
+async def run_checks(server):
+    results = []
+    limiter = crawler.AdaptiveLimiter("fetch", max_limit=16)
+    limiter.DECREASE_COOLDOWN = 0.1
+
+    # Overload: 429 then 503, both with Retry-After
+    for status in (429, 503):
+        server.set(status)
+        await fetch_all(limiter, server.base, 24, f"overload-{status}")
+        per_url = {}
+        for at, path in server.arrivals:
+            per_url.setdefault(path, []).append(at)
+        gaps = [b - a for times in per_url.values() for a, b in zip(times, times[1:])]
+        results.append(check(f"window shrinks on {status}", limiter.stats["min_limit_seen"] < limiter.max_limit,
+                             f"limit {limiter.max_limit} -> min {limiter.stats['min_limit_seen']} "
+                             f"({limiter.stats['overloads']} overloads)"))
+        results.append(check(f"retries wait for Retry-After on {status}", bool(gaps) and min(gaps) >= RETRY_AFTER * 0.95,
+                             f"{len(gaps)} retries, shortest gap {min(gaps or [0]) * 1000:.0f} ms "
+                             f"(Retry-After {RETRY_AFTER * 1000:.0f} ms)"))
+    shrunk = limiter.limit
+
+    # Recovery: additive increase back to the maximum
+    server.set(200)
+    for round_ in range(40):
+        await fetch_all(limiter, server.base, 32, f"recovery-{round_}")
+        if int(limiter.limit) >= limiter.max_limit:
+            break
+    results.append(check("window recovers", int(limiter.limit) >= limiter.max_limit,
+                         f"limit {int(shrunk)} -> {int(limiter.limit)} after {limiter.stats['successes']} successes"))
+
+    # Outage: the retry budget caps retries
+    outage = crawler.AdaptiveLimiter("fetch", max_limit=8)
+    outage.budget = crawler.RetryBudget(ratio=0.2, minimum=5)
+    server.set(503)
+    fetched = await fetch_all(outage, server.base, 40, "outage")
+    # try_spend() admits a retry while retries < minimum + ratio x requests so far, so the
+    # last one may take the count one past the bound
+    allowed = outage.budget.minimum + outage.budget.ratio * outage.budget.requests
+    results.append(check("retry budget enforced",
+                         outage.budget.retries - 1 < allowed and outage.stats["budget_exhausted"] > 0,
+                         f"{outage.budget.retries} retries for {outage.budget.requests} requests "
+                         f"(bound {allowed:.1f}), {outage.stats['budget_exhausted']} gave up on the budget"))
+    results.append(check("exhausted calls return the last response",
+                         all(meta.get("status") == 503 for _, meta in fetched), f"{len(fetched)} results, all 503"))
+    return results
+
+
+def main():
+    crawler.BACKOFF_BASE_SECONDS = 0.01
+    crawler.BACKOFF_MAX_SECONDS = 0.05
+    crawler.MAX_ATTEMPTS = 4
+    server = StubServer()
+    try:
+        results = asyncio.run(run_checks(server))
+    finally:
+        server.httpd.shutdown()
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Request coalescing: N identical concurrent questions should cost one pipeline run.
+
+Fires bursts of concurrent requests (released together by a barrier) at a stub pipeline
+of three StubChatModel calls behind senior.tools.single_flight.SingleFlight and checks:
+
+  general    N copies of a general question     -> 1 execution, N identical answers
+  personal   N copies of "my GPA"/student-ID questions -> N executions (never shared)
+  mixed      K distinct general questions x N   -> K executions
+  errors     a failing run                      -> the error reaches every waiter
+  shed       the leader is shed (Overloaded)    -> each waiter runs on its own instead
+
+With crewai installed, the same general burst also goes through main.py's /chatbot route
+(Flask test client, stubs from bench_offline), which checks that each caller gets its own
+session and the coalescing counters in /metrics.
+
+Exits non-zero if any check fails. Run from the project root:
+    python -m senior.benchmarks.bench_single_flight
+    python -m senior.benchmarks.bench_single_flight --requests 50 --llm-latency-ms 100
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from senior.benchmarks import stubs
+from senior.tools.admission import Overloaded
+from senior.tools.single_flight import SingleFlight, is_shareable
+
+GENERAL = ["When does the add/drop period end?", "What are the graduation requirements for software engineering?",
+           "How much is tuition at PSU?", "Which courses are in the CS study plan?"]
+PERSONAL = ["What is my GPA?", "Can I register for CS 340 next term?", "What is the GPA of student 221110045?",
+            "Show the absences for 221110045 in CS101", "Email jdoe@psu.edu.sa my transcript"]
+
+
+def burst(fn, prompts):
+    """Run fn(prompt) for every prompt on its own thread, all released at once."""
+    barrier = threading.Barrier(len(prompts))
+
+    def one(prompt):
+        barrier.wait()
+        t0 = time.perf_counter()
+        try:
+            return fn(prompt), None, time.perf_counter() - t0
+        except Exception as e:
+            return None, e, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        return list(pool.map(one, prompts))
+
+
+class StubPipeline:
+    """Three LLM calls in sequence, like the SQL/retrieval/merge stages of faculty_advisor_chatbot."""
+
+    def __init__(self, latency, fail=False, shed_first=False):
+        self.llm = stubs.StubChatModel(latency=latency)
+        self.fail = fail
+        self.shed_first = shed_first
+        self.executions = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.executions += 1
+            shed = self.shed_first and self.executions == 1
+        answer = ""
+        for stage in ("sql", "retrieval", "merge"):
+            answer = self.llm.invoke(f"{stage}: {prompt}\n{answer}").content
+        if self.fail:
+            raise RuntimeError("upstream rate limit")
+        if shed:
+            raise Overloaded("deadline", 1)
+        return answer
+
+
+def run_case(name, prompts, latency, expect_executions, fail=False, shed_first=False):
+    flights, pipeline = SingleFlight(enabled=True), StubPipeline(latency, fail, shed_first)
+    results = burst(lambda p: flights.do(flights.key(p), lambda: pipeline(p), rerun_on=(Overloaded,)), prompts)
+    answers, errors = {}, []
+    for prompt, (value, error, _) in zip(prompts, results):
+        if error is not None:
+            errors.append(error)
+        else:
+            answers.setdefault(prompt, set()).add(value[0])
+    slowest = max(r[2] for r in results)
+    ok = pipeline.executions == expect_executions
+    if fail:
+        ok = ok and len(errors) == len(prompts)
+    elif shed_first:
+        ok = ok and len(errors) == 1 and all(len(a) == 1 for a in answers.values())
+    else:
+        ok = ok and not errors and all(len(a) == 1 for a in answers.values())
+    print(f"  {name:9s} {len(prompts):4d} requests -> {pipeline.executions:3d} executions "
+          f"(expected {expect_executions})   errors {len(errors):3d}   slowest {1000 * slowest:7.1f} ms   "
+          f"{flights.stats()}   {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def run_main_route(args):
+    """The general burst through main.py's /chatbot; None when main.py's dependencies are missing."""
+    from senior.benchmarks.bench_offline import load_main
+
+    args.students, args.corpus = 50, 200
+    for name in ("embed_latency_ms", "vector_latency_ms", "search_latency_ms"):
+        setattr(args, name, 0.0)
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            main, _, _ = load_main(args, tmp)
+        except ImportError as e:
+            print(f"  /chatbot  skipped (missing dependency: {e})")
+            return None
+        client = main.app.test_client()
+        calls_before = stubs.snapshot_calls().get("llm", 0)
+        results = burst(lambda p: client.post("/chatbot", json={"prompt": p}).get_json(), [GENERAL[0]] * args.requests)
+        llm_calls = stubs.snapshot_calls().get("llm", 0) - calls_before
+        replies = [r[0] for r in results if r[1] is None and r[0] and "answer" in r[0]]
+        flights = main.chatbot_flights.stats()
+        ok = (len(replies) == args.requests and len({r["answer"] for r in replies}) == 1
+              and len({r["session_id"] for r in replies}) == args.requests and flights["executed"] == 1)
+        print(f"  /chatbot  {args.requests:4d} requests -> {flights['executed']:3d} executions   "
+              f"{llm_calls} LLM calls   {len({r['session_id'] for r in replies})} sessions   {'ok' if ok else 'FAIL'}")
+        return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="Concurrent copies of each question")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    latency, n = args.llm_latency_ms / 1000, args.requests
+
+    for prompt in GENERAL + PERSONAL:
+        print(f"  {'shared ' if is_shareable(prompt) else 'alone  '} {prompt}")
+    results = [
+        run_case("general", [GENERAL[0]] * n, latency, 1),
+        run_case("personal", [PERSONAL[i % len(PERSONAL)] for i in range(n)], latency, n),
+        run_case("mixed", [GENERAL[i % len(GENERAL)] for i in range(n * len(GENERAL))], latency, len(GENERAL)),
+        run_case("errors", [GENERAL[1]] * n, latency, 1, fail=True),
+        run_case("shed", [GENERAL[2]] * n, latency, n, shed_first=True),
+        run_main_route(args),
+    ]
+    if False in results:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
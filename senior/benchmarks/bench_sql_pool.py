@@ -0,0 +1,133 @@
+"""Load test for the chatbot's SQL path: two default pools versus one shared tuned pool and result cache.
+
+Each simulated chatbot request runs one template query (student GPA, courses or
+absences, skewed toward a set of hot students the way advisors revisit their
+advisees) and one agent-style query. Before the change these used two separate
+engines with default pools (main.py's engine and SQLDatabase.from_uri); now both use
+create_shared_engine(), optionally with the QueryResultCache in front.
+
+By default it runs against a synthetic SQLite database with --latency-ms injected per
+statement to stand in for a remote MySQL round trip; pass --db-uri to load a real one.
+
+Run from the project root:
+    python -m senior.benchmarks.bench_sql_pool
+    python -m senior.benchmarks.bench_sql_pool --concurrency 64 --requests 5000 --latency-ms 10
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event, text
+
+from senior.benchmarks.report_fixture import build_fixture
+from senior.tools.sql_engine import (
+    PoolStats, QueryResultCache, TimedQueuePool, create_shared_engine, pool_status,
+)
+from senior.tools.sql_templates import SQLTemplateCache
+
+AGENT_SQL = [
+    "SELECT COUNT(*) FROM Student WHERE cumulative_gpa < 2.0",
+    "SELECT major_id, COUNT(*) FROM Student GROUP BY major_id",
+    "SELECT advisor_id, COUNT(*) FROM High_Risk_Student GROUP BY advisor_id",
+]
+
+
+def questions(student_ids, n, seed=11):
+    rng = random.Random(seed)
+    hot = student_ids[:50]
+    shapes = ["What is the GPA of student {}?", "Which courses is student {} currently taking?",
+              "How many absences does student {} have?"]
+    return [rng.choice(shapes).format(rng.choice(hot) if rng.random() < 0.8 else rng.choice(student_ids))
+            for _ in range(n)]
+
+
+def add_latency(engine, latency_s):
+    if latency_s > 0:
+        event.listen(engine, "before_cursor_execute", lambda *args: time.sleep(latency_s))
+
+
+def run(label, template_engine, agent_engine, cache, workload, concurrency):
+    templates = SQLTemplateCache(template_engine, learned_path=None, result_cache=cache)
+    rng_lock, rng = threading.Lock(), random.Random(3)
+    latencies = []
+
+    def request(question):
+        with rng_lock:
+            agent_sql = rng.choice(AGENT_SQL)
+        t0 = time.perf_counter()
+        templates.answer(question, 50)
+        fetch = lambda: _agent_query(agent_engine, agent_sql)
+        cache.get_or_run(agent_sql, None, fetch) if cache is not None else fetch()
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(request, workload))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    waits = [pool_status(e) for e in {id(e): e for e in (template_engine, agent_engine)}.values()]
+    print(f"  {label:26s} {len(workload) / elapsed:8.1f} req/s   p50 {1000 * statistics.median(latencies):7.1f} ms   "
+          f"p95 {1000 * latencies[int(len(latencies) * 0.95) - 1]:7.1f} ms")
+    for w in waits:
+        print(f"  {'':26s} pool size {w.get('size')}   wait avg {w['avg_wait_ms']:.2f} ms   "
+              f"p95 {w['p95_wait_ms']:.2f} ms   max {w['max_wait_ms']:.2f} ms   timeouts {w['timeouts']}")
+    if cache is not None:
+        print(f"  {'':26s} cache {cache.stats()}")
+
+
+def _agent_query(engine, sql):
+    with engine.connect() as conn:
+        result = conn.execute(text(sql))
+        return list(result.keys()), result.fetchall()
+
+
+def default_engine(db_uri):
+    # What create_engine(db_uri) / SQLDatabase.from_uri(db_uri) give a MySQL URI: QueuePool(5, overflow 10)
+    engine = create_engine(db_uri, poolclass=TimedQueuePool, pool_size=5, max_overflow=10, pool_timeout=30)
+    engine.pool.stats = PoolStats()
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-uri", help="Database to load (default: synthetic SQLite stand-in)")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Injected per-statement latency")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_uri = args.db_uri
+        if not db_uri:
+            path = os.path.join(tmp, "chatbot.db")
+            build_fixture(path, students=args.students)
+            db_uri = f"sqlite:///{path}"
+        with create_engine(db_uri).connect() as conn:
+            student_ids = [row[0] for row in conn.execute(text("SELECT student_id FROM Student ORDER BY student_id"))]
+        workload = questions(student_ids, args.requests)
+        latency = args.latency_ms / 1000
+        print(f"{len(workload)} requests, concurrency {args.concurrency}, {args.latency_ms} ms per statement")
+
+        main_engine, agent_engine = default_engine(db_uri), default_engine(db_uri)
+        for e in (main_engine, agent_engine):
+            add_latency(e, latency)
+        run("two default pools", main_engine, agent_engine, None, workload, args.concurrency)
+
+        shared = create_shared_engine(db_uri)
+        add_latency(shared, latency)
+        run("shared tuned pool", shared, shared, None, workload, args.concurrency)
+
+        shared = create_shared_engine(db_uri)
+        add_latency(shared, latency)
+        run("shared pool + result cache", shared, shared, QueryResultCache(), workload, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
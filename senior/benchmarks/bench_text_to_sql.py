@@ -0,0 +1,106 @@
+"""LLM calls, tokens and latency per question: templates, direct text-to-SQL and the SQL agent.
+
+Needs OPENAI_API_KEY and DB_URI (the same database main.py uses). Each question
+is answered by the create_sql_agent path main.py used before, by TextToSQL
+without templates (cached schema + few-shot prompt, agent fallback on errors)
+and by TextToSQL as main.py runs it, with the parameterized templates first.
+
+Run from the project root:
+    python -m senior.benchmarks.bench_text_to_sql
+    python -m senior.benchmarks.bench_text_to_sql --questions questions.txt --repeat 3
+"""
+import argparse
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_QUESTIONS = [
+    "What is the current GPA of student 1001?",
+    "Which courses is student 1001 currently enrolled in?",
+    "How many absences does student 1001 have in each current course?",
+    "List the high risk students of advisor A1.",
+    "Which students have a cumulative GPA below 2.0?",
+    "How many students are enrolled in each major?",
+    "What grades did student 1001 get in completed courses?",
+    "Which current courses have a difficulty rating of 4 or more?",
+]
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.tokens += usage.get("total_tokens", 0)
+
+
+def run(label, answer, questions, repeat):
+    calls, tokens, latencies, failures = [], [], [], 0
+    for _ in range(repeat):
+        for q in questions:
+            counter = LLMCallCounter()
+            t0 = time.perf_counter()
+            try:
+                answer(q, counter)
+            except Exception as e:
+                failures += 1
+                print(f"  {label} failed on {q!r}: {e}")
+            latencies.append(time.perf_counter() - t0)
+            calls.append(counter.calls)
+            tokens.append(counter.tokens)
+    print(f"  {label:12s} LLM calls/question {statistics.mean(calls):5.2f}   tokens/question {statistics.mean(tokens):8,.0f}   "
+          f"p50 {statistics.median(latencies):6.2f} s   max {max(latencies):6.2f} s   failures {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", help="File with one question per line")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    load_dotenv()
+    from sqlalchemy import create_engine
+    from langchain_community.utilities.sql_database import SQLDatabase
+    from langchain.agents import create_sql_agent
+    from langchain.agents.agent_types import AgentType
+    from langchain_openai import ChatOpenAI
+    from senior.tools.sql_templates import QueryLog, SQLTemplateCache
+    from senior.tools.text_to_sql import TextToSQL
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    db_uri = os.getenv("DB_URI")
+    engine = create_engine(db_uri)
+    llm = ChatOpenAI(api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4o-mini", temperature=0)
+    agent = create_sql_agent(llm=llm, db=SQLDatabase.from_uri(db_uri), agent_type=AgentType.OPENAI_FUNCTIONS, verbose=False)
+    no_log = QueryLog(path=None)
+    direct = TextToSQL(engine, llm, fallback=agent, query_log=no_log,
+                       templates=SQLTemplateCache(engine, templates=[], learned_path=None))
+    templated = TextToSQL(engine, llm, fallback=agent, query_log=no_log)
+    direct.schema.get()  # introspected once per process in main.py too
+    templated.schema.get()
+
+    print(f"{len(questions)} questions x {args.repeat}")
+    run("sql agent", lambda q, cb: agent.invoke({"input": q}, config={"callbacks": [cb]}), questions, args.repeat)
+    run("text-to-sql", lambda q, cb: direct.answer(q, callbacks=[cb]), questions, args.repeat)
+    run("templates", lambda q, cb: templated.answer(q, callbacks=[cb]), questions, args.repeat)
+    print(f"  text-to-sql stats: {direct.stats}")
+    print(f"  templates stats:   {templated.stats} hits {dict(templated.templates.hits)}")
+
+
+if __name__ == "__main__":
+    main()
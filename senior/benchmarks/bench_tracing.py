@@ -0,0 +1,63 @@
+"""Overhead of the chatbot's tracing spans, enabled versus disabled.
+
+Times a synthetic request shaped like /chatbot (root span, SQL spans, three crew
+kickoffs, tool spans, LLM-call counting) with tracing on and off, and the cost of
+a single span. A real request takes 20-40 s, so anything in microseconds is noise.
+
+Run from the project root:
+    python -m senior.benchmarks.bench_tracing
+    python -m senior.benchmarks.bench_tracing --requests 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from senior.tools.tracing import Tracer
+
+
+def fake_request(tracer):
+    with tracer.request(prompt_chars=42):
+        with tracer.span("sql"):
+            with tracer.span("sql.template"):
+                pass
+            with tracer.span("sql.generate"):
+                tracer.record(llm_calls=1, prompt_tokens=900, completion_tokens=40)
+            with tracer.span("sql.execute"):
+                tracer.record(cache_hits=1)
+        for name in ("crew.web_advisor", "crew.advisor", "crew.quality_merge"):
+            with tracer.span(name):
+                for _ in range(2):
+                    tracer.record(llm_calls=1, prompt_tokens=1500, completion_tokens=200)
+                tool = tracer.start("tool.pinecone")
+                tracer.finish(tool)
+
+
+def per_request_us(tracer, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fake_request(tracer)
+    return 1e6 * (time.perf_counter() - t0) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        enabled = Tracer(path=os.path.join(tmp, "traces.jsonl"), enabled=True)
+        in_memory = Tracer(path=None, enabled=True)
+        disabled = Tracer(path=None, enabled=False)
+        print(f"{args.requests} synthetic requests, 12 spans each")
+        print(f"  disabled              {per_request_us(disabled, args.requests):8.1f} us/request")
+        print(f"  enabled, no export    {per_request_us(in_memory, args.requests):8.1f} us/request")
+        print(f"  enabled, JSONL export {per_request_us(enabled, args.requests):8.1f} us/request")
+        size = os.path.getsize(enabled.path)
+        print(f"  trace log {size / args.requests:,.0f} bytes/request")
+        sql = enabled.metrics()["spans"]["sql"]
+        print(f"  metrics sample (sql): {sql}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Golden-output check for the crawler's HTML extraction.
+
+Runs extract_html on the fixture pages in senior/data/html_extraction/ and compares the
+page metadata and structured text with golden.json in the same directory. When
+BeautifulSoup is installed, each page is also run through the previous html.parser-based
+extraction (bench_html_extraction.legacy_extract), and the two must agree. The exception
+is a page listed in KNOWN_DIFFERENCES, where the two parsers build different trees from
+the same broken markup.
+
+The fixtures cover nested lists and tables, the main-container fallbacks, removed page
+chrome, Arabic text and entities, download links and relative canonicals, and malformed
+markup.
+
+Exits non-zero on any mismatch. Run from the project root:
+    python -m senior.benchmarks.html_extraction_golden
+    python -m senior.benchmarks.html_extraction_golden --update   # after an intended change
+"""
+import argparse
+import difflib
+import glob
+import json
+import os
+import sys
+
+from senior.crawling import psu_site_crawler as crawler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "html_extraction")
+GOLDEN_PATH = os.path.join(FIXTURE_DIR, "golden.json")
+BASE_URL = "https://www.psu.edu.sa/en/pages/"
+
+KNOWN_DIFFERENCES = {
+    # html.parser does not close an open <p> at the next <p>, so the old extraction nested
+    # the second paragraph inside the first and emitted its text twice
+    "malformed.html": "unclosed <p> tags",
+}
+
+
+def extract(fn, name: str, html: str) -> dict:
+    page_meta, text = fn(html, BASE_URL + name)
+    return {"meta": page_meta, "text": text}
+
+
+def diff(expected: dict, actual: dict) -> str:
+    if expected["meta"] != actual["meta"]:
+        return f"      meta expected {expected['meta']}\n      meta actual   {actual['meta']}"
+    lines = difflib.unified_diff(expected["text"].splitlines(), actual["text"].splitlines(),
+                                 "expected", "actual", lineterm="")
+    return "\n".join("      " + line for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help="Rewrite golden.json from the current extract_html")
+    args = parser.parse_args()
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    current = {name: extract(crawler.extract_html, name, html) for name, html in pages.items()}
+
+    if args.update:
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Wrote {len(current)} pages to {GOLDEN_PATH}")
+        return
+
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+    try:
+        from senior.benchmarks.bench_html_extraction import legacy_extract
+        import bs4  # noqa: F401
+    except ImportError:
+        legacy_extract = None
+        print("  legacy comparison skipped (beautifulsoup4 not installed)")
+
+    failed = False
+    for name in sorted(set(pages) | set(golden)):
+        if name not in golden or name not in pages:
+            print(f"  FAIL {name}: {'no golden entry' if name in pages else 'fixture missing'}")
+            failed = True
+            continue
+        ok = current[name] == golden[name]
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}: golden")
+        if not ok:
+            print(diff(golden[name], current[name]))
+            failed = True
+        if legacy_extract is None:
+            continue
+        if name in KNOWN_DIFFERENCES:
+            print(f"  skip {name}: legacy ({KNOWN_DIFFERENCES[name]})")
+            continue
+        legacy = extract(legacy_extract, name, pages[name])
+        ok = current[name] == legacy
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}: legacy")
+        if not ok:
+            print(diff(legacy, current[name]))
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
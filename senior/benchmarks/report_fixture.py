@@ -0,0 +1,79 @@
+"""Synthetic SQLite database with the tables generate_report.py reads.
+
+Used by the report benchmarks so they run without the MySQL instance:
+    python -m senior.benchmarks.report_fixture /tmp/reports.db --students 1000
+"""
+import argparse
+import random
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE Department(department_id TEXT PRIMARY KEY, department_name TEXT);
+CREATE TABLE Major(major_id TEXT PRIMARY KEY, major_name TEXT, department_id TEXT);
+CREATE TABLE Advisor(advisor_id TEXT PRIMARY KEY, Fname TEXT, Lname TEXT, email TEXT);
+CREATE TABLE Student(student_id INTEGER PRIMARY KEY, Fname TEXT, Lname TEXT, email TEXT, advisor_id TEXT,
+                     major_id TEXT, department_id TEXT, current_gpa REAL, cumulative_gpa REAL, transcript TEXT,
+                     Warnings TEXT, enrollment_year INTEGER, completed_hours INTEGER);
+CREATE TABLE Course(course_id TEXT PRIMARY KEY, course_name TEXT, difficulty_rating REAL, absence_limit INTEGER);
+CREATE TABLE Student_Course_Enrollment(student_id INTEGER, course_id TEXT, semester TEXT, status TEXT, grade TEXT);
+CREATE TABLE Student_Course_Absence(student_id INTEGER, course_id TEXT, semester TEXT, absence_count INTEGER);
+CREATE TABLE Student_GPA_History(student_id INTEGER, semester TEXT, gpa REAL);
+CREATE TABLE High_Risk_Student(student_id INTEGER PRIMARY KEY, student_name TEXT, cumulative_gpa REAL, advisor_id TEXT);
+CREATE INDEX idx_enrollment_student ON Student_Course_Enrollment(student_id);
+CREATE INDEX idx_absence_student ON Student_Course_Absence(student_id);
+CREATE INDEX idx_gpa_student ON Student_GPA_History(student_id);
+"""
+
+LETTER_GRADES = ["A+", "A", "B+", "B", "C+", "C", "D+", "D", "F", "W"]
+
+
+def build_fixture(path: str, students: int = 1000, courses: int = 60, advisors: int = 20, seed: int = 7):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO Department VALUES(?,?)", [("CS", "Computer Science"), ("IS", "Information Systems")])
+    conn.executemany("INSERT INTO Major VALUES(?,?,?)", [("SE", "Software Engineering", "CS"), ("IS", "Information Systems", "IS")])
+    conn.executemany("INSERT INTO Advisor VALUES(?,?,?,?)",
+                     [(f"ADV{a}", "Advisor", str(a), f"adv{a}@psu.edu.sa") for a in range(advisors)])
+    course_rows = [(f"CS{100 + i}", f"Course {i}", rnd.choice([None, 1, 2, 3, 4, 5]), rnd.choice([6, 8, 10]))
+                   for i in range(courses)]
+    conn.executemany("INSERT INTO Course VALUES(?,?,?,?)", course_rows)
+
+    for sid in range(1, students + 1):
+        dept, major = rnd.choice([("CS", "SE"), ("IS", "IS")])
+        gpa = round(rnd.uniform(1.2, 4.0), 2)
+        advisor = f"ADV{sid % advisors}"
+        conn.execute("INSERT INTO Student VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                     (sid, "Student", str(sid), f"s{sid}@psu.edu.sa", advisor, major, dept, gpa, gpa, None,
+                      "Academic probation" if gpa < 2 else None, 2020 + sid % 5, rnd.randint(10, 120)))
+        if gpa < 2:
+            conn.execute("INSERT INTO High_Risk_Student VALUES(?,?,?,?)", (sid, f"Student {sid}", gpa, advisor))
+        conn.executemany("INSERT INTO Student_GPA_History VALUES(?,?,?)",
+                         [(sid, sem, round(rnd.uniform(1, 4), 2)) for sem in ("Fall 2023", "Spring 2024", "Fall 2024")])
+        for i, (cid, *_rest) in enumerate(rnd.sample(course_rows, 14)):
+            if i < 8:
+                conn.execute("INSERT INTO Student_Course_Enrollment VALUES(?,?,?,?,?)",
+                             (sid, cid, "Fall 2023", "Completed", rnd.choice(LETTER_GRADES)))
+            elif i < 12:
+                conn.execute("INSERT INTO Student_Course_Enrollment VALUES(?,?,?,?,?)",
+                             (sid, cid, "Fall 2024", "Current", str(rnd.randint(40, 100))))
+                conn.execute("INSERT INTO Student_Course_Absence VALUES(?,?,?,?)", (sid, cid, "Fall 2024", rnd.randint(0, 10)))
+                if rnd.random() < 0.2:  # absences from an earlier attempt at the same course
+                    conn.execute("INSERT INTO Student_Course_Absence VALUES(?,?,?,?)", (sid, cid, "Spring 2024", rnd.randint(0, 10)))
+            else:
+                conn.execute("INSERT INTO Student_Course_Enrollment VALUES(?,?,?,?,?)", (sid, cid, "Spring 2025", "Leftover", None))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--students", type=int, default=1000)
+    args = parser.parse_args()
+    build_fixture(args.path, students=args.students)
+    print(f"Wrote {args.students:,} students to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+"""Retrieval quality, latency and cost of the PSU web index across chunking configs.
+
+Runs a fixed labeled set (senior/data/retrieval_eval.json: question -> expected URLs)
+against an index and reports, per config and side by side:
+  recall@k     share of a question's expected URLs among the top k chunks' URLs
+  MRR          1 / rank of the first chunk from an expected URL (0 when not in the top 10)
+  latency      query embedding lookup plus vector search, mean and p95
+  index size   chunks, vector and text megabytes
+  cost         tokens and USD to embed the whole index once
+
+Indexes:
+  local     pages from a snapshot, chunked with psu_site_crawler.chunk_document for every
+            --configs entry (max_tokens:min_tokens) and searched by brute-force cosine
+  stub      synthetic program and policy pages with generated questions and hashed
+            bag-of-words embeddings; exercises the harness without network or keys
+  pinecone  the live psu-web-auto index as the crawler built it (a single config)
+
+Embeddings are cached in SQLite keyed by (model, dimensions, text), so a config or a
+rerun only pays for chunks it has not seen. With --offline a cache miss is an error,
+which makes runs from a copied snapshot and cache reproducible without any API access.
+
+Run from the project root:
+    python -m senior.benchmarks.retrieval_eval snapshot --distractors 300
+    python -m senior.benchmarks.retrieval_eval run --configs 400:120 250:80 800:200
+    python -m senior.benchmarks.retrieval_eval run --offline --out logs/retrieval_eval_after.json
+    python -m senior.benchmarks.retrieval_eval run --index stub
+    python -m senior.benchmarks.retrieval_eval run --index pinecone
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from senior.benchmarks import stubs
+from senior.crawling import psu_site_crawler as crawler
+
+LABELS_PATH = "senior/data/retrieval_eval.json"
+SNAPSHOT_PATH = "logs/retrieval_eval/pages.jsonl"
+CACHE_PATH = "logs/retrieval_eval/embeddings.db"
+DEFAULT_CONFIGS = [f"{crawler.CHUNK_MAX_TOKENS}:{crawler.CHUNK_MIN_TOKENS}", "250:80", "800:200"]
+KS = (1, 3, 5, 10)
+STUB_MODEL, STUB_DIMENSION = "stub-hashed", 256
+# USD per 1M input tokens
+EMBED_PRICES = {"text-embedding-3-large": 0.13, "text-embedding-3-small": 0.02, "text-embedding-ada-002": 0.10}
+
+def normalize_url(url: str) -> str:
+    return url.strip().lower().replace("://www.", "://").rstrip("/")
+
+
+def parse_config(value: str) -> Tuple[str, Dict[str, int]]:
+    """'max_tokens:min_tokens' -> (label, chunk_document keyword arguments)."""
+    try:
+        max_tokens, min_tokens = (int(v) for v in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected max_tokens:min_tokens, got {value!r}")
+    return value, {"max_tokens": max_tokens, "min_tokens": min_tokens}
+
+
+def load_labels(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["questions"]
+
+
+# --- Embeddings --------------------------------------------------------------
+
+class CacheMiss(Exception):
+    pass
+
+
+class EmbeddingCache:
+    """SQLite store of float32 vectors keyed by sha256(model, dimensions, text)."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+
+    @staticmethod
+    def key(model: str, dim: int, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{dim}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch)
+            found.update((k, np.frombuffer(v, dtype=np.float32)) for k, v in rows)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                                  [(k, v.astype(np.float32).tobytes()) for k, v in items.items()])
+
+    def close(self):
+        self.conn.close()
+
+
+def openai_backend(model: str, dim: int) -> Callable[[List[str]], List[List[float]]]:
+    from openai import OpenAI
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def embed(texts):
+        resp = client.embeddings.create(model=model, input=texts, dimensions=dim)
+        return [d.embedding for d in resp.data]
+
+    return embed
+
+
+def stub_backend(dim: int) -> Callable[[List[str]], List[List[float]]]:
+    return lambda texts: [stubs.hashed_vector(t, dim) for t in texts]
+
+
+class CachedEmbedder:
+    """Embeds through the cache; only misses reach the backend (None = offline)."""
+
+    def __init__(self, model: str, dim: int, cache: EmbeddingCache, backend: Optional[Callable]):
+        self.model = model
+        self.dim = dim
+        self.cache = cache
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.tokens_spent = 0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        keys = [EmbeddingCache.key(self.model, self.dim, t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing = list(dict.fromkeys((k, t) for k, t in zip(keys, texts) if k not in found))
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            if self.backend is None:
+                raise CacheMiss(f"{len(missing)} texts are not in the embedding cache for {self.model}/{self.dim}")
+            fresh = {}
+            for i in range(0, len(missing), crawler.EMBED_BATCH_SIZE):
+                batch = missing[i:i + crawler.EMBED_BATCH_SIZE]
+                vectors = self.backend([t for _, t in batch])
+                fresh.update((k, np.asarray(v, dtype=np.float32)) for (k, _), v in zip(batch, vectors))
+                self.tokens_spent += sum(crawler.count_tokens(t) for _, t in batch)
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        matrix = np.vstack([found[k] for k in keys]) if keys else np.zeros((0, self.dim), np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+
+# --- Indexes -----------------------------------------------------------------
+
+class LocalIndex:
+    """Brute-force cosine search over normalized chunk vectors."""
+
+    def __init__(self, vectors: np.ndarray, chunk_urls: List[List[str]], texts: List[str]):
+        self.vectors = vectors
+        self.chunk_urls = chunk_urls
+        self.size = {
+            "chunks": len(texts),
+            "avg_chunk_chars": round(statistics.mean(len(t) for t in texts)) if texts else 0,
+            "vector_mb": round(vectors.nbytes / 2**20, 2),
+            "text_mb": round(sum(len(t.encode("utf-8")) for t in texts) / 2**20, 2),
+        }
+
+    def search(self, query: np.ndarray, k: int) -> List[List[str]]:
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.chunk_urls[i] for i in top[np.argsort(-scores[top])]]
+
+
+class PineconeIndex:
+    """The deployed index; a chunk counts for its url and every merged source_url."""
+
+    def __init__(self, name: str = crawler.INDEX_NAME, namespace: Optional[str] = None):
+        from pinecone import Pinecone
+        self.index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(name)
+        self.namespace = namespace
+        stats = self.index.describe_index_stats()
+        self.size = {"chunks": stats.total_vector_count,
+                     "vector_mb": round(stats.total_vector_count * stats.dimension * 4 / 2**20, 2)}
+
+    def search(self, query: np.ndarray, k: int) -> List[List[str]]:
+        res = self.index.query(vector=query.tolist(), top_k=k, include_metadata=True, namespace=self.namespace)
+        return [[m.metadata.get("url", "")] + list(m.metadata.get("source_urls") or []) for m in res.matches]
+
+
+def chunk_pages(pages: List[Dict], config: Dict[str, int]):
+    texts, urls = [], []
+    for page in pages:
+        for heading, chunk in crawler.chunk_document(page["text"], **config):
+            texts.append(crawler.embedding_text(heading, chunk))
+            urls.append([page["url"]])
+    return texts, urls
+
+
+# --- Evaluation --------------------------------------------------------------
+
+def evaluate(index, embedder: CachedEmbedder, labels: List[Dict]) -> Dict:
+    depth = max(KS)
+    queries = [q["question"] for q in labels]
+    embedder.embed(queries)  # warm the cache so query latency is lookup + search
+    recalls = {k: [] for k in KS}
+    reciprocal_ranks, search_ms, query_ms, per_question = [], [], [], []
+    for q in labels:
+        expected = {normalize_url(u) for u in q["expected_urls"]}
+        t0 = time.perf_counter()
+        vector = embedder.embed([q["question"]])[0]
+        t1 = time.perf_counter()
+        ranked = [{normalize_url(u) for u in urls} for urls in index.search(vector, depth)]
+        t2 = time.perf_counter()
+        search_ms.append(1000 * (t2 - t1))
+        query_ms.append(1000 * (t2 - t0))
+        for k in KS:
+            found = set().union(*ranked[:k]) & expected
+            recalls[k].append(len(found) / len(expected))
+        rank = next((i + 1 for i, urls in enumerate(ranked) if urls & expected), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        per_question.append({"question": q["question"], "first_hit_rank": rank})
+    search_ms.sort()
+    return {
+        **{f"recall@{k}": round(statistics.mean(v), 3) for k, v in recalls.items()},
+        "mrr": round(statistics.mean(reciprocal_ranks), 3),
+        "search_ms_mean": round(statistics.mean(search_ms), 3),
+        "search_ms_p95": round(search_ms[min(len(search_ms) - 1, int(0.95 * len(search_ms)))], 3),
+        "query_ms_mean": round(statistics.mean(query_ms), 3),
+        "per_question": per_question,
+    }
+
+
+def index_cost(texts: List[str], model: str) -> Dict:
+    tokens = sum(crawler.count_tokens(t) for t in texts)
+    price = EMBED_PRICES.get(model)
+    return {"embed_tokens": tokens, "embed_cost_usd": round(tokens * price / 1e6, 4) if price is not None else None}
+
+
+def run_local(pages, labels, configs, embedder):
+    results = {}
+    for label, config in configs:
+        texts, urls = chunk_pages(pages, config)
+        hits, misses = embedder.hits, embedder.misses
+        t0 = time.perf_counter()
+        index = LocalIndex(embedder.embed(texts), urls, texts)
+        result = {"config": config, **index.size, **index_cost(texts, embedder.model),
+                  "build_s": round(time.perf_counter() - t0, 2)}
+        result.update(evaluate(index, embedder, labels))
+        result["cache"] = {"hits": embedder.hits - hits, "misses": embedder.misses - misses}
+        results[label] = result
+    return results
+
+
+# --- Stub corpus -------------------------------------------------------------
+
+def stub_pages_and_labels():
+    """One long page per program with a section per topic, plus one generic page per topic."""
+    pages, labels = [], []
+    filler = ("Students should confirm the details with their academic advisor before the registration "
+              "period and keep a copy of the approved form for their records.")
+    for p, program in enumerate(stubs.PROGRAMS):
+        url = f"https://psu.edu.sa/en/stub/{program.replace(' ', '-')}"
+        lines = [f"# {program.title()} program"]
+        for t, topic in enumerate(stubs.TOPICS):
+            lines.append(f"## {topic.title()}")
+            other = stubs.PROGRAMS[(p + t + 1) % len(stubs.PROGRAMS)]
+            lines += [f"The {topic} for the {program} program, item {j}: {filler}" for j in range(4 + (p + t) % 5)]
+            lines.append(f"Students moving from {other} follow the {other} {stubs.TOPICS[(t + 1) % len(stubs.TOPICS)]}.")
+            if t % 3 == 0:
+                lines += [f"{program.upper()} {100 + 10 * t + r} | {topic} | {3 + r % 2} credits" for r in range(8)]
+        pages.append({"url": url, "page_title": program.title(), "text": "\n".join(lines)})
+    for topic in stubs.TOPICS:
+        url = f"https://psu.edu.sa/en/stub/policy-{topic.replace(' ', '-')}"
+        lines = [f"# {topic.title()} policy"] + [
+            f"University-wide rules on {topic}, clause {j}, including the {stubs.PROGRAMS[j % len(stubs.PROGRAMS)]} "
+            f"program. {filler}" for j in range(6)]
+        pages.append({"url": url, "page_title": f"{topic.title()} policy", "text": "\n".join(lines)})
+    for i, question in enumerate(stubs.synthetic_questions(40)):
+        program = stubs.PROGRAMS[(i * 7) % len(stubs.PROGRAMS)]
+        labels.append({"question": question,
+                       "expected_urls": [f"https://psu.edu.sa/en/stub/{program.replace(' ', '-')}"]})
+    return pages, labels
+
+
+# --- Snapshot ----------------------------------------------------------------
+
+def snapshot(args):
+    labels = load_labels(args.labels)
+    urls = list(dict.fromkeys(u for q in labels for u in q["expected_urls"]))
+    if args.distractors:
+        conn = sqlite3.connect(f"file:{args.state_db}?mode=ro", uri=True)
+        indexed = [r[0] for r in conn.execute("SELECT url FROM pages WHERE content_hash IS NOT NULL ORDER BY url")]
+        conn.close()
+        pool = [u for u in indexed if u not in set(urls) and not u.lower().endswith(crawler.DOCUMENT_EXTENSIONS)]
+        urls += random.Random(args.seed).sample(pool, min(args.distractors, len(pool)))
+
+    def fetch(url):
+        html, meta = crawler.fetch_page(url, None)
+        if html is None:
+            return url, None, meta.get("status")
+        page_meta, text = crawler.extract_html(html, url)
+        return url, {"url": url, "page_title": page_meta.get("page_title", ""), "text": text}, meta.get("status")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        fetched = list(pool.map(fetch, urls))
+    pages = [page for _, page, _ in fetched if page and page["text"]]
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for page in pages:
+            f.write(json.dumps(page, ensure_ascii=False) + "\n")
+    print(f"Saved {len(pages)}/{len(urls)} pages to {args.out}")
+    got = {p["url"] for p in pages}
+    for url, _, status in fetched:
+        if url not in got and any(url in q["expected_urls"] for q in labels):
+            print(f"  labeled page missing: {url} (status {status})")
+
+
+def load_snapshot(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# --- Driver ------------------------------------------------------------------
+
+ROWS = ["chunks", "avg_chunk_chars", "vector_mb", "text_mb", *(f"recall@{k}" for k in KS), "mrr",
+        "search_ms_mean", "search_ms_p95", "query_ms_mean", "embed_tokens", "embed_cost_usd"]
+
+
+def print_table(results: Dict[str, Dict]):
+    labels = list(results)
+    width = max(14, *(len(label) + 2 for label in labels))
+    print(f"{'':18s}" + "".join(f"{label:>{width}s}" for label in labels))
+    for row in ROWS:
+        values = [results[label].get(row) for label in labels]
+        if all(v is None for v in values):
+            continue
+        print(f"{row:18s}" + "".join(f"{'-' if v is None else v:>{width}}" for v in values))
+    for label, result in results.items():
+        missed = [q["question"] for q in result["per_question"] if q["first_hit_rank"] is None]
+        if missed:
+            print(f"\n{label}: {len(missed)} questions without an expected URL in the top {max(KS)}")
+            for question in missed:
+                print(f"  - {question}")
+
+
+def run(args):
+    if args.index == "stub":
+        pages, labels = stub_pages_and_labels()
+    else:
+        labels = load_labels(args.labels)
+        if args.index == "local" and not os.path.exists(args.snapshot):
+            raise SystemExit(f"No snapshot at {args.snapshot}; create one with the snapshot command first")
+        pages = load_snapshot(args.snapshot) if args.index == "local" else []
+    if args.index == "stub" or args.embedder == "stub":
+        model, dim = STUB_MODEL, args.dim or STUB_DIMENSION
+    else:
+        model, dim = args.model, args.dim or crawler.EMBED_DIMENSION
+    backend = None
+    if not args.offline:
+        backend = stub_backend(dim) if model == STUB_MODEL else openai_backend(model, dim)
+
+    cache = EmbeddingCache(args.cache)
+    embedder = CachedEmbedder(model, dim, cache, backend)
+    try:
+        if args.index == "pinecone":
+            index = PineconeIndex(args.index_name)
+            results = {"live": {**index.size, **evaluate(index, embedder, labels)}}
+        else:
+            results = run_local(pages, labels, args.configs, embedder)
+    except CacheMiss as e:
+        raise SystemExit(f"{e}; run without --offline to embed them")
+    finally:
+        cache.close()
+
+    print(f"{args.index} index, {len(pages) or '-'} pages, {len(labels)} questions, {model} ({dim} dims), "
+          f"{embedder.misses} texts embedded ({embedder.tokens_spent} tokens), {embedder.hits} from cache\n")
+    print_table(results)
+    out = {
+        "run_at_utc": datetime.now(timezone.utc).isoformat(),
+        "index": args.index,
+        "embedding": {"model": model, "dimensions": dim},
+        "pages": len(pages),
+        "questions": len(labels),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    snap = sub.add_parser("snapshot", help="Fetch the labeled pages plus distractors once, for offline runs")
+    snap.add_argument("--labels", default=LABELS_PATH)
+    snap.add_argument("--out", default=SNAPSHOT_PATH)
+    snap.add_argument("--distractors", type=int, default=300, help="Other indexed pages to add from crawl state")
+    snap.add_argument("--state-db", default=crawler.DB_PATH)
+    snap.add_argument("--seed", type=int, default=0)
+    snap.add_argument("--workers", type=int, default=8)
+
+    ev = sub.add_parser("run", help="Evaluate retrieval for each chunking config")
+    ev.add_argument("--index", choices=["local", "stub", "pinecone"], default="local")
+    ev.add_argument("--configs", nargs="+", type=parse_config, default=[parse_config(c) for c in DEFAULT_CONFIGS],
+                    help="max_tokens:min_tokens")
+    ev.add_argument("--labels", default=LABELS_PATH)
+    ev.add_argument("--snapshot", default=SNAPSHOT_PATH)
+    ev.add_argument("--cache", default=CACHE_PATH)
+    ev.add_argument("--embedder", choices=["openai", "stub"], default="openai")
+    ev.add_argument("--model", default=crawler.EMBED_MODEL)
+    ev.add_argument("--dim", type=int, help=f"Embedding dimensions (default {crawler.EMBED_DIMENSION}, stub {STUB_DIMENSION})")
+    ev.add_argument("--offline", action="store_true", help="Use cached embeddings only")
+    ev.add_argument("--index-name", default=crawler.INDEX_NAME)
+    ev.add_argument("--out", default="logs/retrieval_eval.json")
+
+    args = parser.parse_args()
+    snapshot(args) if args.command == "snapshot" else run(args)
+
+
+if __name__ == "__main__":
+    main()
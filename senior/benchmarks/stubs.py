@@ -0,0 +1,231 @@
+"""Deterministic local stand-ins for the LLM, embedding, vector-store, search and HTTP services.
+
+Every stub sleeps for a configurable latency to stand in for the network round trip
+and counts its calls in CALLS, so bench_offline can report how many requests each
+code path would have made. Outputs depend only on the inputs, never on time or
+randomness, so two runs of the same benchmark do the same work.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.vectorstores import InMemoryVectorStore
+
+CALLS = Counter()
+_calls_lock = threading.Lock()
+
+STUB_SQL_REPLY = "SELECT COUNT(*) AS students FROM Student"
+TOPICS = [
+    "admission requirements", "tuition fees", "study plan", "graduation requirements", "course withdrawal",
+    "academic probation", "transfer credits", "summer semester", "internship program", "scholarships",
+    "attendance policy", "final exams", "GPA calculation", "double major", "registration deadlines",
+]
+PROGRAMS = ["computer science", "software engineering", "information systems", "law", "architecture",
+            "engineering management", "interior design", "business administration"]
+
+
+def count(name: str, n: int = 1):
+    with _calls_lock:
+        CALLS[name] += n
+
+
+def snapshot_calls() -> dict:
+    with _calls_lock:
+        return dict(CALLS)
+
+
+def _tokens(text: str) -> int:
+    # Rough tiktoken-free estimate, stable across runs
+    return max(1, len(text) // 4)
+
+
+def hashed_vector(text: str, dim: int) -> List[float]:
+    """Bag-of-words vector with hashed buckets: similar texts get similar vectors."""
+    vec = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that answers after `latency` seconds with a reply derived from the prompt.
+
+    Accepts ChatOpenAI's constructor arguments so it can be swapped in for it. Text-to-SQL
+    prompts get a fixed valid SELECT, follow-up rewrites return the message unchanged, and
+    everything else gets a short hashed answer.
+    """
+
+    model: str = "stub"
+    api_key: Optional[str] = None
+    temperature: float = 0.0
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        count("llm")
+        prompt = "\n".join(str(m.content) for m in messages)
+        first = messages[0] if messages else None
+        if isinstance(first, SystemMessage) and "SELECT statement" in str(first.content):
+            reply = STUB_SQL_REPLY
+        elif isinstance(first, SystemMessage) and "standalone question" in str(first.content):
+            reply = prompt.rsplit("Latest message:", 1)[-1].strip()
+        else:
+            digest = hashlib.sha1(prompt.encode()).hexdigest()[:12]
+            reply = f"Stub answer {digest}: see https://www.psu.edu.sa/en/advising for details."
+        usage = {"prompt_tokens": _tokens(prompt), "completion_tokens": _tokens(reply)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        count("llm_prompt_tokens", usage["prompt_tokens"])
+        count("llm_completion_tokens", usage["completion_tokens"])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))],
+                          llm_output={"token_usage": usage, "model_name": self.model})
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+class StubEmbeddings(Embeddings):
+    """Hashed bag-of-words embeddings; one simulated API call per embed_* invocation."""
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        count("embed_calls")
+        count("embed_texts", len(texts))
+        count("embed_tokens", sum(_tokens(t) for t in texts))
+        return [hashed_vector(t, self.dim) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class StubVectorStore(InMemoryVectorStore):
+    """In-memory vector store with a per-query latency, built with the usual from_documents()."""
+
+    query_latency = 0.0
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        time.sleep(self.query_latency)
+        count("vector_queries")
+        return super().similarity_search(query, k=k, **kwargs)
+
+
+def synthetic_corpus(n: int = 2000) -> List[Document]:
+    docs = []
+    for i in range(n):
+        topic, program = TOPICS[i % len(TOPICS)], PROGRAMS[(i // len(TOPICS)) % len(PROGRAMS)]
+        url = f"https://www.psu.edu.sa/en/{program.replace(' ', '-')}/{topic.replace(' ', '-')}-{i}"
+        text = (f"{topic.capitalize()} for the {program} program. Students in {program} should review the "
+                f"{topic} described in the PSU catalog, section {i % 37}. Contact the college advisor about {topic}.")
+        docs.append(Document(page_content=text, metadata={
+            "url": url, "page_title": f"{program.title()} | PSU", "section_heading": topic.title(), "chunk_index": i % 5,
+        }))
+    return docs
+
+
+def synthetic_questions(n: int) -> List[str]:
+    return [f"What are the {TOPICS[i % len(TOPICS)]} for {PROGRAMS[(i * 7) % len(PROGRAMS)]}?" for i in range(n)]
+
+
+def stub_tavily_search(query: str, latency: float = 0.0) -> str:
+    time.sleep(latency)
+    count("web_searches")
+    slug = re.sub(r"\W+", "-", query.lower()).strip("-")[:60]
+    return f"[{{'url': 'https://www.psu.edu.sa/en/search/{slug}', 'content': 'PSU page about {query}'}}]"
+
+
+# --- Crawler stand-ins -------------------------------------------------------
+
+class StubAsyncOpenAI:
+    """Just enough of AsyncOpenAI for psu_site_crawler.embed_texts."""
+
+    def __init__(self, latency: float = 0.0, dim: Optional[int] = None):
+        self.embeddings = SimpleNamespace(create=self._create)
+        self.latency = latency
+        self.dim = dim
+
+    async def _create(self, model: str, input: List[str], dimensions: int = 3072):
+        await asyncio.sleep(self.latency)
+        count("embed_calls")
+        count("embed_texts", len(input))
+        tokens = sum(_tokens(t) for t in input)
+        count("embed_tokens", tokens)
+        dim = self.dim or dimensions
+        return SimpleNamespace(data=[SimpleNamespace(embedding=hashed_vector(t, dim)) for t in input],
+                               usage=SimpleNamespace(total_tokens=tokens))
+
+
+class StubPineconeIndex:
+    """Blocking upsert/update/fetch/delete like pinecone.Index, storing vectors in a dict."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.vectors = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        time.sleep(self.latency)
+        count("pinecone_upserts")
+        count("vectors_upserted", len(vectors))
+        with self._lock:
+            for v in vectors:
+                self.vectors[v["id"]] = v
+
+    def update(self, id, set_metadata=None):
+        time.sleep(self.latency)
+        count("pinecone_updates")
+        with self._lock:
+            if id in self.vectors and set_metadata:
+                self.vectors[id]["metadata"].update(set_metadata)
+
+    def delete(self, ids):
+        time.sleep(self.latency)
+        count("pinecone_deletes")
+        with self._lock:
+            for i in ids:
+                self.vectors.pop(i, None)
+
+    def fetch(self, ids):
+        time.sleep(self.latency)
+        count("pinecone_fetches")
+        with self._lock:
+            found = {i: SimpleNamespace(values=self.vectors[i]["values"], metadata=self.vectors[i]["metadata"])
+                     for i in ids if i in self.vectors}
+        return SimpleNamespace(vectors=found)
+
+
+def make_stub_fetch_page(pages: dict, latency: float = 0.0):
+    """fetch_page replacement serving pages[url] with a 200 (404 for unknown URLs)."""
+
+    def fetch_page(url, state):
+        time.sleep(latency)
+        count("http_fetches")
+        html = pages.get(url)
+        if html is None:
+            return None, {"status": 404, "final_url": url}
+        etag = hashlib.md5(html.encode()).hexdigest()
+        if state and state.get("etag") == etag:
+            return None, {"status": 304, "final_url": url, "etag": etag}
+        return html, {"status": 200, "final_url": url, "etag": etag, "last_modified": None,
+                      "content_type": "text/html", "retry_after": None, "size_bytes": len(html.encode())}
+
+    return fetch_page
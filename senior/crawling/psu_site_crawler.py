@@ -1,24 +1,33 @@
 import os
 import re
 import json
+import sys
 import asyncio
+import argparse
+import subprocess
 import hashlib
+import heapq
+import random
 import sqlite3
+import threading
 import traceback
 import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import urlparse, urldefrag, urljoin
-from xml.etree import ElementTree
 
 import requests
 import certifi
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from lxml import etree
+from lxml import html as lxml_html
 import urllib3
 
+import openai
 from openai import AsyncOpenAI
 from pinecone import Pinecone, ServerlessSpec
 
@@ -38,6 +47,8 @@ logger = logging.getLogger(__name__)
 SITEMAP_URL = "https://psu.edu.sa/sitemap.xml"
 # If you keep hitting SSL issues, try:
 # SITEMAP_URL = "https://www.psu.edu.sa/sitemap.xml"
+# Every site to crawl into the index; override per run with --sitemap
+SITEMAP_URLS = [SITEMAP_URL]
 
 INDEX_NAME = "psu-web-auto"
 
@@ -50,17 +61,36 @@ USER_AGENT = "PSU-KB-Crawler/2.0"
 # Store database in same directory as crawler script
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(SCRIPT_DIR, "crawl_state.db")
+REPORT_PATH = os.path.join(SCRIPT_DIR, "crawl_report.json")
+# Downloaded documents are streamed here while they are processed, then deleted
+DOWNLOAD_DIR = os.path.join(SCRIPT_DIR, "downloads")
 
 # Concurrency / batching
+# These are ceilings: each dependency gets an AdaptiveLimiter that backs off on overload
 MAX_CONCURRENT_FETCH = 20
 MAX_CONCURRENT_EMBED = 5
+MAX_CONCURRENT_UPSERT = 4
 UPSERT_BATCH_SIZE = 100
 EMBED_BATCH_SIZE = 64
 
+# Retries
+MAX_ATTEMPTS = 4            # per operation, including the first try
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+RETRY_BUDGET_RATIO = 0.2    # retries allowed per request made to a dependency...
+RETRY_BUDGET_MIN = 20       # ...on top of this many free retries per run
+RETRY_STATUSES = {0, 408, 425, 429, 500, 502, 503, 504}
+
 # Chunking
-CHUNK_MAX_CHARS = 3500
-CHUNK_OVERLAP_CHARS = 200
-MIN_CHUNK_CHARS = 250
+CHUNK_MAX_TOKENS = 400    # hard budget per chunk (cl100k tokens)
+CHUNK_MIN_TOKENS = 120    # smaller chunks keep absorbing following blocks/sections
+CHUNK_DROP_TOKENS = 15    # leftovers smaller than this are not indexed
+CHUNK_CUT_EVERY = 4       # on average, 1 in this many blocks is a content-defined cut point
+
+# Documents (PDF/DOCX linked from pages)
+DOCUMENT_EXTENSIONS = (".pdf", ".docx")
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024
+MAX_SOURCE_PAGES_METADATA = 20
 
 # URL filtering
 BLOCKED_SUBSTRINGS = [
@@ -83,11 +113,20 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 
-if not OPENAI_API_KEY or not PINECONE_API_KEY:
-    raise ValueError("Missing OPENAI_API_KEY and/or PINECONE_API_KEY in environment variables.")
-
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# Clients are created by init_clients() at the start of run() so that the module
+# can be imported (benchmarks, tooling) without credentials or network access
+openai_client: Optional[AsyncOpenAI] = None
+pc: Optional[Pinecone] = None
+index = None
+
+def init_clients():
+    global openai_client, pc, index
+    if not OPENAI_API_KEY or not PINECONE_API_KEY:
+        raise ValueError("Missing OPENAI_API_KEY and/or PINECONE_API_KEY in environment variables.")
+    # Retries are handled by the embed limiter, not inside the client
+    openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    index = init_pinecone_index()
 
 # =========================
 # Pinecone vector database initialization
@@ -122,19 +161,29 @@ def init_pinecone_index():
 
     return pc.Index(INDEX_NAME)
 
-index = init_pinecone_index()
-
 # =========================
 # SQLite crawl state tracking
 # =========================
 # Database tracks previously crawled URLs and their metadata to enable incremental updates
 # Stores ETag, Last-Modified headers, and content hash to detect changes
-def init_db():
-    """Initialize SQLite database. Creates it if it doesn't exist, overwrites table if needed."""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("""
+#
+# All rows are preloaded into memory when the store is opened, so lookups from the
+# event loop never touch SQLite. Writes update the in-memory copy immediately and are
+# buffered; flush() writes them in a single transaction over one persistent WAL-mode
+# connection and is meant to be run off the loop (asyncio.to_thread). The buffer and the
+# connection have separate locks, so buffering a write never waits on SQLite.
+PAGE_COLUMNS = ("sitemap_lastmod", "etag", "last_modified", "content_hash", "last_crawled_at")
+STATE_FLUSH_INTERVAL = 2.0   # seconds between background flushes
+STATE_FLUSH_MAX_PENDING = 500  # flush early once this many writes are buffered
+
+class CrawlStateStore:
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        # Sharded runs share the database between processes: wait on locks, don't fail
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
         CREATE TABLE IF NOT EXISTS pages (
             url TEXT PRIMARY KEY,
             sitemap_lastmod TEXT,
@@ -144,28 +193,402 @@ def init_db():
             last_crawled_at TEXT
         )
         """)
-        conn.commit()
-        conn.close()
-        logger.info(f"Database ready at {DB_PATH}")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS sitemaps (
+            url TEXT PRIMARY KEY,
+            kind TEXT,
+            lastmod TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at TEXT
+        )
+        """)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS sitemap_entries (
+            sitemap_url TEXT,
+            position INTEGER,
+            loc TEXT,
+            lastmod TEXT,
+            PRIMARY KEY (sitemap_url, position)
+        )
+        """)
+        # Crawl-run journal: the work queue of each run and the status of every URL in it
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mode TEXT,
+            shard TEXT,
+            status TEXT,
+            started_at TEXT,
+            finished_at TEXT
+        )
+        """)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_run_items (
+            run_id INTEGER,
+            position INTEGER,
+            url TEXT,
+            sitemap_lastmod TEXT,
+            status TEXT,
+            reason TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (run_id, url)
+        )
+        """)
+        # Downloadable documents linked from pages, and their own fetch state
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS page_documents (
+            page_url TEXT,
+            doc_url TEXT,
+            PRIMARY KEY (page_url, doc_url)
+        )
+        """)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            size_bytes INTEGER,
+            last_crawled_at TEXT
+        )
+        """)
+        # SimHash and home URL of every stored chunk vector, and every URL whose current
+        # version uses it (the vector's reference count, and each page's emitted ids)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunk_fingerprints (
+            vector_id TEXT PRIMARY KEY,
+            url TEXT,
+            simhash INTEGER
+        )
+        """)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunk_refs (
+            vector_id TEXT,
+            url TEXT,
+            PRIMARY KEY (vector_id, url)
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_refs_url ON chunk_refs(url)")
+        # chunk_sources only listed the URLs other than the owner; chunk_refs lists all of them
+        if self._conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='chunk_sources'").fetchone():
+            self._conn.execute("INSERT OR IGNORE INTO chunk_refs(vector_id, url) SELECT vector_id, url FROM chunk_fingerprints")
+            self._conn.execute("INSERT OR IGNORE INTO chunk_refs(vector_id, url) SELECT vector_id, url FROM chunk_sources")
+            self._conn.execute("DROP TABLE chunk_sources")
+        self._conn.commit()
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_items: Dict[Tuple[int, str], Tuple[str, Optional[str], str]] = {}
+        self._pending_links: Dict[str, List[str]] = {}
+        self._pending_fingerprints: Dict[str, Optional[Tuple[str, int]]] = {}  # None deletes
+        self._pending_refs: Dict[Tuple[str, str], bool] = {}                  # False deletes
+        # _lock guards the pending buffers and is only held for dict updates and swaps;
+        # _db_lock serializes use of the connection (flushes run in worker threads)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        cur = self._conn.execute(f"SELECT url, {', '.join(PAGE_COLUMNS)} FROM pages")
+        for row in cur:
+            self._rows[row[0]] = dict(zip(PAGE_COLUMNS, row[1:]))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def pending_count(self) -> int:
+        return (len(self._pending) + len(self._pending_items) + len(self._pending_links)
+                + len(self._pending_fingerprints) + len(self._pending_refs))
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        row = self._rows.get(url)
+        return dict(row) if row else None
+
+    def upsert(self, url: str,
+               sitemap_lastmod: Optional[str],
+               etag: Optional[str],
+               last_modified: Optional[str],
+               content_hash: Optional[str]):
+        row = {
+            "sitemap_lastmod": sitemap_lastmod,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": content_hash,
+            "last_crawled_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._rows[url] = row
+        with self._lock:
+            self._pending[url] = row
+
+    def flush(self) -> int:
+        """Write all buffered page rows and journal updates in one transaction.
+        Returns the number of rows written."""
+        # Holding _db_lock across the swap keeps concurrent flushes in buffer order
+        with self._db_lock:
+            with self._lock:
+                if not self.pending_count:
+                    return 0
+                batch, self._pending = self._pending, {}
+                items, self._pending_items = self._pending_items, {}
+                links, self._pending_links = self._pending_links, {}
+                fingerprints, self._pending_fingerprints = self._pending_fingerprints, {}
+                refs, self._pending_refs = self._pending_refs, {}
+            try:
+                with self._conn:
+                    self._conn.executemany("""
+                    INSERT INTO pages(url, sitemap_lastmod, etag, last_modified, content_hash, last_crawled_at)
+                    VALUES(?,?,?,?,?,?)
+                    ON CONFLICT(url) DO UPDATE SET
+                        sitemap_lastmod=excluded.sitemap_lastmod,
+                        etag=excluded.etag,
+                        last_modified=excluded.last_modified,
+                        content_hash=excluded.content_hash,
+                        last_crawled_at=excluded.last_crawled_at
+                    """, [(url, *(r[c] for c in PAGE_COLUMNS)) for url, r in batch.items()])
+                    self._conn.executemany(
+                        "UPDATE crawl_run_items SET status=?, reason=?, updated_at=? WHERE run_id=? AND url=?",
+                        [(status, reason, at, run_id, url) for (run_id, url), (status, reason, at) in items.items()],
+                    )
+                    self._conn.executemany("DELETE FROM page_documents WHERE page_url=?", [(u,) for u in links])
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO page_documents(page_url, doc_url) VALUES(?,?)",
+                        [(page_url, doc_url) for page_url, docs in links.items() for doc_url in docs],
+                    )
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO chunk_fingerprints(vector_id, url, simhash) VALUES(?,?,?)",
+                        [(vid, fp[0], to_signed64(fp[1])) for vid, fp in fingerprints.items() if fp is not None],
+                    )
+                    self._conn.executemany("DELETE FROM chunk_fingerprints WHERE vector_id=?",
+                                           [(vid,) for vid, fp in fingerprints.items() if fp is None])
+                    self._conn.executemany("INSERT OR IGNORE INTO chunk_refs(vector_id, url) VALUES(?,?)",
+                                           [key for key, present in refs.items() if present])
+                    self._conn.executemany("DELETE FROM chunk_refs WHERE vector_id=? AND url=?",
+                                           [key for key, present in refs.items() if not present])
+            except Exception:
+                # Put the batch back (without clobbering newer writes) so the next flush retries it
+                with self._lock:
+                    for url, r in batch.items():
+                        self._pending.setdefault(url, r)
+                    for key, item in items.items():
+                        self._pending_items.setdefault(key, item)
+                    for key, docs in links.items():
+                        self._pending_links.setdefault(key, docs)
+                    for key, fp in fingerprints.items():
+                        self._pending_fingerprints.setdefault(key, fp)
+                    for key, present in refs.items():
+                        self._pending_refs.setdefault(key, present)
+                raise
+            return len(batch) + len(items) + len(links) + len(fingerprints) + len(refs)
+
+    # The journal's work queue is written once, directly, when a run starts. Per-URL
+    # status changes go through the write buffer so that a page's state and its
+    # journal entry are committed in the same transaction.
+    def start_run(self, mode: str, entries: List[Tuple[str, Optional[str]]], shard: Optional[str] = None) -> int:
+        now = datetime.now(timezone.utc).isoformat()
+        with self._db_lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO crawl_runs(mode, shard, status, started_at) VALUES(?, ?, 'running', ?)", (mode, shard, now)
+            )
+            run_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO crawl_run_items(run_id, position, url, sitemap_lastmod, status, updated_at) "
+                "VALUES(?,?,?,?, 'pending', ?)",
+                [(run_id, i, url, lastmod, now) for i, (url, lastmod) in enumerate(entries)],
+            )
+        return run_id
+
+    def mark_item(self, run_id: int, url: str, status: str, reason: Optional[str] = None):
+        with self._lock:
+            self._pending_items[(run_id, url)] = (status, reason, datetime.now(timezone.utc).isoformat())
+
+    def mark_item_now(self, run_id: int, url: str, status: str, reason: Optional[str] = None):
+        """Write a journal status straight to disk, for marks that must survive a crash."""
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "UPDATE crawl_run_items SET status=?, reason=?, updated_at=? WHERE run_id=? AND url=?",
+                (status, reason, datetime.now(timezone.utc).isoformat(), run_id, url),
+            )
+
+    def finish_run(self, run_id: int, status: str = "completed"):
+        self.flush()
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "UPDATE crawl_runs SET status=?, finished_at=? WHERE run_id=?",
+                (status, datetime.now(timezone.utc).isoformat(), run_id),
+            )
+
+    def latest_run(self, shard: Optional[str] = None) -> Optional[int]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM crawl_runs WHERE shard IS ? ORDER BY run_id DESC LIMIT 1", (shard,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def latest_unfinished_run(self, shard: Optional[str] = None) -> Optional[int]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM crawl_runs WHERE status='running' AND shard IS ? ORDER BY run_id DESC LIMIT 1",
+                (shard,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def run_items(self, run_id: int, statuses: Tuple[str, ...]) -> List[Tuple[str, Optional[str], str]]:
+        """Return (url, sitemap_lastmod, status) for a run's items in queue order."""
+        with self._db_lock:
+            return self._conn.execute(
+                f"SELECT url, sitemap_lastmod, status FROM crawl_run_items "
+                f"WHERE run_id=? AND status IN ({','.join('?' * len(statuses))}) ORDER BY position",
+                (run_id, *statuses),
+            ).fetchall()
+
+    def set_page_documents(self, page_url: str, doc_urls: List[str]):
+        """Replace the set of downloadable documents linked from a page (buffered)."""
+        with self._lock:
+            self._pending_links[page_url] = list(doc_urls)
+
+    def document_links(self) -> Dict[str, List[str]]:
+        """Map of every known document URL to the pages that link to it."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT doc_url, page_url FROM page_documents ORDER BY doc_url, page_url"
+            ).fetchall()
+        out: Dict[str, List[str]] = {}
+        for doc_url, page_url in rows:
+            out.setdefault(doc_url, []).append(page_url)
+        return out
+
+    def get_document(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, size_bytes FROM documents WHERE url=?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2], "size_bytes": row[3]}
+
+    def upsert_document(self, url: str, etag: Optional[str], last_modified: Optional[str],
+                        content_hash: Optional[str], size_bytes: Optional[int]):
+        with self._db_lock, self._conn:
+            self._conn.execute("""
+            INSERT INTO documents(url, etag, last_modified, content_hash, size_bytes, last_crawled_at)
+            VALUES(?,?,?,?,?,?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag=excluded.etag,
+                last_modified=excluded.last_modified,
+                content_hash=excluded.content_hash,
+                size_bytes=excluded.size_bytes,
+                last_crawled_at=excluded.last_crawled_at
+            """, (url, etag, last_modified, content_hash, size_bytes, datetime.now(timezone.utc).isoformat()))
+
+    def set_fingerprint(self, vector_id: str, url: str, simhash: int):
+        """Record (or re-home) a stored vector's fingerprint; url is its home page (buffered)."""
+        with self._lock:
+            self._pending_fingerprints[vector_id] = (url, simhash)
+
+    def remove_fingerprint(self, vector_id: str):
+        with self._lock:
+            self._pending_fingerprints[vector_id] = None
+
+    def set_chunk_ref(self, vector_id: str, url: str, present: bool = True):
+        """Add (or with present=False, drop) url's reference to a stored vector (buffered)."""
+        with self._lock:
+            self._pending_refs[(vector_id, url)] = present
+
+    def load_fingerprints(self) -> Tuple[List[Tuple[str, str, int]], List[Tuple[str, str]]]:
+        """All (vector_id, home url, simhash) fingerprints and (vector_id, url) references."""
+        with self._db_lock:
+            fps = self._conn.execute("SELECT vector_id, url, simhash FROM chunk_fingerprints").fetchall()
+            refs = self._conn.execute("SELECT vector_id, url FROM chunk_refs").fetchall()
+        return [(vid, url, to_unsigned64(fp)) for vid, url, fp in fps], refs
+
+    def sitemap_lastmods(self) -> Dict[str, Optional[str]]:
+        """Map of every page URL in the cached sitemaps to its <lastmod>."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT e.loc, e.lastmod FROM sitemap_entries e JOIN sitemaps s ON s.url = e.sitemap_url "
+                "WHERE s.kind = 'urlset'"
+            ).fetchall()
+        out: Dict[str, Optional[str]] = {}
+        for loc, lastmod in rows:
+            loc = normalize_url(loc)
+            if loc:
+                out.setdefault(loc, lastmod)
+        return out
+
+    # Sitemap state is small and only touched while expanding the sitemap, so it is
+    # read and written directly rather than through the page buffer.
+    def get_sitemap(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return cached headers and entries for a sitemap, or None if never fetched."""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT kind, lastmod, etag, last_modified FROM sitemaps WHERE url=?", (url,)
+            ).fetchone()
+            if not row:
+                return None
+            entries = self._conn.execute(
+                "SELECT loc, lastmod FROM sitemap_entries WHERE sitemap_url=? ORDER BY position", (url,)
+            ).fetchall()
+        return {"kind": row[0], "lastmod": row[1], "etag": row[2], "last_modified": row[3],
+                "entries": [(loc, lastmod) for loc, lastmod in entries]}
+
+    def upsert_sitemap(self, url: str, kind: str, lastmod: Optional[str], etag: Optional[str],
+                       last_modified: Optional[str], entries: List[Tuple[str, Optional[str]]]):
+        with self._db_lock, self._conn:
+            self._conn.execute("""
+            INSERT INTO sitemaps(url, kind, lastmod, etag, last_modified, fetched_at)
+            VALUES(?,?,?,?,?,?)
+            ON CONFLICT(url) DO UPDATE SET
+                kind=excluded.kind,
+                lastmod=excluded.lastmod,
+                etag=excluded.etag,
+                last_modified=excluded.last_modified,
+                fetched_at=excluded.fetched_at
+            """, (url, kind, lastmod, etag, last_modified, datetime.now(timezone.utc).isoformat()))
+            self._conn.execute("DELETE FROM sitemap_entries WHERE sitemap_url=?", (url,))
+            self._conn.executemany(
+                "INSERT INTO sitemap_entries(sitemap_url, position, loc, lastmod) VALUES(?,?,?,?)",
+                [(url, i, loc, lm) for i, (loc, lm) in enumerate(entries)],
+            )
+
+    async def flush_async(self) -> int:
+        with metrics.stage("state_flush"):
+            return await asyncio.to_thread(self.flush)
+
+    async def flush_periodically(self, interval: float = STATE_FLUSH_INTERVAL):
+        """Background task: flush on a timer, or sooner when the buffer grows large."""
+        elapsed = 0.0
+        tick = min(0.25, interval)
+        while True:
+            await asyncio.sleep(tick)
+            elapsed += tick
+            if elapsed >= interval or self.pending_count >= STATE_FLUSH_MAX_PENDING:
+                elapsed = 0.0
+                try:
+                    await self.flush_async()
+                except Exception as e:
+                    logger.error(f"Failed to flush crawl state: {e}")
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+state_store: Optional[CrawlStateStore] = None
+
+def init_db(db_path: str = DB_PATH):
+    """Open the crawl state store. Creates the database if it doesn't exist."""
+    global state_store
+    try:
+        state_store = CrawlStateStore(db_path)
+        logger.info(f"Database ready at {db_path} ({len(state_store)} known URLs)")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
 
 def get_state(url: str) -> Optional[Dict[str, Any]]:
     """Retrieve cached metadata for a URL (etag, last_modified, content_hash, etc.)"""
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT sitemap_lastmod, etag, last_modified, content_hash FROM pages WHERE url=?", (url,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return None
-    return {
-        "sitemap_lastmod": row[0],
-        "etag": row[1],
-        "last_modified": row[2],
-        "content_hash": row[3],
-    }
+    return state_store.get(url)
 
 def upsert_state(url: str,
                  sitemap_lastmod: Optional[str],
@@ -173,23 +596,7 @@ def upsert_state(url: str,
                  last_modified: Optional[str],
                  content_hash: Optional[str]):
     """Update crawl state for a URL with HTTP headers and content metadata"""
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-    INSERT INTO pages(url, sitemap_lastmod, etag, last_modified, content_hash, last_crawled_at)
-    VALUES(?,?,?,?,?,?)
-    ON CONFLICT(url) DO UPDATE SET
-        sitemap_lastmod=excluded.sitemap_lastmod,
-        etag=excluded.etag,
-        last_modified=excluded.last_modified,
-        content_hash=excluded.content_hash,
-        last_crawled_at=excluded.last_crawled_at
-    """, (
-        url, sitemap_lastmod, etag, last_modified, content_hash,
-        datetime.now(timezone.utc).isoformat()
-    ))
-    conn.commit()
-    conn.close()
+    state_store.upsert(url, sitemap_lastmod, etag, last_modified, content_hash)
 
 # =========================
 # Helper functions
@@ -230,57 +637,400 @@ def clean_whitespace(s: str) -> str:
     s = re.sub(r"[ \t]{2,}", " ", s)
     return s.strip()
 
+# =========================
+# Instrumentation
+# =========================
+# Per-stage latency (p50/p95/max), byte/token/vector counters and the slowest URLs,
+# written into crawl_report.json and optionally as Prometheus text format.
+# Recording is an append plus a few additions, cheap enough to leave on; each stage
+# keeps at most METRICS_MAX_SAMPLES latencies (reservoir sampled), with exact
+# count/sum/max.
+METRICS_MAX_SAMPLES = 10_000
+SLOWEST_URLS_N = 10
+
+class StageTimer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics: "CrawlMetrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+class CrawlMetrics:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.totals: Dict[str, List[float]] = {}  # stage -> [count, sum, max]
+        self.counters: Dict[str, float] = {}
+        self._slowest: List[Tuple[float, str]] = []  # min-heap of (seconds, url)
+
+    def stage(self, name: str) -> StageTimer:
+        """Time a block: `with metrics.stage("fetch"): ...` (works around awaits too)."""
+        return StageTimer(self, name)
+
+    def observe(self, stage: str, seconds: float):
+        t = self.totals.setdefault(stage, [0, 0.0, 0.0])
+        t[0] += 1
+        t[1] += seconds
+        if seconds > t[2]:
+            t[2] = seconds
+        samples = self.samples.setdefault(stage, [])
+        if len(samples) < METRICS_MAX_SAMPLES:
+            samples.append(seconds)
+        else:
+            j = random.randrange(t[0])
+            if j < METRICS_MAX_SAMPLES:
+                samples[j] = seconds
+
+    def count(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_url(self, url: str, seconds: float):
+        self.observe("url_total", seconds)
+        if len(self._slowest) < SLOWEST_URLS_N:
+            heapq.heappush(self._slowest, (seconds, url))
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (seconds, url))
+
+    @staticmethod
+    def _quantile(sorted_samples: List[float], q: float) -> float:
+        if not sorted_samples:
+            return 0.0
+        return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+    def summary(self) -> Dict[str, Any]:
+        stages = {}
+        for name, (n, total, mx) in self.totals.items():
+            ordered = sorted(self.samples[name])
+            stages[name] = {
+                "count": n,
+                "total_s": round(total, 3),
+                "p50_s": round(self._quantile(ordered, 0.50), 4),
+                "p95_s": round(self._quantile(ordered, 0.95), 4),
+                "max_s": round(mx, 4),
+            }
+        return {
+            "stages": stages,
+            "counters": dict(self.counters),
+            "slowest_urls": [{"url": u, "seconds": round(t, 3)} for t, u in sorted(self._slowest, reverse=True)],
+        }
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP psu_crawler_stage_seconds Crawler stage latency.",
+            "# TYPE psu_crawler_stage_seconds summary",
+        ]
+        for name, st in self.summary()["stages"].items():
+            lines.append(f'psu_crawler_stage_seconds{{stage="{name}",quantile="0.5"}} {st["p50_s"]}')
+            lines.append(f'psu_crawler_stage_seconds{{stage="{name}",quantile="0.95"}} {st["p95_s"]}')
+            lines.append(f'psu_crawler_stage_seconds_sum{{stage="{name}"}} {st["total_s"]}')
+            lines.append(f'psu_crawler_stage_seconds_count{{stage="{name}"}} {st["count"]}')
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE psu_crawler_{name}_total counter")
+            lines.append(f"psu_crawler_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = CrawlMetrics()
+
+# =========================
+# Adaptive concurrency and retries
+# =========================
+# Each external dependency (page fetches, embeddings, Pinecone upserts) gets an
+# AIMD limiter: the concurrency limit grows by ~1 per window of successes and is
+# halved on overload (429/503/timeouts). Retry-After pauses new requests to that
+# dependency. Retries use jittered exponential backoff and are capped by a per-
+# dependency retry budget so an outage cannot turn into a retry storm.
+class RetryableError(Exception):
+    """A failure worth retrying. `result` carries the last result for callers that
+    want to fall back to it once retries are exhausted."""
+    def __init__(self, reason: str, retry_after: Optional[float] = None,
+                 overload: bool = False, result: Any = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.overload = overload
+        self.result = result
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
+
+class RetryBudget:
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, minimum: int = RETRY_BUDGET_MIN):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.requests = 0
+        self.retries = 0
+
+    def record_request(self):
+        self.requests += 1
+
+    def try_spend(self) -> bool:
+        if self.retries < self.minimum + self.ratio * self.requests:
+            self.retries += 1
+            return True
+        return False
+
+class AdaptiveLimiter:
+    DECREASE_FACTOR = 0.5
+    DECREASE_COOLDOWN = 1.0  # seconds; a burst of 429s only halves the limit once
+
+    def __init__(self, name: str, max_limit: int, min_limit: int = 1):
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.budget = RetryBudget()
+        self.stats = {"requests": 0, "successes": 0, "overloads": 0, "errors": 0,
+                      "retries": 0, "budget_exhausted": 0, "min_limit_seen": max_limit}
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    async def __aenter__(self):
+        async with self._cond:
+            while self._in_flight >= int(self.limit):
+                await self._cond.wait()
+            self._in_flight += 1
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        self.stats["requests"] += 1
+        self.budget.record_request()
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        self.stats["successes"] += 1
+        self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def on_failure(self, err: RetryableError):
+        now = time.monotonic()
+        if err.retry_after:
+            self._paused_until = max(self._paused_until, now + err.retry_after)
+        if not err.overload:
+            self.stats["errors"] += 1
+            return
+        self.stats["overloads"] += 1
+        if now - self._last_decrease >= self.DECREASE_COOLDOWN:
+            self._last_decrease = now
+            self.limit = max(float(self.min_limit), self.limit * self.DECREASE_FACTOR)
+            self.stats["min_limit_seen"] = min(self.stats["min_limit_seen"], int(self.limit))
+            logger.warning(f"{self.name}: overloaded ({err.reason}), concurrency limit -> {int(self.limit)}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "limit": int(self.limit), "max_limit": self.max_limit,
+                "retry_budget_used": self.budget.retries}
+
+async def call_with_retries(limiter: AdaptiveLimiter, op):
+    """Run `await op()` under `limiter`, retrying RetryableError with backoff.
+
+    Re-raises the last RetryableError once MAX_ATTEMPTS or the retry budget is used up.
+    """
+    attempt = 0
+    while True:
+        async with limiter:
+            try:
+                result = await op()
+            except RetryableError as e:
+                limiter.on_failure(e)
+                err = e
+            else:
+                limiter.on_success()
+                return result
+        attempt += 1
+        if attempt >= MAX_ATTEMPTS:
+            raise err
+        if not limiter.budget.try_spend():
+            limiter.stats["budget_exhausted"] += 1
+            raise err
+        limiter.stats["retries"] += 1
+        await asyncio.sleep(backoff_delay(attempt, err.retry_after))
+
+@dataclass
+class Limiters:
+    fetch: AdaptiveLimiter
+    embed: AdaptiveLimiter
+    upsert: AdaptiveLimiter
+
+    @classmethod
+    def default(cls) -> "Limiters":
+        return cls(
+            fetch=AdaptiveLimiter("fetch", MAX_CONCURRENT_FETCH),
+            embed=AdaptiveLimiter("embed", MAX_CONCURRENT_EMBED),
+            upsert=AdaptiveLimiter("upsert", MAX_CONCURRENT_UPSERT),
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: getattr(self, name).snapshot() for name in ("fetch", "embed", "upsert")}
+
 # =========================
 # Sitemap parsing
 # =========================
-NS = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+# Child sitemaps of a sitemap index are fetched concurrently. Each sitemap's ETag,
+# Last-Modified and parsed entries are kept in crawl state: a child whose <lastmod>
+# in the index is unchanged is not requested at all, and everything else is fetched
+# conditionally, reusing the cached entries on 304. Responses are parsed with
+# iterparse straight off the socket so large sitemaps never sit in memory whole.
+MAX_CONCURRENT_SITEMAP = 8
+SITEMAP_TIMEOUT = (15, 120)  # (connect, read) seconds
+
+def _local_name(tag) -> str:
+    return tag.rsplit("}", 1)[-1].lower() if isinstance(tag, str) else ""
+
+def iterparse_sitemap(stream) -> Tuple[str, List[Tuple[str, Optional[str]]]]:
+    """Stream-parse a sitemap or sitemap index.
+
+    Returns (kind, entries) where kind is "index" or "urlset" and entries are
+    (loc, lastmod) pairs. Elements are cleared as soon as they are consumed.
+    """
+    kind = "urlset"
+    entries: List[Tuple[str, Optional[str]]] = []
+    loc: Optional[str] = None
+    lastmod: Optional[str] = None
+    for event, el in etree.iterparse(stream, events=("start", "end"), recover=True, huge_tree=True):
+        name = _local_name(el.tag)
+        if event == "start":
+            if name == "sitemapindex":
+                kind = "index"
+            continue
+        if name == "loc":
+            loc = (el.text or "").strip() or None
+        elif name == "lastmod":
+            lastmod = (el.text or "").strip() or None
+        elif name in ("url", "sitemap"):
+            if loc:
+                entries.append((loc, lastmod))
+            loc, lastmod = None, None
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+    return kind, entries
+
+def fetch_sitemap(url: str, cached: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Conditionally fetch and stream-parse one sitemap.
+
+    Returns {"status", "kind", "entries", "etag", "last_modified"}; status is 304 when
+    the cached copy is still valid and 0 on network/parse failure.
+    """
+    headers = {"User-Agent": USER_AGENT}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
 
-def fetch_xml(url: str):
     try:
-        ca_bundle = certifi.where()
-        r = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=120, verify=ca_bundle)
-        r.raise_for_status()
-    except requests.exceptions.SSLError:
-        logger.warning(f"SSL verification failed for {url}, retrying without verification")
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        r = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=120, verify=False)
-        r.raise_for_status()
+        try:
+            r = requests.get(url, headers=headers, timeout=SITEMAP_TIMEOUT, stream=True, verify=certifi.where())
+        except requests.exceptions.SSLError:
+            logger.warning(f"SSL verification failed for {url}, retrying without verification")
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            r = requests.get(url, headers=headers, timeout=SITEMAP_TIMEOUT, stream=True, verify=False)
     except requests.exceptions.RequestException as e:
         logger.error(f"Request failed for {url}: {e}")
-        return etree.Element("urlset")
+        return {"status": 0}
+
+    with r:
+        if r.status_code == 304:
+            return {"status": 304}
+        if r.status_code != 200:
+            logger.error(f"Request failed for {url}: HTTP {r.status_code}")
+            return {"status": r.status_code}
+        try:
+            r.raw.decode_content = True
+            kind, entries = iterparse_sitemap(r.raw)
+        except Exception as e:
+            logger.error(f"XML parsing error at {url}: {e}")
+            return {"status": 0}
 
-    try:
-        parser = etree.XMLParser(recover=True)
-        return etree.fromstring(r.content, parser=parser)
-    except Exception as e:
-        logger.error(f"XML parsing error at {url}: {e}")
-        return etree.Element("urlset")
-
-def parse_sitemap(url: str) -> List[Tuple[str, Optional[str]]]:
-    root = fetch_xml(url)
-    tag = root.tag.lower()
-
-    if tag.endswith("sitemapindex"):
-        all_entries: List[Tuple[str, Optional[str]]] = []
-        for sm in root.findall("sm:sitemap", NS):
-            loc_el = sm.find("sm:loc", NS)
-            if loc_el is None or not loc_el.text:
-                continue
-            all_entries.extend(parse_sitemap(loc_el.text.strip()))
-        return all_entries
+    return {
+        "status": 200,
+        "kind": kind,
+        "entries": entries,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    }
 
-    entries: List[Tuple[str, Optional[str]]] = []
-    for u in root.findall("sm:url", NS):
-        loc_el = u.find("sm:loc", NS)
-        if loc_el is None or not loc_el.text:
-            continue
-        loc = normalize_url(loc_el.text)
-        if not loc:
-            continue
-        lastmod_el = u.find("sm:lastmod", NS)
-        lastmod = lastmod_el.text.strip() if (lastmod_el is not None and lastmod_el.text) else None
-        entries.append((loc, lastmod))
-    return entries
+async def expand_sitemap(url: str, lastmod: Optional[str], sem: asyncio.Semaphore,
+                         seen: set, counters: Dict[str, int]) -> List[Tuple[str, Optional[str]]]:
+    """Resolve a sitemap (recursively for indexes) to its page entries."""
+    if url in seen:
+        return []
+    seen.add(url)
+
+    cached = await asyncio.to_thread(state_store.get_sitemap, url)
+    if cached and lastmod and cached.get("lastmod") == lastmod:
+        counters["unchanged"] += 1
+        kind, entries = cached["kind"], cached["entries"]
+    else:
+        async with sem:
+            res = await asyncio.to_thread(fetch_sitemap, url, cached)
+        if res["status"] == 200:
+            counters["fetched"] += 1
+            kind, entries = res["kind"], res["entries"]
+            await asyncio.to_thread(state_store.upsert_sitemap, url, kind, lastmod,
+                                    res.get("etag"), res.get("last_modified"), entries)
+        elif cached:
+            # 304, or a failed fetch we can cover with the last good copy
+            counters["not_modified" if res["status"] == 304 else "stale"] += 1
+            kind, entries = cached["kind"], cached["entries"]
+            if res["status"] == 304 and lastmod != cached.get("lastmod"):
+                await asyncio.to_thread(state_store.upsert_sitemap, url, kind, lastmod,
+                                        cached.get("etag"), cached.get("last_modified"), entries)
+        else:
+            counters["failed"] += 1
+            return []
+
+    if kind == "index":
+        children = await asyncio.gather(*(
+            expand_sitemap(loc, child_lastmod, sem, seen, counters) for loc, child_lastmod in entries
+        ))
+        return [e for child in children for e in child]
+
+    out: List[Tuple[str, Optional[str]]] = []
+    for loc, page_lastmod in entries:
+        loc = normalize_url(loc)
+        if loc:
+            out.append((loc, page_lastmod))
+    return out
+
+async def parse_sitemap(url: str) -> List[Tuple[str, Optional[str]]]:
+    sem = asyncio.Semaphore(MAX_CONCURRENT_SITEMAP)
+    counters = {"fetched": 0, "not_modified": 0, "unchanged": 0, "stale": 0, "failed": 0}
+    entries = await expand_sitemap(url, None, sem, set(), counters)
+    logger.info(f"Sitemaps: {counters}")
+    # Keep the first occurrence of each URL
+    deduped: Dict[str, Optional[str]] = {}
+    for loc, lastmod in entries:
+        deduped.setdefault(loc, lastmod)
+    return list(deduped.items())
 
 # =========================
 # Fetch pages
@@ -313,6 +1063,8 @@ def fetch_page(url: str, state: Optional[Dict[str, Any]]) -> Tuple[Optional[str]
         "etag": r.headers.get("ETag"),
         "last_modified": r.headers.get("Last-Modified"),
         "content_type": r.headers.get("Content-Type", ""),
+        "retry_after": r.headers.get("Retry-After"),
+        "size_bytes": len(r.content),
     }
 
     if r.status_code == 304:
@@ -323,132 +1075,429 @@ def fetch_page(url: str, state: Optional[Dict[str, Any]]) -> Tuple[Optional[str]
 
     return r.text, meta
 
+async def fetch_page_with_retries(url: str, state: Optional[Dict[str, Any]],
+                                  limiter: AdaptiveLimiter) -> Tuple[Optional[str], Dict[str, Any]]:
+    async def once():
+        with metrics.stage("fetch"):
+            html, meta = await asyncio.to_thread(fetch_page, url, state)
+        # Counted here, on the loop thread: metrics are not locked against worker threads
+        metrics.count("bytes_fetched", meta.get("size_bytes") or 0)
+        status = meta.get("status")
+        if status in RETRY_STATUSES:
+            raise RetryableError(f"http_{status}", parse_retry_after(meta.get("retry_after")),
+                                 overload=status in (0, 429, 503), result=(html, meta))
+        return html, meta
+    try:
+        return await call_with_retries(limiter, once)
+    except RetryableError as e:
+        return e.result
+
 # =========================
 # Extraction
 # =========================
-def extract_page_metadata(soup: BeautifulSoup, url: str) -> Dict[str, Any]:
-    title = soup.title.get_text(" ", strip=True) if soup.title else ""
-    h1_el = soup.find("h1")
-    h1 = h1_el.get_text(" ", strip=True) if h1_el else ""
-
-    canonical_el = soup.select_one('link[rel="canonical"]')
-    canonical_url = canonical_el.get("href", "").strip() if canonical_el else ""
+# Pages are parsed with lxml (much faster than BeautifulSoup's html.parser) in a
+# process pool, so CPU-bound parsing never stalls the event loop. The output
+# matches the previous BeautifulSoup extraction: same metadata, same main-content
+# selection and the same structured markdown-ish text.
+EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+STRUCTURED_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "table"}
+DOWNLOAD_EXTENSIONS = (".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx")
+
+def selector_to_xpath(selector: str) -> str:
+    """Translate the simple selectors used in MAIN_SELECTORS/REMOVE_SELECTORS
+    ("tag", ".class", "#id") to XPath, avoiding a cssselect dependency."""
+    if selector.startswith("."):
+        return f"descendant-or-self::*[contains(concat(' ', normalize-space(@class), ' '), ' {selector[1:]} ')]"
+    if selector.startswith("#"):
+        return f"descendant-or-self::*[@id='{selector[1:]}']"
+    return f"descendant-or-self::{selector}"
+
+# Removal happens in one pass over a single union XPath
+REMOVE_XPATH = etree.XPath(" | ".join(
+    [selector_to_xpath(sel) for sel in REMOVE_SELECTORS]
+    + [selector_to_xpath(tag) for tag in ("script", "style", "noscript")]
+))
+MAIN_XPATHS = [etree.XPath(selector_to_xpath(sel)) for sel in MAIN_SELECTORS]
+
+def node_text(el) -> str:
+    """Equivalent of BeautifulSoup's get_text(" ", strip=True)."""
+    return " ".join(t.strip() for t in el.itertext() if t.strip())
+
+def parse_html(html: str):
+    parser = lxml_html.HTMLParser(encoding="utf-8")
+    return lxml_html.document_fromstring(html.encode("utf-8", errors="ignore"), parser=parser)
+
+def extract_page_metadata(doc, url: str) -> Dict[str, Any]:
+    title_el = doc.find(".//title")
+    title = node_text(title_el) if title_el is not None else ""
+    h1_el = doc.find(".//h1")
+    h1 = node_text(h1_el) if h1_el is not None else ""
+
+    canonical_url = ""
+    for link in doc.iter("link"):
+        if "canonical" in (link.get("rel") or "").split():
+            canonical_url = (link.get("href") or "").strip()
+            break
     canonical_url = urljoin(url, canonical_url) if canonical_url else url
 
     downloads = []
-    for a in soup.select("a[href]"):
-        href = a.get("href", "").strip()
-        full = urljoin(url, href)
-        if full.lower().endswith((".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx")):
+    for a in doc.iter("a"):
+        href = a.get("href")
+        if href is None:
+            continue
+        full = urljoin(url, href.strip())
+        if full.lower().endswith(DOWNLOAD_EXTENSIONS):
             downloads.append(full)
     downloads = list(dict.fromkeys(downloads))[:50]
 
     return {"page_title": title, "h1": h1, "canonical_url": canonical_url, "download_links": downloads}
 
-def pick_main_container(soup: BeautifulSoup) -> Tuple[BeautifulSoup, bool]:
-    for sel in REMOVE_SELECTORS:
-        for node in soup.select(sel):
-            node.decompose()
+def pick_main_container(doc) -> Tuple[Any, bool]:
+    for node in REMOVE_XPATH(doc):
+        if node.getparent() is not None:
+            node.drop_tree()
 
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-
-    for sel in MAIN_SELECTORS:
-        node = soup.select_one(sel)
-        if node and node.get_text(strip=True):
-            return node, True
+    for xp in MAIN_XPATHS:
+        for node in xp(doc):
+            if node_text(node):
+                return node, True
+            break
 
-    return soup.body or soup, False
+    body = doc.find("body")
+    return (body if body is not None else doc), False
 
-def html_to_structured_text(container: BeautifulSoup) -> str:
+def html_to_structured_text(container) -> str:
     lines: List[str] = []
-    for el in container.find_all(["h1","h2","h3","h4","h5","h6","p","li","table"]):
-        name = el.name.lower()
-        if name.startswith("h"):
-            level = int(name[1])
-            txt = el.get_text(" ", strip=True)
+    for el in container.iter(*STRUCTURED_TAGS):
+        if el is container:
+            continue
+        name = el.tag
+        if name[0] == "h":
+            txt = node_text(el)
             if txt:
-                lines.append(f"{'#'*level} {txt}")
+                lines.append(f"{'#'*int(name[1])} {txt}")
         elif name == "p":
-            txt = el.get_text(" ", strip=True)
+            txt = node_text(el)
             if txt:
                 lines.append(txt)
         elif name == "li":
-            txt = el.get_text(" ", strip=True)
+            txt = node_text(el)
             if txt:
                 lines.append(f"- {txt}")
         elif name == "table":
-            for row in el.find_all("tr"):
-                cells = [c.get_text(" ", strip=True) for c in row.find_all(["th","td"])]
+            for row in el.iter("tr"):
+                cells = [node_text(c) for c in row.iter("th", "td")]
                 cells = [c for c in cells if c]
                 if cells:
                     lines.append(" | ".join(cells))
 
     return clean_whitespace("\n".join(lines))
 
+def extract_html(html: str, url: str) -> Tuple[Dict[str, Any], str]:
+    """Parse a page and return (page metadata, structured text). Runs in the extraction pool."""
+    doc = parse_html(html)
+    page_meta = extract_page_metadata(doc, url)
+    container, _ = pick_main_container(doc)
+    return page_meta, html_to_structured_text(container)
+
+extract_pool: Optional[ProcessPoolExecutor] = None
+
+async def extract_html_async(html: str, url: str) -> Tuple[Dict[str, Any], str]:
+    with metrics.stage("extract"):
+        if extract_pool is None:
+            return await asyncio.to_thread(extract_html, html, url)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(extract_pool, extract_html, html, url)
+
 # =========================
 # Chunking
 # =========================
-def split_by_headings(text: str) -> List[Tuple[str, str]]:
-    lines = text.splitlines()
-    sections: List[Tuple[str, List[str]]] = []
-    current_heading = "Introduction"
-    current: List[str] = []
-    heading_re = re.compile(r"^(#{1,6})\s+(.*)$")
+# Structured text is parsed back into blocks (paragraphs, list groups and tables, each
+# under its heading path) and packed into chunks of at most CHUNK_MAX_TOKENS. A list or
+# table that fits the budget is never split; a larger one is split between items/rows,
+# and each table piece repeats the header row. Long paragraphs split between sentences,
+# and a sentence, list item or row that alone exceeds the budget is split between words
+# (or characters, for text without spaces), so no chunk is ever over CHUNK_MAX_TOKENS.
+# A line is a table row only if it has at least two " | " cells and a neighbouring line
+# does too; a lone line with a pipe in it is a paragraph.
+# A chunk is labelled with its heading path ("Software Engineering > Study Plan"), and
+# a section smaller than CHUNK_MIN_TOKENS is merged into the next one under the same
+# parent heading instead of being dropped.
+#
+# Boundaries are content-defined so that an edit moves only nearby ones: besides
+# headings and the size budget, a chunk of at least CHUNK_MIN_TOKENS ends after any
+# block whose hash marks it as a cut point (1 in CHUNK_CUT_EVERY). With greedy packing
+# alone, one added sentence shifts every later boundary on the page; with cut points
+# the chunks line up again after the next cut, and only the chunks whose text changed
+# need embedding (see reusable_vectors).
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?\u061f])\s+")
+
+_token_encoding: Any = None
+
+def count_tokens(text: str) -> int:
+    """Tokens in text for the embedding model (cl100k_base); about chars/4 without tiktoken."""
+    global _token_encoding
+    if _token_encoding is None:
+        try:
+            import tiktoken
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoding = False
+    if _token_encoding is False:
+        return max(1, len(text) // 4)
+    return len(_token_encoding.encode(text, disallowed_special=()))
 
-    for line in lines:
-        m = heading_re.match(line.strip())
+@dataclass
+class Block:
+    kind: str                 # "heading", "paragraph", "list" or "table"
+    path: Tuple[str, ...]     # headings above the block, outermost first
+    lines: List[str]
+
+def table_cells(line: str) -> int:
+    return len(line.split(" | ")) if " | " in line else 0
+
+def parse_blocks(structured_text: str) -> List[Block]:
+    """Split html_to_structured_text output into heading, paragraph, list and table blocks."""
+    blocks: List[Block] = []
+    headings: List[Tuple[int, str]] = []
+    lines = [line.strip() for line in structured_text.splitlines() if line.strip()]
+    for i, line in enumerate(lines):
+        m = HEADING_RE.match(line)
         if m:
-            if current:
-                sections.append((current_heading, current))
-            current_heading = m.group(2).strip() or "Untitled"
-            current = []
+            level = len(m.group(1))
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, m.group(2).strip() or "Untitled"))
+            blocks.append(Block("heading", tuple(h for _, h in headings), [line]))
+            continue
+        is_row = table_cells(line) >= 2 and any(
+            0 <= j < len(lines) and table_cells(lines[j]) >= 2 and not HEADING_RE.match(lines[j]) for j in (i - 1, i + 1)
+        )
+        kind = "list" if line.startswith("- ") else "table" if is_row else "paragraph"
+        path = tuple(h for _, h in headings)
+        last = blocks[-1] if blocks else None
+        if kind != "paragraph" and last is not None and last.kind == kind and last.path == path:
+            last.lines.append(line)
         else:
-            if line.strip():
-                current.append(line)
-
-    if current:
-        sections.append((current_heading, current))
-
-    return [(h, clean_whitespace("\n".join(body))) for h, body in sections if body]
-
-# Text chunking strategy - splits documents into overlapping chunks to preserve context
-# Respects word boundaries to avoid splitting mid-word
-def chunk_section_text(section_text: str, max_chars: int = CHUNK_MAX_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
-    s = section_text.strip()
-    if not s:
-        return []
-    chunks = []
-    start = 0
-    n = len(s)
-
-    while start < n:
-        end = min(start + max_chars, n)
-        window = s[start:end]
-        last_break = window.rfind("\n\n")
-        if last_break > max_chars * 0.5:
-            end = start + last_break
-
-        chunk = s[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-
-        if end >= n:
-            break
-        start = max(0, end - overlap)
-
-    return chunks
-
-def chunk_document(structured_text: str) -> List[Tuple[str, str]]:
+            blocks.append(Block(kind, path, [line]))
+    return blocks
+
+def fit_text(text: str, max_tokens: int) -> List[str]:
+    """text as pieces of at most max_tokens: halved between words, or characters if it has no spaces."""
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    words = text.split(" ")
+    if len(words) > 1:
+        mid = len(words) // 2
+        halves = [" ".join(words[:mid]), " ".join(words[mid:])]
+    else:
+        halves = [text[:len(text) // 2], text[len(text) // 2:]]
+    return [piece for half in halves if half.strip() for piece in fit_text(half, max_tokens)]
+
+def split_block(block: Block, max_tokens: int) -> List[Tuple[str, Optional[str]]]:
+    """A block as (text, table header) units: whole if it fits, else per row, item or sentence.
+
+    Every unit fits max_tokens together with its header."""
+    text = "\n".join(block.lines)
+    if count_tokens(text) <= max_tokens:
+        return [(text, None)]
+    if block.kind == "table":
+        header = block.lines[0]
+        units = [(piece, None) for piece in fit_text(header, max_tokens)]
+        # Repeat the header with each row only while it leaves most of the budget for the row
+        header_tokens = count_tokens(header)
+        repeat = header if header_tokens <= max_tokens // 2 else None
+        budget = max_tokens - header_tokens if repeat else max_tokens
+        for row in block.lines[1:]:
+            units.extend((piece, repeat) for piece in fit_text(row, budget))
+        return units
+    if block.kind == "list":
+        return [(piece, None) for item in block.lines for piece in fit_text(item, max_tokens)]
+    return [(piece, None) for sentence in SENTENCE_END_RE.split(text) for piece in fit_text(sentence, max_tokens)]
+
+def is_cut_point(unit: str) -> bool:
+    return int(hashlib.blake2b(unit.encode("utf-8"), digest_size=4).hexdigest(), 16) % CHUNK_CUT_EVERY == 0
+
+def _common_prefix(a: Tuple[str, ...], b: Tuple[str, ...]) -> Tuple[str, ...]:
+    n = 0
+    while n < min(len(a), len(b)) and a[n] == b[n]:
+        n += 1
+    return a[:n]
+
+def chunk_document(structured_text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                   min_tokens: int = CHUNK_MIN_TOKENS) -> List[Tuple[str, str]]:
+    """Pack a page's blocks into (heading path, text) chunks; see the notes above."""
     out: List[Tuple[str, str]] = []
-    for heading, body in split_by_headings(structured_text):
-        if len(body) < MIN_CHUNK_CHARS:
+    path: Tuple[str, ...] = ()
+    lines: List[str] = []
+    pending_headings: List[str] = []
+    size = 0
+
+    def close():
+        nonlocal lines, size
+        if lines and size >= CHUNK_DROP_TOKENS:
+            out.append((" > ".join(path) or "Introduction", "\n".join(lines)))
+        lines, size = [], 0
+        pending_headings.clear()
+
+    for block in parse_blocks(structured_text):
+        if block.kind == "heading":
+            # A small section runs on into the next one when they share a parent heading
+            parent = block.path[:-1]
+            same_parent = path[:len(parent)] == parent and bool(parent or not path)
+            if lines and (size >= min_tokens or not same_parent):
+                close()
+            if lines:
+                pending_headings.append(block.lines[0])
             continue
-        for p in chunk_section_text(body):
-            if len(p) >= MIN_CHUNK_CHARS:
-                out.append((heading, p))
+        for unit, header in split_block(block, max_tokens):
+            tokens = count_tokens(unit)
+            carried = sum(count_tokens(h) for h in pending_headings)
+            if lines and size + carried + tokens > max_tokens:
+                close()
+            if not lines:
+                path = block.path
+                if header is not None:
+                    lines.append(header)
+                    size += count_tokens(header)
+            else:
+                if pending_headings:
+                    path = _common_prefix(path, block.path) if path else block.path
+                    lines.extend(pending_headings)
+                    size += sum(count_tokens(h) for h in pending_headings)
+                    pending_headings.clear()
+            lines.append(unit)
+            size += tokens
+            if size >= min_tokens and is_cut_point(unit):
+                close()
+    close()
     return out
 
+def embedding_text(heading: str, chunk_text: str) -> str:
+    """Text that is embedded and stored for a chunk: its section heading, then the chunk."""
+    return f"Section: {heading}\n\n{chunk_text}"
+
+# =========================
+# Near-duplicate chunk detection
+# =========================
+# PSU pages repeat whole blocks (program-page templates, contact sections). Each chunk
+# gets a 64-bit SimHash over word 3-shingles; a chunk within NEAR_DUP_MAX_HAMMING bits
+# of a chunk already stored for a *different* URL is not embedded again. The page
+# references the stored vector instead, and the vector lists it in source_urls.
+# Candidates are found via LSH banding (the 64 bits are split into SIMHASH_BANDS bands;
+# by pigeonhole any fingerprint within 3 bits shares at least one band exactly).
+#
+# Vector ids are hashes of the embedded text (content_chunk_id), so a stored vector is
+# never overwritten with different text while other pages point at it. Every URL whose
+# current version uses a vector is recorded in chunk_refs; the vector's home URL (its
+# url metadata) is one of them. When a page stops using a vector because it changed or
+# shrank, its reference is released: a vector no page uses is deleted, and one whose
+# home was that page is re-homed to another page that still uses it.
+NEAR_DUP_MAX_HAMMING = 3
+SIMHASH_BANDS = 4
+SHINGLE_SIZE = 3
+_BAND_BITS = 64 // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+def to_signed64(x: int) -> int:
+    return x - (1 << 64) if x >= (1 << 63) else x
+
+def to_unsigned64(x: int) -> int:
+    return x + (1 << 64) if x < 0 else x
+
+def simhash(text: str) -> int:
+    words = re.findall(r"\w+", text.lower())
+    shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))]
+    weights = [0] * 64
+    for sh in shingles:
+        h = int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+class ChunkFingerprintIndex:
+    """In-memory chunk_fingerprints and chunk_refs. Only touched from the event loop."""
+
+    def __init__(self):
+        self._fps: Dict[str, Tuple[str, int]] = {}  # vector_id -> (home url, simhash)
+        self._refs: Dict[str, set] = {}             # vector_id -> urls using it, home included
+        self._pages: Dict[str, set] = {}            # url -> vector_ids it uses
+        self._bands: List[Dict[int, set]] = [{} for _ in range(SIMHASH_BANDS)]
+
+    @classmethod
+    def from_store(cls, store: CrawlStateStore) -> "ChunkFingerprintIndex":
+        idx = cls()
+        fps, refs = store.load_fingerprints()
+        for vid, url, fp in fps:
+            idx.add(vid, url, fp)
+        for vid, url in refs:
+            idx.add_ref(vid, url)
+        return idx
+
+    def __len__(self) -> int:
+        return len(self._fps)
+
+    def add(self, vector_id: str, url: str, fp: int):
+        """Index a stored vector with url as its home (re-homes one already indexed)."""
+        self._fps[vector_id] = (url, fp)
+        for b in range(SIMHASH_BANDS):
+            self._bands[b].setdefault((fp >> (b * _BAND_BITS)) & _BAND_MASK, set()).add(vector_id)
+        self.add_ref(vector_id, url)
+
+    def remove(self, vector_id: str):
+        entry = self._fps.pop(vector_id, None)
+        if entry is not None:
+            for b in range(SIMHASH_BANDS):
+                key = (entry[1] >> (b * _BAND_BITS)) & _BAND_MASK
+                self._bands[b][key].discard(vector_id)
+                if not self._bands[b][key]:
+                    del self._bands[b][key]
+        for url in self._refs.pop(vector_id, ()):
+            self._pages[url].discard(vector_id)
+
+    def entry(self, vector_id: str) -> Optional[Tuple[str, int]]:
+        """(home url, simhash) of an indexed vector."""
+        return self._fps.get(vector_id)
+
+    def find(self, fp: int, exclude_url: str) -> Optional[str]:
+        """Vector ID of a stored near-duplicate owned by another URL, if any."""
+        best, best_dist = None, NEAR_DUP_MAX_HAMMING + 1
+        for b in range(SIMHASH_BANDS):
+            for vid in self._bands[b].get((fp >> (b * _BAND_BITS)) & _BAND_MASK, ()):
+                owner, other = self._fps[vid]
+                if owner == exclude_url:
+                    continue
+                dist = bin(fp ^ other).count("1")
+                if dist < best_dist:
+                    best, best_dist = vid, dist
+        return best
+
+    def add_ref(self, vector_id: str, url: str) -> bool:
+        """Record that url uses vector_id. Returns False if it already did."""
+        refs = self._refs.setdefault(vector_id, set())
+        if url in refs:
+            return False
+        refs.add(url)
+        self._pages.setdefault(url, set()).add(vector_id)
+        return True
+
+    def drop_ref(self, vector_id: str, url: str) -> List[str]:
+        """Forget that url uses vector_id. Returns the URLs still using it, sorted."""
+        refs = self._refs.get(vector_id, set())
+        refs.discard(url)
+        self._pages.get(url, set()).discard(vector_id)
+        return sorted(refs)
+
+    def refs(self, vector_id: str) -> List[str]:
+        return sorted(self._refs.get(vector_id, ()))
+
+    def page_ids(self, url: str) -> set:
+        """Ids of the vectors url's current version uses."""
+        return set(self._pages.get(url, ()))
+
+fingerprint_index: Optional[ChunkFingerprintIndex] = None
+
 # =========================
 # Embeddings and Pinecone upsert
 # =========================
@@ -464,20 +1513,68 @@ def make_chunk_id(url: str, chunk_index: int) -> str:
     """Generate a unique identifier for a chunk by combining URL and chunk index.
     
     Sanitizes URL by replacing special characters to create valid Pinecone record ID.
+    Only pages indexed before content_chunk_id still have vectors under these ids.
     """
     safe = url.replace("://", "_").replace("/", "_")
     return f"{safe}_{chunk_index}"
 
+def content_chunk_id(chunk_hash: str) -> str:
+    """Vector id of a chunk: the SHA-256 of its embedded text, the same on every page."""
+    return f"chunk_{chunk_hash}"
+
 # Request native 3072 embeddings from OpenAI
 # This directly creates embeddings at the target dimension without padding or truncation
 async def embed_texts(texts: List[str]) -> List[List[float]]:
-    resp = await openai_client.embeddings.create(
-        model=EMBED_MODEL,
-        input=texts,
-        dimensions=EMBED_DIMENSION,
-    )
+    with metrics.stage("embed"):
+        resp = await openai_client.embeddings.create(
+            model=EMBED_MODEL,
+            input=texts,
+            dimensions=EMBED_DIMENSION,
+        )
+    if resp.usage is not None:
+        metrics.count("tokens_embedded", resp.usage.total_tokens)
+    metrics.count("texts_embedded", len(texts))
     return [d.embedding for d in resp.data]
 
+async def embed_texts_with_retries(texts: List[str], limiter: AdaptiveLimiter) -> List[List[float]]:
+    async def once():
+        try:
+            return await embed_texts(texts)
+        except openai.RateLimitError as e:
+            raise RetryableError("embed_429", parse_retry_after(e.response.headers.get("Retry-After")), overload=True) from e
+        except openai.APITimeoutError as e:
+            raise RetryableError("embed_timeout", overload=True) from e
+        except openai.APIConnectionError as e:
+            raise RetryableError("embed_connection_error") from e
+        except openai.InternalServerError as e:
+            raise RetryableError(f"embed_{e.status_code}", parse_retry_after(e.response.headers.get("Retry-After")),
+                                 overload=e.status_code == 503) from e
+    return await call_with_retries(limiter, once)
+
+async def pinecone_call_with_retries(limiter: AdaptiveLimiter, what: str, fn, **kwargs):
+    """Run a blocking Pinecone call under the upsert limiter. Only use for idempotent calls
+    (upsert by ID, metadata update, delete by ID), since a timed-out call may still have landed."""
+    async def once():
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(fn, **kwargs), timeout=60.0)
+        except asyncio.TimeoutError as e:
+            raise RetryableError(f"{what}_timeout", overload=True) from e
+        except Exception as e:
+            status = getattr(e, "status", None)
+            if status in RETRY_STATUSES:
+                headers = getattr(e, "headers", None) or {}
+                raise RetryableError(f"{what}_{status}", parse_retry_after(headers.get("Retry-After")),
+                                     overload=status in (429, 503)) from e
+            raise
+    return await call_with_retries(limiter, once)
+
+async def upsert_vectors_with_retries(vectors: List[Dict[str, Any]], limiter: AdaptiveLimiter):
+    """Upsert one batch. Upserts are idempotent by ID, so a retry after a timeout is safe."""
+    with metrics.stage("upsert"):
+        res = await pinecone_call_with_retries(limiter, "upsert", index.upsert, vectors=vectors)
+    metrics.count("vectors_upserted", len(vectors))
+    return res
+
 def looks_incomplete(structured_text: str) -> bool:
     """Check if extracted content appears incomplete or too minimal.
     
@@ -485,29 +1582,29 @@ def looks_incomplete(structured_text: str) -> bool:
     """
     return len(re.findall(r"\w+", structured_text)) < 10
 
-async def process_url(url: str, sitemap_lastmod: Optional[str], fetch_sem: asyncio.Semaphore, embed_sem: asyncio.Semaphore) -> Dict[str, Any]:
+async def process_url(url: str, sitemap_lastmod: Optional[str], limiters: Limiters,
+                      verify_index: bool = False, run_id: Optional[int] = None) -> Dict[str, Any]:
     """Process a single URL: fetch, extract content, chunk, embed, and upsert to Pinecone.
     
-    Uses semaphores to control concurrent fetch and embedding operations.
-    Checks cache using ETag and content hash to avoid reprocessing unchanged content.
+    Uses adaptive limiters to control concurrent fetch, embedding and upsert operations
+    and to retry transient failures.
+    Checks cache using ETag and content hash to avoid reprocessing unchanged content;
+    with verify_index, embeddings already in Pinecone for this version are reused, so a
+    resumed URL is never embedded twice.
+    With run_id, the URL is marked in_progress in that run's journal, on disk, before
+    anything is upserted, so a resume after a crash knows to reuse what Pinecone has for it.
     Returns status dict indicating if URL was updated, skipped, or failed with reason.
     """
-    """Process a single URL: fetch, extract content, chunk, embed, and upsert to Pinecone
-    
-    Uses semaphores to control concurrent fetch and embedding operations.
-    Returns status indicating if URL was updated, skipped, or failed.
-    """
     state = get_state(url)
 
     if state and sitemap_lastmod and state.get("sitemap_lastmod"):
         try:
             if sitemap_lastmod <= state["sitemap_lastmod"]:
                 return {"url": url, "skipped": True, "reason": "sitemap_lastmod_unchanged"}
-        except:
+        except Exception:
             pass
 
-    async with fetch_sem:
-        html, meta = await asyncio.to_thread(fetch_page, url, state)
+    html, meta = await fetch_page_with_retries(url, state, limiters.fetch)
 
     if meta.get("status") == 304:
         upsert_state(url, sitemap_lastmod, state.get("etag") if state else None,
@@ -518,10 +1615,8 @@ async def process_url(url: str, sitemap_lastmod: Optional[str], fetch_sem: async
     if html is None:
         return {"url": url, "skipped": True, "reason": f"http_{meta.get('status')}"}
 
-    soup = BeautifulSoup(html, "html.parser")
-    page_meta = extract_page_metadata(soup, url)
-    container, _ = pick_main_container(soup)
-    structured = html_to_structured_text(container)
+    page_meta, structured = await extract_html_async(html, url)
+    state_store.set_page_documents(url, page_meta.get("download_links", []))
 
     if looks_incomplete(structured):
         upsert_state(url, sitemap_lastmod, meta.get("etag"), meta.get("last_modified"),
@@ -533,88 +1628,648 @@ async def process_url(url: str, sitemap_lastmod: Optional[str], fetch_sem: async
         upsert_state(url, sitemap_lastmod, meta.get("etag"), meta.get("last_modified"), content_hash)
         return {"url": url, "skipped": True, "reason": "hash_unchanged"}
 
-    chunk_pairs = chunk_document(structured)
+    with metrics.stage("chunk"):
+        chunk_pairs = chunk_document(structured)
     if not chunk_pairs:
         upsert_state(url, sitemap_lastmod, meta.get("etag"), meta.get("last_modified"), content_hash)
         return {"url": url, "skipped": True, "reason": "no_chunks"}
 
-    texts, headings = [], []
-    for heading, chunk_text in chunk_pairs:
-        texts.append(f"Section: {heading}\n\n{chunk_text}")
-        headings.append(heading)
+    base_md = {
+        "url": url,
+        "canonical_url": page_meta.get("canonical_url", url),
+        "page_title": page_meta.get("page_title", ""),
+        "h1": page_meta.get("h1", ""),
+        "content_type": "text/structured",
+        "sitemap_lastmod": sitemap_lastmod,
+        "http_status": meta.get("status"),
+        "final_url": meta.get("final_url", url),
+        "etag": meta.get("etag"),
+        "last_modified": meta.get("last_modified"),
+        "content_hash": content_hash,
+        "download_links": page_meta.get("download_links", []),
+    }
+    if run_id is not None:
+        await asyncio.to_thread(state_store.mark_item_now, run_id, url, "in_progress")
+    res = await embed_and_upsert(url, chunk_pairs, base_md, limiters,
+                                 reindex=verify_index or bool(state and state.get("content_hash")))
+    if res["error"]:
+        return {"url": url, "error": res["error"]}
 
-    embeddings: List[List[float]] = []
-    async with embed_sem:
-        for i in range(0, len(texts), EMBED_BATCH_SIZE):
-            embeddings.extend(await embed_texts(texts[i:i + EMBED_BATCH_SIZE]))
+    upsert_state(url, sitemap_lastmod, meta.get("etag"), meta.get("last_modified"), content_hash)
+    return {"url": url, "updated": True, "chunks": res["embedded"], "deduplicated": res["deduplicated"]}
+
+async def reusable_vectors(url: str, ids: List[str], total_chunks: int,
+                           limiter: AdaptiveLimiter) -> Tuple[Dict[str, List[float]], List[str]]:
+    """Stored embeddings that url's new version can reuse, keyed by the chunk_hash of their text.
+
+    Reads the new version's ids (chunks unchanged since the previous version, or vectors
+    a crashed run already upserted) and the ids the previous version used. A page
+    indexed before content ids has none recorded; its positional ids (make_chunk_id, up
+    to the previous version's total_chunks) are read instead and returned, so the caller
+    can delete them. A failed read only means nothing is reused.
+    """
+    found: Dict[str, Any] = {}
+
+    async def fetch(ids: List[str]):
+        for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+            resp = await pinecone_call_with_retries(limiter, "fetch", index.fetch, ids=ids[i:i + UPSERT_BATCH_SIZE])
+            found.update(resp.vectors or {})
+
+    previous = fingerprint_index.page_ids(url)
+    legacy: List[str] = []
+    try:
+        await fetch(list(dict.fromkeys(ids + sorted(previous))))
+        if not previous:
+            legacy_found = len(found)
+            await fetch([make_chunk_id(url, i) for i in range(total_chunks)])
+            previous_total = max(((v.metadata or {}).get("total_chunks") or 0 for v in found.values()), default=0)
+            if previous_total > total_chunks:
+                await fetch([make_chunk_id(url, i) for i in range(total_chunks, int(previous_total))])
+            legacy = list(found)[legacy_found:]
+    except Exception as e:
+        logger.warning(f"Could not read previous vectors for {url}: {e}")
+        return {}, []
+    reusable = {
+        v.metadata["chunk_hash"]: list(v.values)
+        for v in found.values()
+        if (v.metadata or {}).get("chunk_hash") and getattr(v, "values", None)
+    }
+    return reusable, legacy
+
+async def release_chunk_refs(url: str, vector_ids, limiters: Limiters):
+    """Drop url's references to vector_ids.
+
+    A vector no page uses any more is deleted. One that other pages still use keeps its
+    text (they reference it for that text) and gets an updated source_urls; if url was
+    its home, it is re-homed to one of them. Its page_title and h1 still name the first
+    home, whose block it repeats. State changes are made first, so no concurrent page
+    can match a vector being deleted; a failed Pinecone call only leaves an orphan.
+    """
+    deletes: List[str] = []
+    updates: List[Tuple[str, Dict[str, Any]]] = []
+    for vid in vector_ids:
+        remaining = fingerprint_index.drop_ref(vid, url)
+        state_store.set_chunk_ref(vid, url, False)
+        if not remaining:
+            fingerprint_index.remove(vid)
+            state_store.remove_fingerprint(vid)
+            deletes.append(vid)
+            continue
+        md: Dict[str, Any] = {"source_urls": remaining[:MAX_SOURCE_PAGES_METADATA], "source_url_count": len(remaining)}
+        entry = fingerprint_index.entry(vid)
+        if entry is not None and entry[0] == url:
+            fingerprint_index.add(vid, remaining[0], entry[1])
+            state_store.set_fingerprint(vid, remaining[0], entry[1])
+            md.update({"url": remaining[0], "canonical_url": remaining[0]})
+        updates.append((vid, md))
+    try:
+        for i in range(0, len(deletes), UPSERT_BATCH_SIZE):
+            await pinecone_call_with_retries(limiters.upsert, "delete", index.delete, ids=deletes[i:i + UPSERT_BATCH_SIZE])
+        for vid, md in updates:
+            await pinecone_call_with_retries(limiters.upsert, "update", index.update, id=vid, set_metadata=md)
+    except Exception as e:
+        logger.warning(f"Could not release {len(deletes)} deleted / {len(updates)} re-homed vectors of {url}: {e}")
+    metrics.count("chunks_released", len(deletes) + len(updates))
+
+async def embed_and_upsert(url: str, chunk_pairs: List[Tuple[str, str]], base_md: Dict[str, Any],
+                           limiters: Limiters, reindex: bool = False) -> Dict[str, Any]:
+    """Embed (heading, chunk) pairs and upsert them as url's vectors.
+
+    base_md is the per-source metadata shared by every chunk. Each chunk is stored under
+    content_chunk_id of its text. Chunks that are near-duplicates of a vector stored for
+    another URL are not embedded; url is added to that vector's references and
+    source_urls instead. Vectors the previous version used and this one does not are
+    released (see release_chunk_refs). With reindex (a new version of an indexed source,
+    or a resumed one), stored embeddings of unchanged chunks are reused.
+    Returns {"error", "embedded", "deduplicated", "reused"}.
+    """
+    global fingerprint_index
+    if fingerprint_index is None:
+        fingerprint_index = ChunkFingerprintIndex.from_store(state_store)
+    with metrics.stage("dedup"):
+        fps = [simhash(chunk_text) for _, chunk_text in chunk_pairs]
+    texts = [embedding_text(*pair) for pair in chunk_pairs]
+    hashes = [sha256_text(t) for t in texts]
+
+    previous_ids = fingerprint_index.page_ids(url)
+    owned: Dict[str, int] = {}   # vector id -> index of the chunk stored under it
+    shared: Dict[str, int] = {}  # another page's vector this page uses -> chunk index
+    for i, fp in enumerate(fps):
+        match = fingerprint_index.find(fp, exclude_url=url)
+        if match:
+            shared.setdefault(match, i)
+        else:
+            owned.setdefault(content_chunk_id(hashes[i]), i)
+    deduplicated = len(chunk_pairs) - len(owned)
+    # Referenced now, before any await, so a concurrent re-index of their home page
+    # re-homes these vectors instead of deleting them
+    new_refs = [vid for vid in shared if fingerprint_index.add_ref(vid, url)]
+
+    keep = list(owned.values())
+    previous, legacy_ids = {}, []
+    if reindex:
+        previous, legacy_ids = await reusable_vectors(url, list(owned), len(chunk_pairs), limiters.upsert)
+    embeddings: List[Optional[List[float]]] = [previous.get(hashes[i]) for i in keep]
+    missing = [j for j, vec in enumerate(embeddings) if vec is None]
+    try:
+        for i in range(0, len(missing), EMBED_BATCH_SIZE):
+            batch = missing[i:i + EMBED_BATCH_SIZE]
+            vectors = await embed_texts_with_retries([texts[keep[j]] for j in batch], limiters.embed)
+            for j, vec in zip(batch, vectors):
+                embeddings[j] = vec
+    except RetryableError as e:
+        await release_chunk_refs(url, new_refs, limiters)
+        return {"error": f"embed_failed: {e.reason}"}
 
     crawled_at = datetime.now(timezone.utc).isoformat()
     domain = urlparse(url).netloc
     path = urlparse(url).path
 
     records: List[VectorRecord] = []
-    for i, (vec, heading, combined_text) in enumerate(zip(embeddings, headings, texts)):
+    for (vid, i), vec in zip(owned.items(), embeddings):
+        sources = sorted(set(fingerprint_index.refs(vid)) | {url})
         md = {
-            "url": url,
-            "canonical_url": page_meta.get("canonical_url", url),
-            "page_title": page_meta.get("page_title", ""),
-            "h1": page_meta.get("h1", ""),
-            "section_heading": heading,
+            **base_md,
+            "section_heading": chunk_pairs[i][0],
             "source": domain,
             "url_path": path,
             "chunk_index": i,
-            "total_chunks": len(texts),
-            "content_type": "text/structured",
+            "total_chunks": len(chunk_pairs),
             "crawled_at": crawled_at,
-            "sitemap_lastmod": sitemap_lastmod,
-            "http_status": meta.get("status"),
-            "final_url": meta.get("final_url", url),
-            "etag": meta.get("etag"),
-            "last_modified": meta.get("last_modified"),
-            "content_hash": content_hash,
-            "text": combined_text[:8000],
-            "download_links": page_meta.get("download_links", []),
+            "text": texts[i][:8000],
+            "chunk_hash": hashes[i],
         }
+        if len(sources) > 1:
+            md.update({"source_urls": sources[:MAX_SOURCE_PAGES_METADATA], "source_url_count": len(sources)})
         md = {k: v for k, v in md.items() if v is not None}
-        records.append(VectorRecord(id=make_chunk_id(url, i), values=vec, metadata=md))
+        records.append(VectorRecord(id=vid, values=vec, metadata=md))
 
     try:
         for i in range(0, len(records), UPSERT_BATCH_SIZE):
             batch = records[i:i + UPSERT_BATCH_SIZE]
             vectors = [{"id": r.id, "values": r.values, "metadata": r.metadata} for r in batch]
             logger.info(f"Upserting {len(vectors)} vectors for {url}")
-            await asyncio.wait_for(asyncio.to_thread(index.upsert, vectors=vectors), timeout=60.0)
-    except asyncio.TimeoutError:
-        return {"url": url, "error": "pinecone_upsert_timeout"}
+            await upsert_vectors_with_retries(vectors, limiters.upsert)
+
+        for vid in new_refs:
+            sources = fingerprint_index.refs(vid)
+            await pinecone_call_with_retries(
+                limiters.upsert, "update", index.update, id=vid,
+                set_metadata={"source_urls": sources[:MAX_SOURCE_PAGES_METADATA], "source_url_count": len(sources)},
+            )
+    except RetryableError as e:
+        await release_chunk_refs(url, new_refs, limiters)
+        return {"error": f"pinecone_{e.reason}"}
+    except Exception as e:
+        await release_chunk_refs(url, new_refs, limiters)
+        return {"error": f"pinecone_upsert_failed: {e}"}
+
+    for r in records:
+        fingerprint_index.add(r.id, url, fps[owned[r.id]])
+        state_store.set_fingerprint(r.id, url, fps[owned[r.id]])
+        state_store.set_chunk_ref(r.id, url)
+    for vid in shared:
+        state_store.set_chunk_ref(vid, url)
+    await release_chunk_refs(url, previous_ids - set(owned) - set(shared), limiters)
+    try:
+        for i in range(0, len(legacy_ids), UPSERT_BATCH_SIZE):
+            batch = legacy_ids[i:i + UPSERT_BATCH_SIZE]
+            await pinecone_call_with_retries(limiters.upsert, "delete", index.delete, ids=batch)
     except Exception as e:
-        return {"url": url, "error": f"pinecone_upsert_failed: {e}"}
+        logger.warning(f"Could not delete {len(legacy_ids)} positional vectors of {url}: {e}")
+    metrics.count("chunks_deduplicated", deduplicated)
+    metrics.count("chunks_reused", len(keep) - len(missing))
+    return {"error": None, "embedded": len(records), "deduplicated": deduplicated, "reused": len(keep) - len(missing)}
 
-    upsert_state(url, sitemap_lastmod, meta.get("etag"), meta.get("last_modified"), content_hash)
-    return {"url": url, "updated": True, "chunks": len(records)}
+# =========================
+# Document ingestion
+# =========================
+# Documents linked from pages (download_links) are tracked per page in crawl state,
+# deduplicated across the whole site and ingested after the pages: fetched
+# conditionally and streamed to disk, skipped when their SHA-256 is unchanged,
+# converted to structured text in the extraction pool, then chunked, embedded and
+# upserted through the same pipeline as pages.
+def fetch_document(url: str, state: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Stream a document to a file in DOWNLOAD_DIR. Returns (path, meta); path is None
+    when there is nothing to process (304, error, too large)."""
+    headers = {"User-Agent": USER_AGENT}
+    if state:
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+    try:
+        try:
+            r = requests.get(url, headers=headers, timeout=(15, 120), stream=True, verify=certifi.where())
+        except requests.exceptions.SSLError:
+            logger.warning(f"SSL verification failed for {url}, retrying without verification")
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            r = requests.get(url, headers=headers, timeout=(15, 120), stream=True, verify=False)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request failed for {url}: {e}")
+        return None, {"status": 0}
+
+    with r:
+        meta = {
+            "status": r.status_code,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "content_type": r.headers.get("Content-Type", ""),
+            "retry_after": r.headers.get("Retry-After"),
+        }
+        if r.status_code != 200:
+            return None, meta
+        declared = r.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > MAX_DOCUMENT_BYTES:
+            meta["status"] = "too_large"
+            return None, meta
+
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        path = os.path.join(DOWNLOAD_DIR, f"{sha256_text(url)[:24]}{os.path.splitext(urlparse(url).path)[1].lower()}")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                for block in r.iter_content(chunk_size=64 * 1024):
+                    size += len(block)
+                    if size > MAX_DOCUMENT_BYTES:
+                        meta["status"] = "too_large"
+                        break
+                    digest.update(block)
+                    f.write(block)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Download failed for {url}: {e}")
+            meta["status"] = 0
+        if meta["status"] != 200:
+            os.remove(path)
+            return None, meta
+
+    meta["content_hash"] = digest.hexdigest()
+    meta["size_bytes"] = size
+    return path, meta
+
+def pdf_to_structured_text(path: str, title: str) -> str:
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            txt = page.extract_text() or ""
+            if txt.strip():
+                pages.append(txt.strip())
+    return clean_whitespace(f"# {title}\n" + "\n\n".join(pages))
+
+def docx_to_structured_text(path: str, title: str) -> str:
+    import docx
+
+    d = docx.Document(path)
+    lines = [f"# {title}"]
+    for p in d.paragraphs:
+        txt = p.text.strip()
+        if not txt:
+            continue
+        style = (p.style.name or "") if p.style is not None else ""
+        if style.startswith("Heading") and style[-1:].isdigit():
+            lines.append(f"{'#' * min(6, int(style[-1]) + 1)} {txt}")
+        elif style.startswith("List"):
+            lines.append(f"- {txt}")
+        else:
+            lines.append(txt)
+    for table in d.tables:
+        for row in table.rows:
+            cells = [c.text.strip() for c in row.cells]
+            cells = [c for c in cells if c]
+            if cells:
+                lines.append(" | ".join(cells))
+    return clean_whitespace("\n".join(lines))
+
+def extract_document(path: str, url: str) -> str:
+    """Convert a downloaded document to structured text. Runs in the extraction pool."""
+    title = os.path.basename(urlparse(url).path) or url
+    if path.endswith(".pdf"):
+        return pdf_to_structured_text(path, title)
+    return docx_to_structured_text(path, title)
+
+async def fetch_document_with_retries(url: str, state: Optional[Dict[str, Any]],
+                                      limiter: AdaptiveLimiter) -> Tuple[Optional[str], Dict[str, Any]]:
+    async def once():
+        with metrics.stage("document_fetch"):
+            path, meta = await asyncio.to_thread(fetch_document, url, state)
+        metrics.count("bytes_fetched", meta.get("size_bytes") or 0)
+        status = meta.get("status")
+        if status in RETRY_STATUSES:
+            raise RetryableError(f"http_{status}", parse_retry_after(meta.get("retry_after")),
+                                 overload=status in (0, 429, 503), result=(path, meta))
+        return path, meta
+    try:
+        return await call_with_retries(limiter, once)
+    except RetryableError as e:
+        return e.result
+
+async def process_document(url: str, source_pages: List[str], limiters: Limiters) -> Dict[str, Any]:
+    state = await asyncio.to_thread(state_store.get_document, url)
+    path, meta = await fetch_document_with_retries(url, state, limiters.fetch)
+    if path is None:
+        status = meta.get("status")
+        return {"url": url, "skipped": True, "reason": f"http_{status}" if isinstance(status, int) else status}
+
+    try:
+        content_hash = meta["content_hash"]
+        if state and state.get("content_hash") == content_hash:
+            reason = "hash_unchanged"
+        else:
+            loop = asyncio.get_running_loop()
+            try:
+                with metrics.stage("document_extract"):
+                    if extract_pool is None:
+                        structured = await asyncio.to_thread(extract_document, path, url)
+                    else:
+                        structured = await loop.run_in_executor(extract_pool, extract_document, path, url)
+            except ImportError as e:
+                return {"url": url, "skipped": True, "reason": f"unsupported_document: {e.name}"}
+            except Exception as e:
+                return {"url": url, "error": f"document_extraction_failed: {e}"}
+
+            chunk_pairs = chunk_document(structured)
+            if not chunk_pairs:
+                reason = "no_chunks"
+            else:
+                base_md = {
+                    "url": url,
+                    "canonical_url": url,
+                    "page_title": os.path.basename(urlparse(url).path),
+                    "content_type": meta.get("content_type") or "application/octet-stream",
+                    "http_status": 200,
+                    "etag": meta.get("etag"),
+                    "last_modified": meta.get("last_modified"),
+                    "content_hash": content_hash,
+                    "source_pages": source_pages[:MAX_SOURCE_PAGES_METADATA],
+                }
+                res = await embed_and_upsert(url, chunk_pairs, base_md, limiters,
+                                             reindex=bool(state and state.get("content_hash")))
+                if res["error"]:
+                    return {"url": url, "error": res["error"]}
+                reason = None
+
+        await asyncio.to_thread(state_store.upsert_document, url, meta.get("etag"), meta.get("last_modified"),
+                                content_hash, meta.get("size_bytes"))
+        if reason:
+            return {"url": url, "skipped": True, "reason": reason}
+        return {"url": url, "updated": True, "chunks": res["embedded"], "deduplicated": res["deduplicated"]}
+    finally:
+        os.remove(path)
+
+async def process_documents(limiters: Limiters, shard: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Ingest every document linked from crawled pages (this shard's share of them).
+    Returns the report section."""
+    await state_store.flush_async()
+    links = await asyncio.to_thread(state_store.document_links)
+    links = {
+        doc: pages for doc, pages in links.items()
+        if urlparse(doc).path.lower().endswith(DOCUMENT_EXTENSIONS) and normalize_url(doc)
+        and in_shard(doc, shard)
+    }
+    print(f"Found {len(links)} linked documents")
+
+    stats = {"updated": 0, "skipped": 0, "errors": 0, "chunks_deduplicated": 0, "reasons": {}}
+    failed: List[Dict[str, Any]] = []
+    results = await asyncio.gather(
+        *(process_document(doc, pages, limiters) for doc, pages in links.items()),
+        return_exceptions=True,
+    )
+    for doc, r in zip(links, results):
+        if isinstance(r, Exception):
+            r = {"url": doc, "error": str(r)}
+        if r.get("error"):
+            stats["errors"] += 1
+            failed.append({"url": doc, "error": r["error"]})
+            print(f"[ERR] {doc} -> {r['error']}", flush=True)
+        elif r.get("updated"):
+            stats["updated"] += 1
+            stats["chunks_deduplicated"] += r.get("deduplicated", 0)
+            print(f"[UPD] {doc} -> {r.get('chunks', 0)} chunks", flush=True)
+        else:
+            stats["skipped"] += 1
+            stats["reasons"][r["reason"]] = stats["reasons"].get(r["reason"], 0) + 1
+    return {"document_count": len(links), "stats": stats, "failed": failed}
 
 # =========================
 # Main crawling orchestration
 # =========================
 # Orchestrates the entire crawl process:
-# 1. Initialize database for crawl state tracking
-# 2. Load and parse sitemap from PSU website
-# 3. Create worker pool for concurrent URL processing
-# 4. Process each URL with concurrent fetch and embedding
-# 5. Generate crawl report with statistics
-async def run():
-    init_db()
-    print(f"Loading sitemap: {SITEMAP_URL}")
-    entries = parse_sitemap(SITEMAP_URL)
-    print(f"Found {len(entries)} URLs from sitemap")
-
-    fetch_sem = asyncio.Semaphore(MAX_CONCURRENT_FETCH)
-    embed_sem = asyncio.Semaphore(MAX_CONCURRENT_EMBED)
+# 1. Initialize clients and the crawl state store (preloaded, write-buffered)
+# 2. Build the work queue: from the sitemaps, from an interrupted run (--resume),
+#    or from the failures in the last crawl report (--only-failed)
+# 3. Record the queue in the crawl-run journal
+# 4. Process each URL with concurrent fetch and embedding, journaling each result
+# 5. Ingest the PDF/DOCX documents linked from crawled pages
+# 6. Generate crawl report with statistics
+#
+# Sharded mode: URLs (and documents) are partitioned by a hash of the URL. Each shard
+# is an ordinary run with --shard I/N that only keeps its own URLs and writes its own
+# report; --shards N runs all of them as local processes and merges their reports
+# into crawl_report.json. Shards on several machines must share the state database;
+# merge their reports with --merge-reports. The database runs in WAL mode, which needs
+# shared memory between the processes using it and does not work on NFS or other
+# network filesystems: put --db on a local disk of one machine and run every shard
+# there, or give each machine its own database and shard set. Reports are only merged
+# if their run_id is the shard's latest run in the database, so a report left over
+# from an earlier run is never counted for a shard that crashed this time.
+
+# Skip reasons from a previous report that are worth retrying with --only-failed
+RETRYABLE_SKIP_REASONS = {f"http_{status}" for status in RETRY_STATUSES}
+
+def shard_of(url: str, shard_count: int) -> int:
+    """Stable shard for a URL (independent of PYTHONHASHSEED and of the machine)."""
+    return int.from_bytes(hashlib.sha256(url.encode("utf-8")).digest()[:8], "big") % shard_count
+
+def in_shard(url: str, shard: Optional[Tuple[int, int]]) -> bool:
+    return shard is None or shard_of(url, shard[1]) == shard[0]
+
+def shard_report_path(shard: Tuple[int, int]) -> str:
+    return os.path.join(SCRIPT_DIR, f"crawl_report.shard-{shard[0]}-of-{shard[1]}.json")
+
+def load_failed_entries(report_path: str = REPORT_PATH) -> List[Tuple[str, Optional[str]]]:
+    """URLs that failed (or were skipped on a transient HTTP error) in the last report."""
+    try:
+        with open(report_path, encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Could not read crawl report {report_path}: {e}")
+        return []
+    urls = [item["url"] for item in report.get("failed", [])]
+    urls += [item["url"] for item in report.get("skipped", []) if item.get("reason") in RETRYABLE_SKIP_REASONS]
+    lastmods = state_store.sitemap_lastmods()
+    return [(url, lastmods.get(url)) for url in dict.fromkeys(urls)]
+
+async def load_sitemap_entries(sitemap_urls: List[str]) -> List[Tuple[str, Optional[str]]]:
+    entries: List[Tuple[str, Optional[str]]] = []
+    for sitemap_url in sitemap_urls:
+        print(f"Loading sitemap: {sitemap_url}")
+        entries.extend(await parse_sitemap(sitemap_url))
+    deduped: Dict[str, Optional[str]] = {}
+    for url, lastmod in entries:
+        deduped.setdefault(url, lastmod)
+    return list(deduped.items())
+
+def merge_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-shard crawl reports into one."""
+    stats = {"updated": 0, "skipped": 0, "errors": 0, "chunks_deduplicated": 0, "reasons": {}}
+    doc_stats = {"updated": 0, "skipped": 0, "errors": 0, "chunks_deduplicated": 0, "reasons": {}}
+    counters: Dict[str, float] = {}
+    slowest: List[Dict[str, Any]] = []
+    merged: Dict[str, Any] = {
+        "run_at_utc": datetime.now(timezone.utc).isoformat(),
+        "mode": "sharded",
+        "shard_count": len(reports),
+        "sitemap_url_count": 0,
+        "stats": stats,
+        "documents": {"document_count": 0, "stats": doc_stats, "failed": []},
+        "duration_s": 0.0,
+        "performance": {"counters": counters, "slowest_urls": slowest, "shards": {}},
+        "limiters": {},
+        "failed": [],
+        "skipped": [],
+    }
+    for rep in reports:
+        shard = rep.get("shard", "?")
+        merged["sitemap_url_count"] += rep.get("sitemap_url_count", 0)
+        merged["duration_s"] = max(merged["duration_s"], rep.get("duration_s", 0.0))
+        for target, source in ((stats, rep.get("stats") or {}),
+                               (doc_stats, (rep.get("documents") or {}).get("stats") or {})):
+            for key in ("updated", "skipped", "errors", "chunks_deduplicated"):
+                target[key] += source.get(key, 0)
+            for reason, n in (source.get("reasons") or {}).items():
+                target["reasons"][reason] = target["reasons"].get(reason, 0) + n
+        docs = rep.get("documents") or {}
+        merged["documents"]["document_count"] += docs.get("document_count", 0)
+        merged["documents"]["failed"].extend(docs.get("failed", []))
+        perf = rep.get("performance") or {}
+        for name, value in (perf.get("counters") or {}).items():
+            counters[name] = counters.get(name, 0) + value
+        slowest.extend(perf.get("slowest_urls", []))
+        merged["performance"]["shards"][shard] = perf.get("stages", {})
+        merged["limiters"][shard] = rep.get("limiters", {})
+        merged["failed"].extend(rep.get("failed", []))
+        merged["skipped"].extend(rep.get("skipped", []))
+    slowest.sort(key=lambda item: item["seconds"], reverse=True)
+    del slowest[SLOWEST_URLS_N:]
+    return merged
+
+def write_merged_report(report_paths: List[str], out_path: str = REPORT_PATH,
+                        db_path: Optional[str] = DB_PATH) -> Dict[str, Any]:
+    """Merge shard reports into out_path. With db_path, reports that are not from their
+    shard's latest run in the journal are stale and left out."""
+    store = CrawlStateStore(db_path) if db_path else None
+    reports, missing = [], []
+    try:
+        for path in report_paths:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    report = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Could not read shard report {path}: {e}")
+                missing.append(path)
+                continue
+            latest = store.latest_run(report.get("shard")) if store is not None else None
+            if store is not None and report.get("run_id") != latest:
+                logger.error(f"Shard report {path} is from run {report.get('run_id')}, not the shard's "
+                             f"latest run {latest}; leaving it out")
+                missing.append(path)
+                continue
+            reports.append(report)
+    finally:
+        if store is not None:
+            store.close()
+    merged = merge_reports(reports)
+    merged["missing_shard_reports"] = missing
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2)
+    logger.info(f"Merged {len(reports)} shard reports into {out_path}")
+    return merged
+
+def run_sharded(shard_count: int, child_args: List[str], db_path: str = DB_PATH,
+                sitemap_urls: Optional[List[str]] = None, warm_sitemaps: bool = True) -> int:
+    """Run shard_count local shard processes and merge their reports. Returns an exit code."""
+    if warm_sitemaps:
+        # Expand the sitemaps once so the shards find every child sitemap in the cache
+        async def warm():
+            init_db(db_path)
+            try:
+                await load_sitemap_entries(sitemap_urls or SITEMAP_URLS)
+            finally:
+                state_store.close()
+        asyncio.run(warm())
+
+    report_paths = [shard_report_path((i, shard_count)) for i in range(shard_count)]
+    # A shard that crashes must not leave an earlier run's report in the merge
+    for path in report_paths:
+        if os.path.exists(path):
+            os.remove(path)
+    workers_per_shard = max(1, (os.cpu_count() or 2) // shard_count)
+    procs = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--shard", f"{i}/{shard_count}",
+                          "--extract-workers", str(workers_per_shard), *child_args])
+        for i in range(shard_count)
+    ]
+    codes = [p.wait() for p in procs]
+    for i, code in enumerate(codes):
+        if code != 0:
+            logger.error(f"Shard {i}/{shard_count} exited with code {code}")
+
+    merged = write_merged_report(report_paths, db_path=db_path)
+    print("Done.")
+    print(json.dumps(merged["stats"], indent=2))
+    # Negative codes are shards killed by a signal
+    return 0 if all(code == 0 for code in codes) and not merged["missing_shard_reports"] else 1
+
+async def run(resume: bool = False, only_failed: bool = False, metrics_path: Optional[str] = None,
+              shard: Optional[Tuple[int, int]] = None, sitemap_urls: Optional[List[str]] = None,
+              db_path: str = DB_PATH, extract_workers: int = EXTRACT_WORKERS):
+    global extract_pool, fingerprint_index, metrics
+    metrics = CrawlMetrics()
+    run_started = time.perf_counter()
+    shard_tag = f"{shard[0]}/{shard[1]}" if shard else None
+    report_path = shard_report_path(shard) if shard else REPORT_PATH
+    init_clients()
+    init_db(db_path)
+    fingerprint_index = ChunkFingerprintIndex.from_store(state_store)
+    extract_pool = ProcessPoolExecutor(max_workers=extract_workers)
+
+    # URLs that were in flight when an interrupted run died; their upsert may have landed
+    uncertain: set = set()
+    run_id = state_store.latest_unfinished_run(shard_tag) if resume else None
+    if run_id is not None:
+        mode = "resume"
+        items = state_store.run_items(run_id, ("pending", "in_progress"))
+        entries = [(url, lastmod) for url, lastmod, _ in items]
+        uncertain = {url for url, _, status in items if status == "in_progress"}
+        print(f"Resuming run {run_id}: {len(entries)} URLs left ({len(uncertain)} were in flight)")
+    else:
+        if resume:
+            logger.warning("No interrupted run to resume; starting a new run")
+        if only_failed:
+            mode = "only_failed"
+            entries = load_failed_entries()
+            print(f"Retrying {len(entries)} failed URLs from {REPORT_PATH}")
+        else:
+            mode = "full"
+            with metrics.stage("sitemap"):
+                entries = await load_sitemap_entries(sitemap_urls or SITEMAP_URLS)
+            print(f"Found {len(entries)} URLs from sitemap")
+        if shard:
+            entries = [(url, lastmod) for url, lastmod in entries if in_shard(url, shard)]
+            print(f"Shard {shard_tag}: {len(entries)} URLs")
+        run_id = await asyncio.to_thread(state_store.start_run, mode, entries, shard_tag)
+
+    limiters = Limiters.default()
 
     q: asyncio.Queue[Tuple[str, Optional[str]]] = asyncio.Queue()
     for url, lastmod in entries:
         q.put_nowait((url, lastmod))
 
-    stats = {"updated": 0, "skipped": 0, "errors": 0, "reasons": {}}
+    stats = {"updated": 0, "skipped": 0, "errors": 0, "chunks_deduplicated": 0, "reasons": {}}
     failed: List[Dict[str, Any]] = []
     skipped: List[Dict[str, Any]] = []
 
@@ -626,42 +2281,68 @@ async def run():
             except asyncio.QueueEmpty:
                 return
 
+            state_store.mark_item(run_id, url, "in_progress")
+            started = time.perf_counter()
             try:
-                r = await process_url(url, lastmod, fetch_sem, embed_sem)
+                r = await process_url(url, lastmod, limiters, verify_index=url in uncertain, run_id=run_id)
+                metrics.observe_url(url, time.perf_counter() - started)
                 if r.get("error"):
                     stats["errors"] += 1
                     failed.append({"url": url, "error": r["error"]})
+                    state_store.mark_item(run_id, url, "failed", r["error"])
                     print(f"[ERR] {url} -> {r['error']}", flush=True)
                 elif r.get("updated"):
                     stats["updated"] += 1
-                    print(f"[UPD] {url} -> {r.get('chunks', 0)} chunks", flush=True)
+                    stats["chunks_deduplicated"] += r.get("deduplicated", 0)
+                    state_store.mark_item(run_id, url, "updated")
+                    print(f"[UPD] {url} -> {r.get('chunks', 0)} chunks ({r.get('deduplicated', 0)} deduplicated)", flush=True)
                 else:
                     stats["skipped"] += 1
                     reason = r.get("reason", "skipped")
                     stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
                     skipped.append({"url": url, "reason": reason})
+                    state_store.mark_item(run_id, url, "skipped", reason)
                     print(f"[SKP] {url} -> {reason}", flush=True)
             except Exception as e:
                 stats["errors"] += 1
                 failed.append({"url": url, "error": str(e)})
+                state_store.mark_item(run_id, url, "failed", str(e))
                 print(f"[ERR] {url} -> {e}", flush=True)
                 traceback.print_exc()
             finally:
                 q.task_done()
 
+    flusher = asyncio.create_task(state_store.flush_periodically())
     workers = [asyncio.create_task(worker(i)) for i in range(12)]
-    await asyncio.gather(*workers)
+    documents_report = None
+    try:
+        await asyncio.gather(*workers)
+        await asyncio.to_thread(state_store.finish_run, run_id)
+        if mode != "only_failed":
+            documents_report = await process_documents(limiters, shard)
+    finally:
+        # On interruption the run stays 'running' in the journal and can be resumed
+        flusher.cancel()
+        await asyncio.to_thread(state_store.close)
+        extract_pool.shutdown(wait=False, cancel_futures=True)
+        extract_pool = None
 
     report = {
         "run_at_utc": datetime.now(timezone.utc).isoformat(),
+        "run_id": run_id,
+        "mode": mode,
+        "shard": shard_tag,
         "sitemap_url_count": len(entries),
         "stats": stats,
+        "limiters": limiters.snapshot(),
+        "documents": documents_report,
+        "duration_s": round(time.perf_counter() - run_started, 3),
+        "performance": metrics.summary(),
         "failed": failed,
         "skipped": skipped,
     }
 
     # Save report, overwriting if it exists or creating if it doesn't
-    report_path = os.path.join(SCRIPT_DIR, "crawl_report.json")
     try:
         with open(report_path, "w", encoding="utf-8") as f:
             json.dump(report, f, ensure_ascii=False, indent=2)
@@ -669,12 +2350,67 @@ async def run():
     except Exception as e:
         logger.error(f"Failed to save crawl report: {e}")
 
+    if metrics_path:
+        try:
+            with open(metrics_path, "w", encoding="utf-8") as f:
+                f.write(metrics.prometheus_text())
+            logger.info(f"Prometheus metrics saved to {metrics_path}")
+        except Exception as e:
+            logger.error(f"Failed to save metrics: {e}")
+
     print("Done.")
     print(json.dumps(report["stats"], indent=2))
     if failed:
-        print(f"Failed URLs: {len(failed)} (see crawl_report.json)")
+        print(f"Failed URLs: {len(failed)} (see {os.path.basename(report_path)})")
     if skipped:
-        print(f"Skipped URLs: {len(skipped)} (see crawl_report.json)")
+        print(f"Skipped URLs: {len(skipped)} (see {os.path.basename(report_path)})")
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    try:
+        index_str, count_str = value.split("/")
+        shard = (int(index_str), int(count_str))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected I/N, e.g. 0/4")
+    if not 0 <= shard[0] < shard[1]:
+        raise argparse.ArgumentTypeError("shard index must be in [0, N)")
+    return shard
 
 if __name__ == "__main__":
-    asyncio.run(run())
+    parser = argparse.ArgumentParser(description="Crawl psu.edu.sa into the Pinecone index.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the most recent interrupted run from the crawl-run journal.")
+    parser.add_argument("--only-failed", action="store_true",
+                        help="Retry only the failed URLs from the last crawl_report.json.")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="Also write per-stage timings and counters in Prometheus text format.")
+    parser.add_argument("--sitemap", action="append", metavar="URL",
+                        help="Sitemap to crawl (repeatable, for additional domains). Default: SITEMAP_URLS.")
+    parser.add_argument("--db", default=DB_PATH, help="Crawl state database (shared by all shards; must be on a local "
+                             "filesystem, not NFS, since WAL mode needs shared memory).")
+    parser.add_argument("--shards", type=int, metavar="N",
+                        help="Run N local shard processes and merge their reports.")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="Run as shard I of N (e.g. one per machine) and write a per-shard report.")
+    parser.add_argument("--merge-reports", action="store_true",
+                        help="Merge the per-shard reports for --shards N into crawl_report.json and exit.")
+    parser.add_argument("--extract-workers", type=int, default=EXTRACT_WORKERS,
+                        help="Processes in the HTML/document extraction pool.")
+    args = parser.parse_args()
+
+    if args.merge_reports:
+        if not args.shards:
+            parser.error("--merge-reports needs --shards N")
+        write_merged_report([shard_report_path((i, args.shards)) for i in range(args.shards)], db_path=args.db)
+    elif args.shards:
+        child_args = ["--db", args.db]
+        for flag, enabled in (("--resume", args.resume), ("--only-failed", args.only_failed)):
+            if enabled:
+                child_args.append(flag)
+        for url in args.sitemap or []:
+            child_args += ["--sitemap", url]
+        sys.exit(run_sharded(args.shards, child_args, db_path=args.db, sitemap_urls=args.sitemap,
+                             warm_sitemaps=not (args.resume or args.only_failed)))
+    else:
+        asyncio.run(run(resume=args.resume, only_failed=args.only_failed, metrics_path=args.metrics_file,
+                        shard=args.shard, sitemap_urls=args.sitemap, db_path=args.db,
+                        extract_workers=args.extract_workers))
@@ -0,0 +1,211 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# Admission control for the chatbot pipeline: at most ADMISSION_MAX_CONCURRENCY runs at
+# once, at most ADMISSION_MAX_QUEUE requests waiting for a slot, and every request has a
+# deadline (ADMISSION_DEADLINE seconds after arrival). A request that cannot start in time
+# is turned away at once with a Retry-After instead of joining a pile-up that times out
+# together. Waiting requests are served by priority class, then arrival order.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_DEADLINE = float(os.getenv("ADMISSION_DEADLINE", "60"))
+ADMISSION_MIN_DEADLINE = float(os.getenv("ADMISSION_MIN_DEADLINE", "5"))  # floor for client-requested deadlines
+ADMISSION_SERVICE_ESTIMATE = float(os.getenv("ADMISSION_SERVICE_ESTIMATE", "15"))  # until runs are observed
+
+# Lower runs first. Unknown or missing user types are anonymous.
+PRIORITY_CLASSES = {"faculty": 0, "advisor": 0, "student": 1, "anonymous": 2}
+CLASS_NAMES = {0: "faculty", 1: "student", 2: "anonymous"}
+
+
+class Overloaded(Exception):
+    """The request was shed; the client should retry after retry_after seconds (HTTP 503)."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed while it was running (HTTP 504)."""
+
+
+def priority_of(user_type) -> int:
+    return PRIORITY_CLASSES.get(str(user_type or "").strip().lower(), PRIORITY_CLASSES["anonymous"])
+
+
+def check_deadline(deadline, stage: str):
+    """Raise DeadlineExceeded before starting stage if deadline (time.monotonic()) has passed."""
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded(f"Deadline passed before {stage}")
+
+
+class Ticket:
+    __slots__ = ("priority", "seq", "arrived", "deadline", "granted", "rejected", "admitted_at")
+
+    def __init__(self, priority, seq, deadline):
+        self.priority = priority
+        self.seq = seq
+        self.arrived = time.monotonic()
+        self.deadline = deadline
+        self.granted = False
+        self.rejected = None
+        self.admitted_at = None
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def wait(self) -> float:
+        return (self.admitted_at or time.monotonic()) - self.arrived
+
+
+class AdmissionController:
+    """Bounded priority queue in front of a fixed number of pipeline slots.
+
+    admit() blocks until the request holds a slot, or raises Overloaded when the queue is
+    full (a lower-priority waiter is displaced first if there is one), when the expected
+    wait plus one run would overrun the request's deadline, or when the deadline passes
+    while it waits. Run times feed an EWMA used for those estimates and for Retry-After.
+    """
+
+    def __init__(self, max_concurrency=ADMISSION_MAX_CONCURRENCY, max_queue=ADMISSION_MAX_QUEUE,
+                 deadline=ADMISSION_DEADLINE, service_estimate=ADMISSION_SERVICE_ESTIMATE, window=512,
+                 min_deadline=ADMISSION_MIN_DEADLINE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.min_deadline = min(min_deadline, deadline)
+        self.service_time = service_estimate
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self.running = 0
+        self._waits = {name: deque(maxlen=window) for name in CLASS_NAMES.values()}
+        self.stats_counts = {"admitted": 0, "completed": 0, "shed_queue_full": 0, "shed_deadline": 0,
+                             "shed_timeout": 0, "displaced": 0, "deadline_exceeded": 0}
+
+    def deadline_for(self, requested_ms=None) -> float:
+        """Absolute deadline for a request arriving now.
+
+        A client may ask for a shorter one, but never below min_deadline; anything that is
+        not a finite number of milliseconds gets the default.
+        """
+        budget = self.deadline
+        try:
+            requested = float(requested_ms) / 1000 if requested_ms is not None else budget
+        except (TypeError, ValueError):
+            requested = budget
+        if math.isfinite(requested):
+            budget = min(budget, max(self.min_deadline, requested))
+        return time.monotonic() + budget
+
+    def retry_after(self) -> int:
+        backlog = len(self._waiting) + self.running
+        return max(1, min(120, math.ceil(backlog * self.service_time / self.max_concurrency)))
+
+    @contextmanager
+    def admit(self, user_type=None, deadline=None):
+        ticket = self._acquire(priority_of(user_type), deadline or self.deadline_for())
+        started = time.monotonic()
+        try:
+            yield ticket
+        finally:
+            self._release(time.monotonic() - started)
+
+    def count(self, key: str, n: int = 1):
+        with self._cond:
+            self.stats_counts[key] += n
+
+    def _shed(self, reason: str):
+        self.stats_counts["shed_" + reason] += 1
+        raise Overloaded(reason, self.retry_after())
+
+    def _acquire(self, priority, deadline) -> Ticket:
+        with self._cond:
+            ticket = Ticket(priority, next(self._seq), deadline)
+            if self.running < self.max_concurrency and not self._waiting:
+                return self._grant(ticket)
+            if len(self._waiting) >= self.max_queue:
+                worst = max(self._waiting)
+                if worst.priority <= priority:
+                    self._shed("queue_full")
+                self._waiting.remove(worst)
+                worst.rejected = "displaced"
+                self.stats_counts["displaced"] += 1
+                self._cond.notify_all()
+            heapq.heappush(self._waiting, ticket)
+            self._prune()
+            while not ticket.granted and ticket.rejected is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._shed("timeout")
+                self._cond.wait(remaining)
+            if ticket.rejected is not None:
+                if ticket.rejected == "deadline":
+                    self.stats_counts["shed_deadline"] += 1
+                raise Overloaded(ticket.rejected, self.retry_after())
+            return ticket
+
+    def _prune(self):
+        """Turn away waiters that can no longer start and finish a run before their deadline.
+
+        Re-checked whenever the queue changes, since a higher-priority arrival pushes
+        everyone behind it back; shedding them now beats letting them time out in line.
+        """
+        now, kept = time.monotonic(), []
+        for position, t in enumerate(sorted(self._waiting)):
+            expected_start = now + (position // self.max_concurrency + 1) * self.service_time
+            if expected_start + self.service_time > t.deadline and position >= self.max_concurrency:
+                t.rejected = "deadline"
+            else:
+                kept.append(t)
+        if len(kept) != len(self._waiting):
+            self._waiting = kept  # sorted, so already a heap
+            self._cond.notify_all()
+        elif kept:
+            heapq.heapify(self._waiting)
+
+    def _grant(self, ticket: Ticket) -> Ticket:
+        ticket.granted = True
+        ticket.admitted_at = time.monotonic()
+        self.running += 1
+        self.stats_counts["admitted"] += 1
+        self._waits[CLASS_NAMES[ticket.priority]].append(ticket.wait)
+        return ticket
+
+    def _release(self, run_time: float):
+        with self._cond:
+            self.running -= 1
+            self.stats_counts["completed"] += 1
+            self.service_time = 0.8 * self.service_time + 0.2 * run_time
+            while self._waiting and self.running < self.max_concurrency:
+                self._grant(heapq.heappop(self._waiting))
+            self._prune()
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth = {name: 0 for name in CLASS_NAMES.values()}
+            for t in self._waiting:
+                depth[CLASS_NAMES[t.priority]] += 1
+            waits = {}
+            for name, recent in self._waits.items():
+                ordered = sorted(recent)
+                if ordered:
+                    waits[name] = {"p50": round(1000 * ordered[len(ordered) // 2], 1),
+                                   "p95": round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 1),
+                                   "max": round(1000 * ordered[-1], 1)}
+            return {"running": self.running, "max_concurrency": self.max_concurrency,
+                    "queue_depth": len(self._waiting), "queue_depth_by_class": depth, "max_queue": self.max_queue,
+                    "queue_wait_ms": waits, "deadline_s": self.deadline,
+                    "service_time_s": round(self.service_time, 3), **self.stats_counts}
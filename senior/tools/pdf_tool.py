@@ -6,6 +6,9 @@ from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 from langchain.tools import Tool
 
+from senior.tools.sessions import record_retrieval
+from senior.tools.tracing import tracer
+
 class PDFSearchTool:
     def __init__(self, pdf_path: str):
         # Load and process the PDF with PDFMiner for text and PDFPlumber for tables
@@ -55,9 +58,12 @@ class PDFSearchTool:
     
     def search(self, query: str) -> str:
         """Search the PDF content for relevant information."""
-        docs = self.retriever.get_relevant_documents(query)
+        with tracer.span("tool.pdf_search") as span:
+            docs = self.retriever.get_relevant_documents(query)
+            span.set(docs=len(docs))
         if not docs:
             return "No relevant information found in the advising manual."
+        record_retrieval("advising_manual", [(None, doc.page_content) for doc in docs])
         
         # Combine the content from retrieved documents
         results = []
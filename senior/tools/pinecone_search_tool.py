@@ -10,6 +10,9 @@ from pinecone import Pinecone
 from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 
+from senior.tools.sessions import record_retrieval
+from senior.tools.tracing import tracer
+
 
 # Embedding model configuration - must match the crawler's settings
 EMBED_MODEL = "text-embedding-3-large"
@@ -131,22 +134,26 @@ class PineconeSearchTool(BaseTool):
         if not isinstance(q, str) or not q.strip():
             return "Invalid query: please provide a non-empty 'query' string."
 
-        try:
-            self._ensure_ready()
-            retriever = self._vectorstore.as_retriever(search_kwargs={"k": k})
-
+        with tracer.span("tool.pinecone", index=self.index_name, k=k) as span:
             try:
-                docs = retriever.invoke(q)
-            except Exception:
-                docs = retriever.get_relevant_documents(q)
+                self._ensure_ready()
+                retriever = self._vectorstore.as_retriever(search_kwargs={"k": k})
+
+                try:
+                    docs = retriever.invoke(q)
+                except Exception:
+                    docs = retriever.get_relevant_documents(q)
 
-            if not docs:
-                return "No relevant documents found."
+                span.set(docs=len(docs))
+                if not docs:
+                    return "No relevant documents found."
+                record_retrieval("pinecone", [((d.metadata or {}).get("url"), d.page_content) for d in docs])
 
-            return self._format_docs(docs)
+                return self._format_docs(docs)
 
-        except Exception as e:
-            return f"Tool failed with error: {str(e)}"
+            except Exception as e:
+                span.set(error=str(e))
+                return f"Tool failed with error: {str(e)}"
 
     async def _arun(self, query: Union[str, Dict[str, Any]] = None, k: int = 3) -> str:
         return await asyncio.to_thread(self._run, query, k)
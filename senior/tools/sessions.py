@@ -0,0 +1,296 @@
+import contextvars
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from senior.tools.tracing import tracer
+
+
+# Server-side chat sessions: recent turns, a running summary of older ones, and the SQL
+# and retrieval context gathered for them, so a follow-up ("and for CS majors?") is
+# rewritten into a standalone question and can skip the stages whose context still
+# applies. Sessions expire after SESSION_TTL idle seconds; the least recently used are
+# evicted beyond SESSION_MAX_SESSIONS or SESSION_MAX_BYTES of stored text.
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "2000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "8"))    # summarize beyond this many turns...
+SESSION_KEEP_TURNS = int(os.getenv("SESSION_KEEP_TURNS", "3"))  # ...keeping the latest verbatim
+SESSION_MAX_CHUNKS = int(os.getenv("SESSION_MAX_CHUNKS", "24"))
+SESSION_SQL_TTL = float(os.getenv("SESSION_SQL_TTL", "300"))    # student data changes; don't reuse forever
+SESSION_REUSE_COVERAGE = float(os.getenv("SESSION_REUSE_COVERAGE", "0.6"))
+MAX_ANSWER_CHARS = 1500  # per turn, as stored for prompts
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before but by can could did do does for from get had has
+have how i if in into is it its me more my no not of on or our please should so some tell than that the their
+them then there these they this those to too us was we what when where which who why will with would you your
+""".split())
+FOLLOW_UP_RE = re.compile(
+    r"^\s*(and|also|what about|how about|same|then|but|so|only)\b"
+    r"|\b(it|its|that|those|these|they|them|this one|he|she|his|her|same)\b",
+    re.IGNORECASE,
+)
+
+REWRITE_PROMPT = (
+    "Rewrite the user's latest message as a standalone question that can be understood without the "
+    "conversation. Keep names, student IDs, course codes and programs from earlier turns when the message "
+    "refers to them. If it is already standalone, return it unchanged. Reply with the question only."
+)
+SUMMARY_PROMPT = (
+    "Update the running summary of an academic advising conversation with the turns below. Keep student IDs, "
+    "programs, courses, numbers and decisions; drop pleasantries. Reply with the summary only, at most 120 words."
+)
+
+
+def content_terms(text: str) -> set:
+    terms = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        terms.add(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word)
+    return terms
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class Turn:
+    __slots__ = ("question", "standalone", "answer", "at")
+
+    def __init__(self, question, standalone, answer):
+        self.question = question
+        self.standalone = standalone
+        self.answer = answer[:MAX_ANSWER_CHARS]
+        self.at = time.time()
+
+
+class Session:
+    """One conversation. Hold `lock` while running a turn so a session's turns stay ordered.
+
+    owner is the logged-in user it belongs to, or None for an anonymous session, which is
+    held by whoever has its (server-minted, random) id.
+    """
+
+    def __init__(self, session_id, owner=None):
+        self.session_id = session_id
+        self.owner = owner
+        self.lock = threading.Lock()
+        self.created = time.time()
+        self.last_used = time.monotonic()
+        self.turns = []
+        self.summary = ""
+        self.sql = OrderedDict()                       # normalized question -> (expires_at, result)
+        self.chunks = deque(maxlen=SESSION_MAX_CHUNKS)  # (source, url, text) returned by retrieval tools
+        self.retrieval = None                          # {"question", "web", "advisor", "terms"} of the last run
+        self.nbytes = 0
+
+    def history_text(self, max_turns: int = SESSION_KEEP_TURNS) -> str:
+        parts = [f"Summary of earlier conversation: {self.summary}"] if self.summary else []
+        for turn in self.turns[-max_turns:]:
+            parts.append(f"User: {turn.standalone}\nAssistant: {turn.answer[:600]}")
+        return "\n\n".join(parts)
+
+    def cached_sql(self, question: str):
+        entry = self.sql.get(normalize_question(question))
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def remember_sql(self, question: str, result: str):
+        self.sql[normalize_question(question)] = (time.monotonic() + SESSION_SQL_TTL, result)
+        while len(self.sql) > SESSION_MAX_TURNS:
+            self.sql.popitem(last=False)
+
+    def cached_retrieval(self, question: str, min_coverage: float = SESSION_REUSE_COVERAGE):
+        """The last web/advisor results, if they still cover what this question adds.
+
+        Terms shared with the question they were retrieved for are covered by definition;
+        the new ones (e.g. "cs", "major") must appear in the retrieved chunks or answers.
+        """
+        if self.retrieval is None:
+            return None
+        new_terms = content_terms(question) - content_terms(self.retrieval["question"])
+        if not new_terms:
+            return self.retrieval
+        covered = len(new_terms & self.retrieval["terms"]) / len(new_terms)
+        return self.retrieval if covered >= min_coverage else None
+
+    def remember_retrieval(self, question: str, web: str, advisor: str):
+        corpus = " ".join([web, advisor] + [text for _, _, text in self.chunks])
+        self.retrieval = {"question": question, "web": web, "advisor": advisor, "terms": content_terms(corpus)}
+
+    def adopt(self, other: "Session"):
+        """Take over the SQL results and retrieval of a turn that other ran on this session's behalf."""
+        for key, entry in list(other.sql.items()):
+            self.sql[key] = entry
+        self.chunks.extend(list(other.chunks))
+        self.retrieval = other.retrieval
+
+    def measure(self) -> int:
+        size = len(self.summary)
+        size += sum(len(t.question) + len(t.standalone) + len(t.answer) for t in self.turns)
+        size += sum(len(k) + len(str(v[1])) for k, v in self.sql.items())
+        size += sum(len(text) + len(url or "") for _, url, text in self.chunks)
+        if self.retrieval is not None:
+            r = self.retrieval
+            size += len(r["question"]) + len(r["web"]) + len(r["advisor"]) + 8 * len(r["terms"])
+        self.nbytes = size
+        return size
+
+
+_active_session = contextvars.ContextVar("chat_session", default=None)
+
+
+def record_retrieval(source: str, results):
+    """Called by retrieval tools with [(url, text), ...]; kept on the session being served, if any."""
+    session = _active_session.get()
+    if session is None:
+        return
+    for url, text in results:
+        session.chunks.append((source, url, text))
+
+
+class SessionStore:
+    """TTL- and memory-bounded LRU of chat sessions, with follow-up rewriting and summarization."""
+
+    def __init__(self, llm=None, ttl=SESSION_TTL, max_sessions=SESSION_MAX_SESSIONS, max_bytes=SESSION_MAX_BYTES,
+                 max_turns=SESSION_MAX_TURNS, keep_turns=SESSION_KEEP_TURNS):
+        self.llm = llm
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.keep_turns = keep_turns
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.stats_counts = {"created": 0, "expired": 0, "evicted": 0, "rejected": 0, "turns": 0, "rewrites": 0,
+                             "summaries": 0, "sql_reused": 0, "retrieval_reused": 0}
+
+    def count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats_counts[key] += n
+
+    def get(self, session_id=None, owner=None) -> Session:
+        """The live session with this id and owner, or a new one under a freshly minted id.
+
+        Client-supplied ids are never adopted: an unknown, expired or someone else's id
+        gets a new session, so a session can't be planted for a victim to fill.
+        """
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and now - session.last_used > self.ttl:
+                self._remove(session_id)
+                self.stats_counts["expired"] += 1
+                session = None
+            if session is not None and session.owner != owner:
+                self.stats_counts["rejected"] += 1
+                session = None
+            if session is None:
+                session = Session(uuid.uuid4().hex, owner)
+                self._sessions[session.session_id] = session
+                self.stats_counts["created"] += 1
+            session.last_used = now
+            self._sessions.move_to_end(session.session_id)
+            self._evict(now, keep=session.session_id)
+        return session
+
+    def drop(self, session_id: str, owner=None) -> bool:
+        """End a session, if it exists and belongs to owner."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return False
+            return self._remove(session_id)
+
+    def _remove(self, session_id) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self.bytes -= session.nbytes
+        return True
+
+    def _evict(self, now, keep=None):
+        for sid in [sid for sid, s in self._sessions.items() if now - s.last_used > self.ttl and sid != keep]:
+            self._remove(sid)
+            self.stats_counts["expired"] += 1
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self.bytes > self.max_bytes):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            self._remove(oldest)
+            self.stats_counts["evicted"] += 1
+
+    @contextmanager
+    def serving(self, session: Session):
+        """Make session the target of record_retrieval() for the duration of a turn."""
+        token = _active_session.set(session)
+        try:
+            yield session
+        finally:
+            _active_session.reset(token)
+
+    def standalone_question(self, session: Session, question: str) -> str:
+        """Rewrite a follow-up into a standalone question with one LLM call; others pass through."""
+        looks_like_follow_up = FOLLOW_UP_RE.search(question) or len(content_terms(question)) <= 2
+        if not session.turns or self.llm is None or not looks_like_follow_up:
+            return question
+        with tracer.span("session.rewrite"):
+            try:
+                reply = self.llm.invoke([
+                    SystemMessage(content=REWRITE_PROMPT),
+                    HumanMessage(content=f"Conversation:\n{session.history_text()}\n\nLatest message: {question}"),
+                ])
+            except Exception as e:
+                print(f"Follow-up rewrite failed: {e}")
+                return question
+        self.count("rewrites")
+        rewritten = str(reply.content).strip().strip('"')
+        return rewritten or question
+
+    def finish_turn(self, session: Session, question: str, standalone: str, answer: str):
+        """Record the turn, fold old turns into the summary, and re-account the session's size."""
+        session.turns.append(Turn(question, standalone, answer))
+        self.count("turns")
+        if len(session.turns) > self.max_turns:
+            self._summarize(session)
+        now = time.monotonic()
+        with self._lock:
+            old = session.nbytes
+            size = session.measure()
+            if self._sessions.get(session.session_id) is session:
+                self.bytes += size - old
+            session.last_used = now
+            self._evict(now, keep=session.session_id)
+
+    def _summarize(self, session: Session):
+        old, session.turns = session.turns[:-self.keep_turns], session.turns[-self.keep_turns:]
+        transcript = "\n".join(f"User: {t.standalone}\nAssistant: {t.answer[:400]}" for t in old)
+        summary = None
+        if self.llm is not None:
+            with tracer.span("session.summarize", turns=len(old)):
+                try:
+                    reply = self.llm.invoke([
+                        SystemMessage(content=SUMMARY_PROMPT),
+                        HumanMessage(content=f"Current summary: {session.summary or '(none)'}\n\nTurns:\n{transcript}"),
+                    ])
+                    summary = str(reply.content).strip()
+                except Exception as e:
+                    print(f"Session summary failed: {e}")
+        # Without a model (or if it fails) keep the questions, which carry most of the context
+        session.summary = summary or (session.summary + " " + " | ".join(t.standalone for t in old)).strip()[-2000:]
+        self.count("summaries")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self.bytes, "max_sessions": self.max_sessions,
+                    "max_bytes": self.max_bytes, "ttl_s": self.ttl, **self.stats_counts}
@@ -0,0 +1,107 @@
+import os
+import re
+import threading
+import time
+
+from senior.tools.sessions import normalize_question
+from senior.tools.tracing import tracer
+
+
+# Identical questions asked at the same time (registration week: "when does add/drop
+# close?") share one pipeline run: the first request executes, the rest wait for it and
+# get the same answer. Only questions whose answer cannot depend on who is asking are
+# shared; anything naming a student, an ID or the asker ("my GPA", "can I ...") runs alone.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1").lower() not in ("0", "false", "no")
+
+PERSONAL_RE = re.compile(
+    r"\b(i|i'm|im|i've|i'd|i'll|me|my|mine|myself|we|our|ours|us)\b"   # the asker
+    r"|\b(student|advisor|advisee|id)\s*(id|no|number)?\s*[#:]?\s*\d+"  # someone's record
+    r"|\d{4,}"                                                          # bare IDs (course codes are shorter)
+    r"|[\w.+-]+@[\w-]+\.[\w.]+",                                        # email addresses
+    re.IGNORECASE,
+)
+
+
+def is_shareable(prompt: str) -> bool:
+    """True when the prompt is general enough that one answer serves everyone asking it."""
+    return bool(normalize_question(prompt)) and PERSONAL_RE.search(prompt) is None
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters", "started")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.started = time.monotonic()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the key share its outcome.
+
+    Nothing is cached: once the call returns, the next caller with the key starts a new one.
+    """
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats_counts = {"executed": 0, "shared": 0, "excluded": 0, "rerun": 0}
+
+    def key(self, prompt: str):
+        """Coalescing key for prompt, or None if it must run on its own."""
+        if not self.enabled:
+            return None
+        if not is_shareable(prompt):
+            with self._lock:
+                self.stats_counts["excluded"] += 1
+            return None
+        return normalize_question(prompt)
+
+    def do(self, key, fn, timeout=None, rerun_on=()):
+        """(fn(), shared): runs fn, or waits up to timeout seconds for the run already in flight.
+
+        An exception raised by the shared run is raised in every caller waiting on it, unless
+        it is one of rerun_on: those say the leader was turned away (shed, out of time), not
+        that the question failed, so each waiter then runs its own fn instead.
+        """
+        if key is None:
+            return fn(), False
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats_counts["executed"] += 1
+            else:
+                flight.waiters += 1
+                self.stats_counts["shared"] += 1
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.result, False
+
+        with tracer.span("single_flight.wait", waiters=flight.waiters):
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"Shared run still in flight after {timeout}s")
+        if isinstance(flight.error, rerun_on):
+            with self._lock:
+                self.stats_counts["rerun"] += 1
+            return fn(), False
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, "in_flight": len(self._flights),
+                    "waiting": sum(f.waiters for f in self._flights.values()), **self.stats_counts}
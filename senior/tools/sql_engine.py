@@ -0,0 +1,196 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from senior.tools.tracing import tracer
+
+
+# One pool for everything the chatbot runs against the student database: the template and
+# text-to-SQL paths (engine) and the LangChain SQL agent (SQLDatabase(engine)).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # below MySQL's default wait_timeout
+
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "30"))
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1024"))
+
+_WRITE_SQL = re.compile(r"^\s*(insert|update|delete|replace|merge|truncate|alter|drop|create)\b", re.IGNORECASE)
+_TABLE_REF = re.compile(r"\b(?:from|join|update|into|table)\s+[`\"\[]?(\w+)", re.IGNORECASE)
+
+
+def referenced_tables(sql: str) -> frozenset:
+    return frozenset(name.lower() for name in _TABLE_REF.findall(sql))
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside string literals and drop trailing semicolons."""
+    parts = re.split(r"('(?:[^'\\]|\\.|'')*')", sql.strip().rstrip(";").strip())
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts))
+
+
+class PoolStats:
+    """Checkout wait times and timeouts of a TimedQueuePool."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent.append(wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+        p95 = recent[int(len(recent) * 0.95) - 1] if len(recent) >= 20 else (recent[-1] if recent else 0.0)
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(1000 * self.total_wait / self.checkouts, 3) if self.checkouts else 0.0,
+            "p95_wait_ms": round(1000 * p95, 3),
+            "max_wait_ms": round(1000 * self.max_wait, 3),
+        }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection."""
+
+    def _do_get(self):
+        stats = getattr(self, "stats", None)
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            if stats is not None:
+                stats.record(time.perf_counter() - t0, timed_out=True)
+            raise
+        if stats is not None:
+            stats.record(time.perf_counter() - t0)
+        return conn
+
+
+def create_shared_engine(db_uri: str, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW,
+                         pool_timeout: float = DB_POOL_TIMEOUT, pool_recycle: int = DB_POOL_RECYCLE, **kwargs):
+    """Engine with a sized, pre-pinged, recycled pool whose wait times show up in pool_status()."""
+    url = make_url(db_uri)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite is one connection per thread; there is nothing to size
+        return create_engine(db_uri, **kwargs)
+    engine = create_engine(db_uri, poolclass=TimedQueuePool, pool_size=pool_size, max_overflow=max_overflow,
+                           pool_timeout=pool_timeout, pool_recycle=pool_recycle, pool_pre_ping=True, **kwargs)
+    engine.pool.stats = PoolStats()
+    return engine
+
+
+def pool_status(engine) -> dict:
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow(),
+                      checked_in=pool.checkedin())
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
+
+
+class QueryResultCache:
+    """Read-through TTL cache of (columns, rows) keyed by normalized SQL and bind params.
+
+    Entries remember the tables their SQL reads, so invalidate("Student_Course_Absence")
+    drops only results that could have changed. Failed queries are never cached.
+    """
+
+    def __init__(self, ttl: float = SQL_CACHE_TTL, max_entries: int = SQL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, tables, columns, rows)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(sql: str, params=None):
+        return normalize_sql(sql), tuple(sorted((params or {}).items()))
+
+    def get_or_run(self, sql: str, params, run):
+        """Return cached (columns, rows) for sql/params, or call run() and cache what it returns."""
+        if self.ttl <= 0:
+            return run()
+        key = self.key(sql, params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                tracer.record(cache_hits=1)
+                return entry[2], entry[3]
+            self.misses += 1
+        columns, rows = run()
+        rows = [tuple(row) for row in rows]
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, referenced_tables(sql), columns, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return columns, rows
+
+    def invalidate(self, *tables) -> int:
+        """Drop cached results reading any of the given tables (all results when none given)."""
+        wanted = {t.lower() for t in tables}
+        with self._lock:
+            if not wanted:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [k for k, e in self._entries.items() if not e[1] or e[1] & wanted]
+                for k in stale:
+                    del self._entries[k]
+                dropped = len(stale)
+            self.invalidations += dropped
+        return dropped
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations, "ttl_s": self.ttl}
+
+
+def install_write_invalidation(engine, cache: QueryResultCache):
+    """Invalidate cached results for tables written through this engine, on write and on commit."""
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        if _WRITE_SQL.match(statement):
+            tables = referenced_tables(statement)
+            cache.invalidate(*tables)
+            conn.info.setdefault("written_tables", set()).update(tables)
+
+    @event.listens_for(engine, "commit")
+    def _after_commit(conn):
+        # Again at commit: readers may have re-cached the old rows since the write; TTL bounds the rest
+        tables = conn.info.pop("written_tables", None)
+        if tables:
+            cache.invalidate(*tables)
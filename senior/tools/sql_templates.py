@@ -0,0 +1,314 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+
+# Successful generated/agent SQL is appended here; `learn` promotes recurring shapes from it
+SQL_QUERY_LOG = os.getenv("SQL_QUERY_LOG", "logs/sql_queries.jsonl")
+LEARNED_TEMPLATES_PATH = os.getenv("SQL_TEMPLATES_PATH", "senior/config/sql_templates.json")
+MIN_PROMOTION_COUNT = 3
+# Never described to the model, never allowed in generated SQL, and dropped from every result
+EXCLUDED_COLUMNS = {"password"}
+
+_STUDENT = r"student (?:id )?#?(?P<student_id>\d+)"
+_COURSE = r"(?:course )?(?P<course_id>[a-z]{2,4} ?\d{3}[a-z]?)"
+_ADVISOR = r"advisor (?:id )?(?P<advisor_id>[a-z0-9_-]+)"
+
+# Hand-written intents for the questions faculty ask most. Patterns match the whole
+# normalized question (see normalize_question) so anything phrased differently, or with an
+# extra condition, falls through to the LLM path instead of getting a wrong answer.
+BUILTIN_TEMPLATES = [
+    {
+        "name": "student_gpa",
+        "patterns": [
+            rf"^what(?: is|'s) (?:the )?(?:current )?gpa of {_STUDENT}$",
+            rf"^what(?: is|'s) {_STUDENT}(?:'s)? (?:current )?gpa$",
+            rf"^(?:show|get|give me) (?:the )?(?:current )?gpa (?:of|for) {_STUDENT}$",
+        ],
+        "sql": "SELECT student_id, Fname, Lname, current_gpa, cumulative_gpa FROM Student WHERE student_id = :student_id",
+        "row": "Student {student_id} ({Fname} {Lname}): current GPA {current_gpa}, cumulative GPA {cumulative_gpa}",
+        "empty": "No student with ID {student_id}.",
+    },
+    {
+        "name": "student_current_courses",
+        "patterns": [
+            rf"^(?:what|which) (?:courses|classes) (?:is|does) {_STUDENT} (?:currently )?(?:enrolled in|taking|take)(?: this semester)?$",
+            rf"^(?:list|show) (?:the )?(?:current )?(?:courses|classes) (?:of|for) {_STUDENT}$",
+        ],
+        "sql": "SELECT e.course_id, c.course_name, e.semester FROM Student_Course_Enrollment e "
+               "JOIN Course c ON c.course_id = e.course_id "
+               "WHERE e.student_id = :student_id AND e.status = 'Current' ORDER BY e.course_id",
+        "row": "{course_id} {course_name} ({semester})",
+        "header": "Student {student_id} is currently enrolled in {count} course(s):",
+        "empty": "Student {student_id} has no current enrollments.",
+    },
+    {
+        "name": "student_course_absences",
+        "patterns": [
+            rf"^how many absences does {_STUDENT} have in {_COURSE}$",
+            rf"^how many (?:times|classes) (?:has|did) {_STUDENT} (?:been absent|miss(?:ed)?)(?: from)? (?:in )?{_COURSE}$",
+        ],
+        "sql": "SELECT e.course_id, e.semester, COALESCE(a.absence_count, 0) AS absences, c.absence_limit "
+               "FROM Student_Course_Enrollment e JOIN Course c ON c.course_id = e.course_id "
+               "LEFT JOIN Student_Course_Absence a ON a.student_id = e.student_id "
+               "AND a.course_id = e.course_id AND a.semester = e.semester "
+               "WHERE e.student_id = :student_id AND e.course_id = :course_id ORDER BY e.semester",
+        "row": "{course_id} ({semester}): {absences} absence(s), limit {absence_limit}",
+        "header": "Absences of student {student_id} in {course_id}:",
+        "empty": "Student {student_id} has no enrollment in {course_id}.",
+    },
+    {
+        "name": "student_absences",
+        "patterns": [
+            rf"^how many absences does {_STUDENT} have(?: this semester)?$",
+            rf"^(?:list|show) (?:the )?absences (?:of|for) {_STUDENT}$",
+        ],
+        "sql": "SELECT e.course_id, c.course_name, COALESCE(a.absence_count, 0) AS absences, c.absence_limit "
+               "FROM Student_Course_Enrollment e JOIN Course c ON c.course_id = e.course_id "
+               "LEFT JOIN Student_Course_Absence a ON a.student_id = e.student_id "
+               "AND a.course_id = e.course_id AND a.semester = e.semester "
+               "WHERE e.student_id = :student_id AND e.status = 'Current' ORDER BY e.course_id",
+        "row": "{course_id} {course_name}: {absences} absence(s), limit {absence_limit}",
+        "header": "Current-semester absences of student {student_id}:",
+        "empty": "Student {student_id} has no current enrollments.",
+    },
+    {
+        "name": "advisor_high_risk_students",
+        "patterns": [
+            rf"^(?:which|what) (?:of )?{_ADVISOR}(?:'s)? students are (?:at )?high[- ]risk$",
+            rf"^(?:list|show) (?:the )?high[- ]risk students (?:of|for) {_ADVISOR}$",
+        ],
+        "sql": "SELECT student_id, student_name, cumulative_gpa FROM High_Risk_Student "
+               "WHERE advisor_id = :advisor_id ORDER BY student_id",
+        "row": "{student_id} {student_name} (cumulative GPA {cumulative_gpa})",
+        "header": "{count} high-risk student(s) of advisor {advisor_id}:",
+        "empty": "Advisor {advisor_id} has no high-risk students.",
+    },
+]
+
+# Slot patterns used when generalizing a logged question; numbers before words
+_NUMBER = r"\d+(?:\.\d+)?"
+_WORD = r"[\w.@-]+"
+_SQL_NUMBER = re.compile(r"(?<![\w.:])(\d+(?:\.\d+)?)(?![\w.])")
+_SQL_STRING = re.compile(r"'([^'\\]*)'")
+
+
+def normalize_question(question: str) -> str:
+    q = re.sub(r"\s+", " ", question.strip().lower())
+    q = re.sub(r"^(?:please|can you|could you) ", "", q)
+    return q.rstrip(" ?.!")
+
+
+def _normalize_params(params: Dict[str, str]) -> Dict[str, object]:
+    out = {}
+    for key, value in params.items():
+        if key == "student_id":
+            out[key] = int(value)
+        elif key == "course_id":
+            out[key] = value.replace(" ", "").upper()
+        elif key == "advisor_id":
+            out[key] = value.upper()
+        elif re.fullmatch(r"\d+", value):
+            out[key] = int(value)
+        elif re.fullmatch(_NUMBER, value):
+            out[key] = float(value)
+        else:
+            out[key] = value
+    return out
+
+
+def drop_excluded_columns(columns, rows):
+    """(columns, rows) without any column named in EXCLUDED_COLUMNS, whatever the query selected."""
+    keep = [i for i, c in enumerate(columns) if str(c).lower() not in EXCLUDED_COLUMNS]
+    if len(keep) == len(columns):
+        return list(columns), list(rows)
+    return [columns[i] for i in keep], [tuple(row[i] for i in keep) for row in rows]
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "n/a"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+class SQLTemplate:
+    """A question shape bound to one parameterized query and a fixed output format."""
+
+    def __init__(self, name, patterns, sql, row=None, header=None, empty=None, learned=False):
+        self.name = name
+        self.patterns = [re.compile(p) for p in patterns]
+        self.sql = sql
+        self.statement = text(sql)
+        self.row = row
+        self.header = header
+        self.empty = empty
+        self.learned = learned
+
+    def match(self, normalized: str) -> Optional[Dict[str, object]]:
+        for pattern in self.patterns:
+            m = pattern.match(normalized)
+            if m:
+                return _normalize_params(m.groupdict())
+        return None
+
+    def format(self, params, columns, rows, max_rows) -> str:
+        if not rows:
+            return (self.empty or "No data found.").format(**params)
+        shown = rows[:max_rows]
+        more = f" (first {max_rows} shown)" if len(rows) > max_rows else ""
+        if self.row is None:
+            # Learned templates: same tabular layout as the generated-SQL path
+            lines = [" | ".join(columns)] + [" | ".join(_cell(v) for v in row) for row in shown]
+            return f"{len(shown)} row(s){more}:\n" + "\n".join(lines)
+        lines = [self.row.format(**{c: _cell(v) for c, v in zip(columns, row)}) for row in shown]
+        if len(lines) == 1 and self.header is None:
+            return lines[0] + "."
+        header = (self.header or "{count} row(s):").format(count=len(shown), **params)
+        return header + more + "\n" + "\n".join(f"- {line}" for line in lines)
+
+
+class SQLTemplateCache:
+    """Answers recognized question shapes with prepared queries, no LLM involved."""
+
+    def __init__(self, engine, templates: List[dict] = BUILTIN_TEMPLATES,
+                 learned_path: Optional[str] = LEARNED_TEMPLATES_PATH, validate=None, result_cache=None):
+        self.engine = engine
+        self.result_cache = result_cache
+        self.templates = [SQLTemplate(**t) for t in templates]
+        if learned_path and os.path.exists(learned_path):
+            with open(learned_path, encoding="utf-8") as f:
+                for t in json.load(f):
+                    if validate is not None:
+                        validate(t["sql"])
+                    self.templates.append(SQLTemplate(t["name"], t["patterns"], t["sql"], learned=True))
+        self.hits = Counter()
+
+    def lookup(self, question: str):
+        normalized = normalize_question(question)
+        for template in self.templates:
+            params = template.match(normalized)
+            if params is not None:
+                return template, params
+        return None
+
+    def answer(self, question: str, max_rows: int) -> Optional[str]:
+        found = self.lookup(question)
+        if found is None:
+            return None
+        template, params = found
+
+        def fetch():
+            with self.engine.connect() as conn:
+                result = conn.execute(template.statement, params)
+                return drop_excluded_columns(list(result.keys()), result.fetchmany(max_rows + 1))
+
+        if self.result_cache is not None:
+            columns, rows = self.result_cache.get_or_run(template.sql, params, fetch)
+        else:
+            columns, rows = fetch()
+        self.hits[template.name] += 1
+        return template.format(params, columns, rows, max_rows)
+
+
+class QueryLog:
+    """Append-only JSONL of question/SQL pairs, the input to learn_templates()."""
+
+    def __init__(self, path: Optional[str] = SQL_QUERY_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, question: str, sql: str, path: str, ok: bool, rows: Optional[int] = None):
+        if not self.path:
+            return
+        entry = {"ts": round(time.time(), 3), "question": question, "sql": sql, "path": path, "ok": ok, "rows": rows}
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Could not write SQL query log: {e}")
+
+
+def generalize(question: str, sql: str):
+    """Turn one logged (question, SQL) pair into a (question regex, parameterized SQL) shape.
+
+    SQL literals that also appear verbatim in the question become parameters; other
+    literals ('Current', fixed thresholds) stay constants. Returns None when the pair
+    cannot be generalized safely.
+    """
+    if ":" in sql:
+        return None
+    normalized = normalize_question(question)
+    literals = [(m.group(1), True) for m in _SQL_STRING.finditer(sql)]
+    literals += [(m.group(1), False) for m in _SQL_NUMBER.finditer(_SQL_STRING.sub("''", sql))]
+
+    slots, pattern, sql_template = {}, re.escape(normalized), sql
+    for value, quoted in literals:
+        if not value or value.lower() in slots:
+            continue
+        escaped = re.escape(re.escape(value.lower()))
+        if not re.search(rf"(?<![\w.]){escaped}(?![\w.])", pattern):
+            continue
+        name = f"p{len(slots)}"
+        slots[value.lower()] = name
+        slot = _NUMBER if re.fullmatch(_NUMBER, value) else _WORD
+        pattern = re.sub(rf"(?<![\w.]){escaped}(?![\w.])", lambda _: f"(?P<{name}>{slot})", pattern, count=1)
+        literal = re.escape(f"'{value}'") if quoted else rf"(?<![\w.:]){re.escape(value)}(?![\w.])"
+        sql_template = re.sub(literal, f":{name}", sql_template)
+    return f"^{pattern}$", sql_template
+
+
+def learn_templates(log_path: str = SQL_QUERY_LOG, output_path: str = LEARNED_TEMPLATES_PATH,
+                    min_count: int = MIN_PROMOTION_COUNT, validate=None) -> List[dict]:
+    """Promote question shapes that produced the same working SQL at least min_count times."""
+    seen, failed, examples = Counter(), Counter(), defaultdict(list)
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("path") == "template" or not entry.get("sql"):
+                continue
+            shape = generalize(entry["question"], entry["sql"])
+            if shape is None:
+                continue
+            if entry.get("ok"):
+                seen[shape] += 1
+                examples[shape].append(entry["question"])
+            else:
+                failed[shape] += 1
+
+    existing = []
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as f:
+            existing = json.load(f)
+    known = {(t["patterns"][0], t["sql"]) for t in existing}
+    builtin = [SQLTemplate(**t) for t in BUILTIN_TEMPLATES]
+
+    promoted = []
+    for (pattern, sql), count in seen.most_common():
+        if count < min_count or failed[(pattern, sql)] or (pattern, sql) in known:
+            continue
+        # Shapes the built-in intents already answer are not worth a second template
+        if any(t.match(normalize_question(q)) is not None for t in builtin for q in examples[(pattern, sql)][:1]):
+            continue
+        if validate is not None:
+            try:
+                validate(sql)
+            except ValueError:
+                continue
+        promoted.append({"name": f"learned_{len(existing) + len(promoted) + 1}", "patterns": [pattern], "sql": sql,
+                         "examples": examples[(pattern, sql)][:3], "count": count})
+
+    if promoted:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(existing + promoted, f, indent=2)
+    return promoted
@@ -0,0 +1,316 @@
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import inspect
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from senior.tools.sql_templates import EXCLUDED_COLUMNS, QueryLog, SQLTemplateCache, drop_excluded_columns
+from senior.tools.tracing import tracer
+
+
+# Tables the chatbot may query, in the order they are described to the model
+SCHEMA_TABLES = [
+    "Student", "Advisor", "Department", "Major", "Course",
+    "Student_Course_Enrollment", "Student_Course_Absence", "Student_GPA_History",
+    "High_Risk_Student", "Student_Summary",
+]
+MAX_RESULT_ROWS = 50
+# Student_Summary is only offered to the model while every row was checked against the base
+# tables within this many seconds (see student_summary.py); otherwise risk questions are
+# answered with live joins. Freshness is re-read at most every SUMMARY_CHECK_INTERVAL.
+SUMMARY_TABLE = "Student_Summary"
+SUMMARY_MAX_AGE = float(os.getenv("SUMMARY_MAX_AGE", "900"))
+SUMMARY_CHECK_INTERVAL = 60.0
+
+FORBIDDEN_SQL = re.compile(
+    r"\b(insert|update|delete|replace|merge|drop|alter|create|truncate|grant|revoke|call|exec|execute|"
+    r"load_file|outfile|dumpfile|sleep|benchmark|lock|unlock|set|handler)\b",
+    re.IGNORECASE,
+)
+# SELECT *, t.* and the like: they would return restricted columns, so columns must be named
+STAR_PROJECTION = re.compile(r"(?:^|[\s,(])(?:[a-z_]\w*\.)?\*\s*(?:,|\bfrom\b|$)", re.IGNORECASE)
+COUNT_STAR = re.compile(r"\bcount\s*\(\s*\*\s*\)", re.IGNORECASE)
+
+# Curated question -> SQL pairs covering the common faculty questions and join paths
+FEW_SHOT_EXAMPLES = [
+    ("What is the current GPA of student 1001?",
+     "SELECT student_id, Fname, Lname, current_gpa FROM Student WHERE student_id = 1001"),
+    ("Which courses is student 1001 taking this semester and how many absences do they have?",
+     "SELECT e.course_id, c.course_name, e.semester, COALESCE(a.absence_count, 0) AS absences, c.absence_limit "
+     "FROM Student_Course_Enrollment e JOIN Course c ON c.course_id = e.course_id "
+     "LEFT JOIN Student_Course_Absence a ON a.student_id = e.student_id AND a.course_id = e.course_id AND a.semester = e.semester "
+     "WHERE e.student_id = 1001 AND e.status = 'Current'"),
+    ("Show the GPA history of Sara Ahmed.",
+     "SELECT s.student_id, g.semester, g.gpa FROM Student s JOIN Student_GPA_History g ON g.student_id = s.student_id "
+     "WHERE s.Fname = 'Sara' AND s.Lname = 'Ahmed'"),
+    ("Which of advisor A12's students are high risk?",
+     "SELECT h.student_id, h.student_name, h.cumulative_gpa FROM High_Risk_Student h WHERE h.advisor_id = 'A12'"),
+    ("Which students are close to the absence limit in any course?",
+     "SELECT ss.student_id, s.Fname, s.Lname, ss.max_absence_ratio, ss.courses_near_absence_limit "
+     "FROM Student_Summary ss JOIN Student s ON s.student_id = ss.student_id "
+     "WHERE ss.courses_near_absence_limit > 0 ORDER BY ss.max_absence_ratio DESC"),
+    ("Which courses has student 1001 completed with a grade of C or below?",
+     "SELECT e.course_id, c.course_name, e.semester, e.grade FROM Student_Course_Enrollment e "
+     "JOIN Course c ON c.course_id = e.course_id "
+     "WHERE e.student_id = 1001 AND e.status = 'Completed' AND e.grade IN ('C', 'D+', 'D', 'F', 'W', 'DN')"),
+    ("How many students are in each major?",
+     "SELECT m.major_name, COUNT(*) AS students FROM Student s JOIN Major m ON m.major_id = s.major_id GROUP BY m.major_name"),
+]
+
+SYSTEM_PROMPT = """You write a single read-only {dialect} SELECT statement that answers a faculty advisor's question.
+Use only the tables and columns below, with table names spelled exactly as shown.
+Enrollment status is one of 'Completed', 'Current', 'Leftover'; grades are letters (A+ .. F, W, DN).
+{summary_rule}
+Reply with the SQL only, no explanation. If the database cannot answer the question, reply with NONE.
+
+Schema:
+{schema}
+
+Examples:
+{examples}"""
+SUMMARY_RULE_FRESH = "Prefer Student_Summary for risk, warnings, absence-limit and low-grade questions."
+SUMMARY_RULE_STALE = ("Student_Summary is out of date and not available: answer risk, warnings, absence-limit and "
+                      "low-grade questions from Student, Student_Course_Enrollment, Student_Course_Absence, Course "
+                      "and High_Risk_Student.")
+
+
+class SchemaCache:
+    """Compact schema text for the allowed tables, introspected once per process."""
+
+    def __init__(self, engine, tables: List[str] = SCHEMA_TABLES):
+        self.engine = engine
+        self.tables = tables
+        self._text: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> str:
+        if self._text is None:
+            with self._lock:
+                if self._text is None:
+                    self._text = self._introspect()
+        return self._text
+
+    def refresh(self) -> str:
+        with self._lock:
+            self._text = self._introspect()
+        return self._text
+
+    def _introspect(self) -> str:
+        insp = inspect(self.engine)
+        existing = {name.lower(): name for name in insp.get_table_names()}
+        lines = []
+        for wanted in self.tables:
+            table = existing.get(wanted.lower())
+            if table is None:
+                continue
+            pk = set(insp.get_pk_constraint(table).get("constrained_columns") or [])
+            fks = {}
+            for fk in insp.get_foreign_keys(table):
+                for col, ref in zip(fk["constrained_columns"], fk["referred_columns"]):
+                    fks[col] = f"{fk['referred_table']}.{ref}"
+            cols = []
+            for col in insp.get_columns(table):
+                if col["name"].lower() in EXCLUDED_COLUMNS:
+                    continue
+                enums = getattr(col["type"], "enums", None)
+                desc = f"{col['name']} {'ENUM(' + ','.join(enums) + ')' if enums else col['type']}"
+                if col["name"] in pk:
+                    desc += " PK"
+                if col["name"] in fks:
+                    desc += f" -> {fks[col['name']]}"
+                cols.append(desc)
+            lines.append(f"{table}({', '.join(cols)})")
+        return "\n".join(lines)
+
+
+class AgentSQLCapture(BaseCallbackHandler):
+    """Remembers the last query the SQL agent ran through its sql_db_query tool."""
+
+    def __init__(self):
+        self.sql: Optional[str] = None
+        self.ok = False
+        self._pending = False
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._pending = (serialized or {}).get("name") == "sql_db_query"
+        if self._pending:
+            inputs = kwargs.get("inputs")
+            self.sql = (inputs.get("query") if isinstance(inputs, dict) else None) or input_str
+
+    def on_tool_end(self, output, **kwargs):
+        if self._pending:
+            self.ok = not str(getattr(output, "content", output)).startswith("Error")
+            self._pending = False
+
+    def on_tool_error(self, error, **kwargs):
+        if self._pending:
+            self.ok = False
+            self._pending = False
+
+
+class TextToSQL:
+    """Text-to-SQL in three tiers: parameterized templates (no LLM), one LLM call over a cached
+    schema, and a LangChain SQL agent when that fails."""
+
+    def __init__(self, engine, llm, fallback=None, max_rows: int = MAX_RESULT_ROWS,
+                 templates: Optional[SQLTemplateCache] = None, query_log: Optional[QueryLog] = None,
+                 result_cache=None):
+        self.engine = engine
+        self.llm = llm
+        self.fallback = fallback
+        self.max_rows = max_rows
+        self.schema = SchemaCache(engine)
+        self.result_cache = result_cache
+        self.templates = templates if templates is not None else SQLTemplateCache(
+            engine, validate=self.validate, result_cache=result_cache)
+        self.query_log = query_log if query_log is not None else QueryLog()
+        self.stats = {"questions": 0, "templates": 0, "direct": 0, "fallbacks": 0, "unanswerable": 0,
+                      "summary_stale": 0}
+        self.summary_max_age = SUMMARY_MAX_AGE
+        self._summary_checked = (float("-inf"), False)
+
+    def summary_fresh(self) -> bool:
+        """True while every Student_Summary row was checked within summary_max_age seconds."""
+        checked_at, fresh = self._summary_checked
+        if time.monotonic() - checked_at < SUMMARY_CHECK_INTERVAL:
+            return fresh
+        try:
+            with self.engine.connect() as conn:
+                oldest, rows, students = conn.exec_driver_sql(
+                    f"SELECT MIN(refreshed_at), COUNT(*), (SELECT COUNT(*) FROM Student) FROM {SUMMARY_TABLE}"
+                ).fetchone()
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+            # refreshed_at is naive UTC; students without a row yet also make the table stale
+            age = (datetime.utcnow() - oldest).total_seconds() if oldest is not None else None
+            fresh = age is not None and age <= self.summary_max_age and rows >= students
+        except Exception:
+            fresh = False
+        self._summary_checked = (time.monotonic(), fresh)
+        return fresh
+
+    def system_prompt(self) -> str:
+        schema, examples = self.schema.get(), FEW_SHOT_EXAMPLES
+        fresh = self.summary_fresh()
+        if not fresh:
+            self.stats["summary_stale"] += 1
+            schema = "\n".join(line for line in schema.splitlines() if not line.startswith(SUMMARY_TABLE + "("))
+            examples = [(q, sql) for q, sql in examples if SUMMARY_TABLE not in sql]
+        examples = "\n\n".join(f"Q: {q}\nSQL: {sql}" for q, sql in examples)
+        return SYSTEM_PROMPT.format(dialect=self.engine.dialect.name, schema=schema, examples=examples,
+                                    summary_rule=SUMMARY_RULE_FRESH if fresh else SUMMARY_RULE_STALE)
+
+    def generate_sql(self, question: str, callbacks=None) -> Optional[str]:
+        messages = [SystemMessage(content=self.system_prompt()), HumanMessage(content=question)]
+        reply = self.llm.invoke(messages, config={"callbacks": callbacks} if callbacks else None).content.strip()
+        sql = re.sub(r"^```(?:sql)?\s*|\s*```$", "", reply, flags=re.IGNORECASE).strip().rstrip(";").strip()
+        return None if sql.upper() == "NONE" else sql
+
+    @staticmethod
+    def validate(sql: str) -> None:
+        if ";" in sql:
+            raise ValueError("multiple statements are not allowed")
+        if not re.match(r"^\s*(select|with)\b", sql, re.IGNORECASE):
+            raise ValueError("only SELECT statements are allowed")
+        if FORBIDDEN_SQL.search(sql):
+            raise ValueError("statement contains a forbidden keyword")
+        if any(re.search(rf"\b{col}\b", sql, re.IGNORECASE) for col in EXCLUDED_COLUMNS):
+            raise ValueError("statement references a restricted column")
+        if STAR_PROJECTION.search(COUNT_STAR.sub("COUNT(1)", sql)):
+            raise ValueError("select columns by name, not with *")
+
+    def run_sql(self, sql: str):
+        def fetch():
+            with self.engine.connect() as conn:
+                # Driver-level execution: colons in generated SQL are not bind parameters
+                result = conn.exec_driver_sql(sql)
+                return drop_excluded_columns(list(result.keys()), result.fetchmany(self.max_rows + 1))
+
+        if self.result_cache is not None:
+            columns, rows = self.result_cache.get_or_run(sql, None, fetch)
+        else:
+            columns, rows = fetch()
+        if not rows:
+            return f"No data found.\nSQL: {sql}", 0
+        shown = rows[:self.max_rows]
+        lines = [" | ".join(columns)] + [" | ".join("" if v is None else str(v) for v in row) for row in shown]
+        more = " (truncated)" if len(rows) > self.max_rows else ""
+        return f"SQL: {sql}\n{len(shown)} row(s){more}:\n" + "\n".join(lines), len(shown)
+
+    def answer(self, question: str, callbacks=None) -> str:
+        with tracer.span("sql") as span:
+            return self._answer(question, callbacks, span)
+
+    def _answer(self, question, callbacks, span) -> str:
+        self.stats["questions"] += 1
+        try:
+            with tracer.span("sql.template"):
+                output = self.templates.answer(question, self.max_rows)
+            if output is not None:
+                self.stats["templates"] += 1
+                span.set(path="template")
+                return output
+        except Exception as e:
+            print(f"SQL template failed ({e}); using generated SQL")
+
+        sql = None
+        try:
+            with tracer.span("sql.generate"):
+                sql = self.generate_sql(question, callbacks)
+            if sql is None:
+                self.stats["unanswerable"] += 1
+                span.set(path="unanswerable")
+                return "No data: the question cannot be answered from the student database."
+            self.validate(sql)
+            if SUMMARY_TABLE.lower() in sql.lower() and not self.summary_fresh():
+                raise ValueError(f"{SUMMARY_TABLE} is out of date")
+            with tracer.span("sql.execute"):
+                output, rows = self.run_sql(sql)
+            self.stats["direct"] += 1
+            span.set(path="direct")
+            self.query_log.record(question, sql, "direct", True, rows)
+            return output
+        except Exception as e:
+            if sql:
+                self.query_log.record(question, sql, "direct", False)
+            if self.fallback is None:
+                raise
+            print(f"Text-to-SQL failed ({e}); falling back to the SQL agent")
+            self.stats["fallbacks"] += 1
+            span.set(path="agent")
+            capture = AgentSQLCapture()
+            config = {"callbacks": list(callbacks or []) + [capture, tracer.callback_handler]}
+            agent_input = question
+            if not self.summary_fresh():
+                agent_input = f"{question}\n\nDo not use the {SUMMARY_TABLE} table; it is out of date. Use the base tables."
+            with tracer.span("sql.agent"):
+                result = self.fallback.invoke({"input": agent_input}, config=config)
+            if capture.sql:
+                self.query_log.record(question, capture.sql, "agent", capture.ok)
+            return result.get("output", "No response generated.")
+
+
+def main(argv=None):
+    import argparse
+    from senior.tools.sql_templates import LEARNED_TEMPLATES_PATH, MIN_PROMOTION_COUNT, SQL_QUERY_LOG, learn_templates
+
+    parser = argparse.ArgumentParser(description="Promote recurring logged SQL into parameterized templates.")
+    parser.add_argument("--log", default=SQL_QUERY_LOG, help="Question/SQL log written by TextToSQL")
+    parser.add_argument("--out", default=LEARNED_TEMPLATES_PATH, help="Learned templates file (appended to)")
+    parser.add_argument("--min-count", type=int, default=MIN_PROMOTION_COUNT,
+                        help="Successful runs of the same shape needed before it is promoted")
+    args = parser.parse_args(argv)
+
+    promoted = learn_templates(args.log, args.out, args.min_count, validate=TextToSQL.validate)
+    for t in promoted:
+        print(f"✅ {t['name']} ({t['count']} runs): {t['patterns'][0]}\n   {t['sql']}")
+    print(f"{len(promoted)} template(s) promoted to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# Spans are on by default and can be switched off per process (TRACING_ENABLED=0) or at
+# runtime (POST /metrics/tracing, with X-Admin-Token); disabled spans are a shared no-op object.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() not in ("0", "false", "no")
+TRACE_LOG = os.getenv("TRACE_LOG", "logs/traces.jsonl")
+COUNTERS = ("llm_calls", "prompt_tokens", "completion_tokens", "cache_hits")
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent", "root", "request_id", "attrs", "counts", "start",
+                 "wall_start", "duration", "error", "finished")
+
+    def __init__(self, name, parent=None, request_id=None, attrs=None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.request_id = request_id or (parent.request_id if parent is not None else uuid.uuid4().hex)
+        self.attrs = attrs or {}
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.finished = [] if parent is None else None  # root collects its request's spans
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            if value:
+                self.counts[key] += value
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        out = {
+            "request_id": self.request_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent is not None else None,
+            "name": self.name,
+            "start": round(self.wall_start, 3),
+            "duration_ms": round(1000 * self.duration, 2),
+            **self.counts,
+        }
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.error:
+            out["error"] = self.error
+        return out
+
+
+class _NullSpan:
+    """What span()/start() hand out while tracing is disabled."""
+
+    request_id = None
+
+    def add(self, **counts):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _SpanScope:
+    __slots__ = ("tracer", "name", "request_id", "attrs", "span", "token")
+
+    def __init__(self, tracer, name, request_id, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.request_id = request_id
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.span = Span(self.name, self.tracer._current.get(), self.request_id, self.attrs)
+        self.token = self.tracer._current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._current.reset(self.token)
+        self.tracer.finish(self.span, error=f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+
+class _SpanStats:
+    __slots__ = ("count", "errors", "total", "recent", "counts")
+
+    def __init__(self, window):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+
+class Tracer:
+    """Request-scoped timing spans with LLM call, token and cache-hit counts.
+
+    Counts roll up from child to parent, so the root span of a request holds its totals.
+    Finished requests are appended to a JSONL file (one line per span) and aggregated per
+    span name for /metrics.
+    """
+
+    def __init__(self, path=TRACE_LOG, enabled=TRACING_ENABLED, window=512):
+        self.path = path
+        self.enabled = enabled
+        self.window = window
+        self._current = contextvars.ContextVar("trace_span", default=None)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.requests = 0
+        self.callback_handler = TracingCallbackHandler(self)
+
+    def current(self):
+        return self._current.get()
+
+    def request(self, request_id=None, name="chatbot.request", **attrs):
+        """Root span of one request; spans opened inside it share its request_id."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _SpanScope(self, name, request_id or uuid.uuid4().hex, attrs)
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return NULL_SPAN
+        return _SpanScope(self, name, None, attrs)
+
+    def start(self, name, **attrs):
+        """Span that is not made current, for callbacks that only see start and end events."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(name, self._current.get(), None, attrs)
+
+    def record(self, **counts):
+        span = self._current.get() if self.enabled else None
+        if span is not None:
+            span.add(**counts)
+
+    def finish(self, span, error=None):
+        if not isinstance(span, Span) or span.duration is not None:
+            return
+        span.duration = time.perf_counter() - span.start
+        span.error = error
+        if span.parent is not None:
+            span.parent.add(**span.counts)
+        span.root.finished.append(span)
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = _SpanStats(self.window)
+            stats.count += 1
+            stats.errors += error is not None
+            stats.total += span.duration
+            stats.recent.append(span.duration)
+            for key, value in span.counts.items():
+                stats.counts[key] += value
+            if span.parent is None:
+                self.requests += 1
+        if span.parent is None:
+            self._export(span.finished)
+
+    def _export(self, spans):
+        if not self.path:
+            return
+        lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError as e:
+            print(f"Could not write trace log: {e}")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            snapshot = {name: (s.count, s.errors, s.total, sorted(s.recent), dict(s.counts))
+                        for name, s in self._stats.items()}
+            requests = self.requests
+        spans = {}
+        for name, (count, errors, total, recent, counts) in sorted(snapshot.items()):
+            pct = lambda q: round(1000 * recent[min(len(recent) - 1, int(len(recent) * q))], 1)
+            spans[name] = {"count": count, "errors": errors, "avg_ms": round(1000 * total / count, 1),
+                           "p50_ms": pct(0.5), "p95_ms": pct(0.95), **counts}
+        return {"enabled": self.enabled, "requests": requests, "spans": spans}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.requests = 0
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Counts LLM calls and tokens into the current span and opens spans for LangChain tool runs."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._tools = {}
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.tracer.record(llm_calls=1)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.tracer.record(llm_calls=1)
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        if not usage:
+            for generations in response.generations:
+                for g in generations:
+                    meta = getattr(getattr(g, "message", None), "usage_metadata", None) or {}
+                    prompt += meta.get("input_tokens", 0)
+                    completion += meta.get("output_tokens", 0)
+        self.tracer.record(prompt_tokens=prompt, completion_tokens=completion)
+
+    def on_tool_start(self, serialized, input_str, run_id=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._tools[run_id] = self.tracer.start(f"tool.{name}")
+
+    def on_tool_end(self, output, run_id=None, **kwargs):
+        self.tracer.finish(self._tools.pop(run_id, None))
+
+    def on_tool_error(self, error, run_id=None, **kwargs):
+        self.tracer.finish(self._tools.pop(run_id, None), error=f"{type(error).__name__}: {error}")
+
+
+def record_crew_usage(span, output):
+    """Add a CrewAI kickoff's token usage when its LLM calls bypassed the LangChain callbacks."""
+    usage = getattr(output, "token_usage", None)
+    if usage is None or not isinstance(span, Span) or span.counts["llm_calls"]:
+        return
+    span.add(llm_calls=getattr(usage, "successful_requests", 0),
+             prompt_tokens=getattr(usage, "prompt_tokens", 0),
+             completion_tokens=getattr(usage, "completion_tokens", 0))
+
+
+tracer = Tracer()
@@ -0,0 +1,183 @@
+from collections import Counter
+from datetime import datetime, timezone
+import argparse
+import sys
+import time
+
+from sqlalchemy import text
+
+from generate_report import engine, fetch_report_data, evaluate_suggestions, report_fingerprint, BATCH_FETCH_SIZE
+
+# One precomputed row per student with the risk flags, absence ratios and suggestion codes
+# the report and the advisor tools would otherwise derive from the raw tables every time.
+# source_hash is summary_fingerprint() of the rows it was computed from, so a refresh only
+# rewrites students whose enrollments, absences, GPA history or profile actually changed.
+# refreshed_at is when the row was last checked against those rows (changed or not), so
+# the oldest refreshed_at bounds how stale the table can be; text_to_sql.py stops using
+# it past SUMMARY_MAX_AGE. Run --watch with an interval well under that, or call
+# --students right after writing a student's grades or absences.
+SUMMARY_TABLE = "Student_Summary"
+# Bump when summarize() changes what a column means, so the next refresh rewrites every row
+SUMMARY_VERSION = 2
+
+SUMMARY_DDL = """
+CREATE TABLE IF NOT EXISTS Student_Summary (
+    student_id INTEGER PRIMARY KEY,
+    current_gpa FLOAT,
+    cumulative_gpa FLOAT,
+    is_high_risk BOOLEAN NOT NULL,
+    gpa_below_2 BOOLEAN NOT NULL,
+    current_courses INTEGER NOT NULL,
+    completed_courses INTEGER NOT NULL,
+    max_absence_ratio FLOAT,
+    courses_over_absence_limit INTEGER NOT NULL,
+    courses_near_absence_limit INTEGER NOT NULL,
+    high_difficulty_courses INTEGER NOT NULL,
+    low_grade_courses INTEGER NOT NULL,
+    past_performance_risks INTEGER NOT NULL,
+    suggestion_codes VARCHAR(255) NOT NULL,
+    source_hash CHAR(32) NOT NULL,
+    refreshed_at DATETIME NOT NULL
+)
+"""
+
+SUMMARY_COLUMNS = [
+    "student_id", "current_gpa", "cumulative_gpa", "is_high_risk", "gpa_below_2", "current_courses",
+    "completed_courses", "max_absence_ratio", "courses_over_absence_limit", "courses_near_absence_limit",
+    "high_difficulty_courses", "low_grade_courses", "past_performance_risks", "suggestion_codes",
+    "source_hash", "refreshed_at",
+]
+
+# Students worth an advisor's attention (generate_report.py --at-risk)
+AT_RISK_CONDITION = "is_high_risk = 1 OR gpa_below_2 = 1 OR courses_over_absence_limit > 0 OR low_grade_courses > 0"
+
+# Table description handed to the SQL agent so it reads one row instead of joining
+SUMMARY_TABLE_INFO = SUMMARY_DDL.strip() + """
+/* Precomputed per-student academic risk summary, refreshed by student_summary.py.
+   refreshed_at is when the row was last checked against the base tables.
+   Prefer it for questions about risk, warnings, GPA below 2.0, absences near or over the limit,
+   low grades or struggling students. max_absence_ratio = absences / absence_limit over current
+   courses; courses_over_absence_limit counts courses with absences >= absence_limit and
+   courses_near_absence_limit those with 0.75 * absence_limit <= absences < absence_limit,
+   so a course is in at most one of the two (use both for "near or over"); suggestion_codes is a comma-separated subset of GPA_WARNING, HIGH_DIFFICULTY,
+   ABSENCE_WARNING, LOW_GRADE, PAST_PERFORMANCE_RISK. */"""
+
+
+def summary_fingerprint(report):
+    return report_fingerprint([SUMMARY_VERSION, report])
+
+
+def summarize(report, source_hash, refreshed_at):
+    student = report["student"]
+    codes = Counter(code for code, _ in evaluate_suggestions(report))
+    ratios = [row["absences"] / row["absence_limit"] for row in report["absence"] if row["absence_limit"]]
+    return {
+        "student_id": student["student_id"],
+        "current_gpa": student["current_gpa"],
+        "cumulative_gpa": student["cumulative_gpa"],
+        "is_high_risk": report["high_risk"],
+        "gpa_below_2": codes["GPA_WARNING"] > 0,
+        "current_courses": len(report["current"]),
+        "completed_courses": len(report["completed"]),
+        "max_absence_ratio": round(max(ratios), 4) if ratios else None,
+        "courses_over_absence_limit": sum(1 for row in report["absence"]
+                                          if row["absence_limit"] is not None and row["absences"] >= row["absence_limit"]),
+        # ABSENCE_WARNING also fires past the limit; those courses are counted as over, not near
+        "courses_near_absence_limit": sum(1 for ratio in ratios if 0.75 <= ratio < 1),
+        "high_difficulty_courses": codes["HIGH_DIFFICULTY"],
+        "low_grade_courses": codes["LOW_GRADE"],
+        "past_performance_risks": codes["PAST_PERFORMANCE_RISK"],
+        "suggestion_codes": ",".join(sorted(codes)),
+        "source_hash": source_hash,
+        "refreshed_at": refreshed_at,
+    }
+
+
+def ensure_summary_table():
+    with engine.begin() as conn:
+        conn.execute(text(SUMMARY_DDL))
+
+
+def refresh_summaries(student_ids=None, fetch_size=BATCH_FETCH_SIZE):
+    """Recompute Student_Summary rows whose source data changed.
+
+    With student_ids, only those students are checked (e.g. right after their grades or
+    absences were updated); otherwise every student is, and rows of students that no
+    longer exist are removed.
+    """
+    t0 = time.perf_counter()
+    ensure_summary_table()
+    with engine.connect() as conn:
+        if student_ids is None:
+            student_ids = [row[0] for row in conn.execute(text("SELECT student_id FROM Student ORDER BY student_id"))]
+            stale = [row[0] for row in conn.execute(text(
+                "SELECT student_id FROM Student_Summary WHERE student_id NOT IN (SELECT student_id FROM Student)"))]
+        else:
+            stale = []
+        known = dict(conn.execute(text("SELECT student_id, source_hash FROM Student_Summary")).fetchall())
+
+    stats = {"checked": 0, "updated": 0, "unchanged": 0, "removed": 0, "missing": 0}
+    refreshed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    insert = text(f"INSERT INTO Student_Summary ({', '.join(SUMMARY_COLUMNS)}) "
+                  f"VALUES ({', '.join(':' + c for c in SUMMARY_COLUMNS)})")
+    delete = text("DELETE FROM Student_Summary WHERE student_id = :student_id")
+    touch = text("UPDATE Student_Summary SET refreshed_at = :refreshed_at WHERE student_id = :student_id")
+
+    for i in range(0, len(student_ids), fetch_size):
+        group = student_ids[i:i + fetch_size]
+        reports = fetch_report_data(group)
+        changed, unchanged = [], []
+        for sid in group:
+            stats["checked"] += 1
+            report = reports.get(sid)
+            if report is None:
+                stats["missing"] += 1
+                if sid in known:
+                    stale.append(sid)
+                continue
+            source_hash = summary_fingerprint(report)
+            if known.get(sid) == source_hash:
+                stats["unchanged"] += 1
+                unchanged.append({"student_id": sid, "refreshed_at": refreshed_at})
+                continue
+            changed.append(summarize(report, source_hash, refreshed_at))
+        if changed or unchanged:
+            with engine.begin() as conn:
+                if changed:
+                    conn.execute(delete, [{"student_id": row["student_id"]} for row in changed])
+                    conn.execute(insert, changed)
+                if unchanged:
+                    conn.execute(touch, unchanged)
+            stats["updated"] += len(changed)
+
+    if stale:
+        with engine.begin() as conn:
+            conn.execute(delete, [{"student_id": sid} for sid in stale])
+        stats["removed"] = len(stale)
+    stats["duration_s"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the Student_Summary table.")
+    parser.add_argument("--students", type=int, nargs="+", help="Only refresh these students")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="Keep refreshing on this interval")
+    args = parser.parse_args(argv)
+
+    while True:
+        stats = refresh_summaries(args.students)
+        print(f"✅ Student_Summary: {stats['updated']} updated, {stats['unchanged']} unchanged, "
+              f"{stats['removed']} removed ({stats['checked']} checked in {stats['duration_s']}s)")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error refreshing Student_Summary: {str(e)}")
+        sys.exit(1)